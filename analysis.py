@@ -13,29 +13,15 @@
 # Load external libraries
 from pathlib import Path
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import argparse, importlib, pprint, sys
+import pprint
 
 # Load internal libraries
-import database, defs, orders, preload
-
-# Parse command line arguments
-parser = argparse.ArgumentParser(description="Run the Sunflow Cryptobot Tester with a specified config.")
-parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
-parser.add_argument('-d', '--days', type=int, default=30, help='Number of days to display in the profit per day graph.')
-args = parser.parse_args()
+from loader import load_config
+import database, defs, ledger, loader, orders, preload
 
-# Resolve config file path
-config_path = Path(args.config).resolve()
-if not config_path.exists():
-    print(f"Config file not found at {config_path}, aborting...\n")
-    sys.exit()
-
-# Dynamically load the config module
-sys.path.append(str(config_path.parent))
-config_module_name = config_path.stem
-config = importlib.import_module(config_module_name)
+# Load config, parsed once for all internal libraries
+config      = load_config()
+config_path = Path(config.__file__).resolve()
 
 # Initialize variables
 debug = False
@@ -100,9 +86,15 @@ spot     = ticker['lastPrice']
 info     = preload.get_info(spot, multiplier, compounding)
 all_buys = database.load(dbase_file, info)
 
+# Load revenue totals per day, the revenue store is built from the revenue log on first use
+if not ledger.exists():
+    ledger.rebuild(revenue_file)
+daily = ledger.load_rollup("daily")
+daily = daily[daily['sells'] > 0]
+
 # Load data into a dataframes
 df_all_buys = pd.DataFrame(all_buys)
-df_revenue  = pd.read_csv(revenue_file)
+df_revenue  = pd.DataFrame({'date': pd.to_datetime(daily['time'], unit='ms').date, 'revenue': daily['revenue']})
 
 # Check if we can run
 if df_all_buys.empty or df_revenue.empty:
@@ -112,29 +104,30 @@ if df_all_buys.empty or df_revenue.empty:
 # Convert timestamps to readable dates
 df_all_buys['createdTime'] = pd.to_datetime(df_all_buys['createdTime'], unit='ms')
 df_all_buys['updatedTime'] = pd.to_datetime(df_all_buys['updatedTime'], unit='ms')
-df_revenue['createdTime'] = pd.to_datetime(df_revenue['createdTime'], unit='ms')
 
 # Filter the dataframes
 df_all_buys = df_all_buys[df_all_buys['status'] == 'Closed']
-df_revenue  = df_revenue[df_revenue['side'] == 'Sell'] 
 
-# Get time elements
+# Get time elements, of revenue from first and last sell
 ab_elem = calc_time(df_all_buys)
-rv_elem = calc_time(df_revenue)
+rv_elem = calc_time(pd.DataFrame({'createdTime': pd.to_datetime([daily['first'].min(), daily['last'].max()], unit='ms')}))
+
+# Calculate revenue totals
+sells         = int(daily['sells'].sum())
+total_revenue = float(daily['revenue'].sum())
 
 # Get wallet for base and quote coin
 equity_base  = orders.get_balance(info['baseCoin'])[0]['equity']
 equity_quote = orders.get_balance(info['quoteCoin'])[0]['equity']
 
-# Group the revenue data by date
-df_revenue['date'] = df_revenue['createdTime'].dt.date
-
 # Debug to stdout
 if debug:
     print("df_all_buys: ")
     print(df_all_buys)
     print("df_revenue:")
     print(df_revenue)
+    print("Revenue events of last day:")
+    print(ledger.load_day(ledger.day_of(int(daily['time'][-1]))))
     print()
     pprint.pprint(ab_elem)
     pprint.pprint(rv_elem)
@@ -176,24 +169,24 @@ print()
 
 print("Profit data")
 print("===========")
-print(f"Sell count    : {len(df_revenue)} orders sold")
+print(f"Sell count    : {sells} orders sold")
 print(f"First sell    : {rv_elem['first']} UTC")
 print(f"Last sell     : {rv_elem['last']} UTC")
 print(f"Timespan      : {rv_elem['days']} days, {rv_elem['hours']} hours, {rv_elem['minutes']} minutes, {rv_elem['seconds']} seconds")
 
 print()
 
-print(f"Average profit: {defs.format_number(df_revenue['revenue'].mean(), info['quotePrecision'])} {info['quoteCoin']} / trade")
-print(f"Minimum profit: {defs.format_number(df_revenue['revenue'].min(), info['quotePrecision'])} {info['quoteCoin']} / trade")
-print(f"Maximum profit: {defs.format_number(df_revenue['revenue'].max(), info['quotePrecision'])} {info['quoteCoin']} / trade")
+print(f"Average profit: {defs.format_number(total_revenue / sells, info['quotePrecision'])} {info['quoteCoin']} / trade")
+print(f"Minimum profit: {defs.format_number(daily['min'].min(), info['quotePrecision'])} {info['quoteCoin']} / trade")
+print(f"Maximum profit: {defs.format_number(daily['max'].max(), info['quotePrecision'])} {info['quoteCoin']} / trade")
 
 print()
 
 # Calculate the profit per day
-total_time_diff = df_revenue['createdTime'].max() - df_revenue['createdTime'].min()
+total_time_diff = rv_elem['span']
 days_diff = total_time_diff.total_seconds() / (24 * 3600)
 if days_diff > 0:
-    avg_profit_per_day = df_revenue['revenue'].sum() / days_diff
+    avg_profit_per_day = total_revenue / days_diff
     message_dp       = f"Daily profit  : {defs.format_number(avg_profit_per_day, info['quotePrecision'])} {info['quoteCoin']} / day"
     message_dp_graph = f"Daily profit: {defs.format_number(avg_profit_per_day, info['quotePrecision'])} {info['quoteCoin']}\n"
     print(message_dp)
@@ -202,29 +195,33 @@ else:
     message_dp_graph = "Daily profit  : N/A"
     print(message_dp)
 
-# Calculate today's profit
-today_date   = pd.Timestamp('now').normalize()
-today_profit = df_revenue[df_revenue['createdTime'].dt.normalize() == today_date]['revenue'].sum()
+# Calculate today's profit, days are in UTC
+today_date   = pd.Timestamp('now', tz='UTC').date()
+today_profit = df_revenue[df_revenue['date'] == today_date]['revenue'].sum()
 
 # Output today's profit
 print(f"Todays profit : {defs.format_number(today_profit, info['quotePrecision'])} {info['quoteCoin']} (today)")
 
 # Output total profit
-print(f"Trade profit  : {defs.format_number(df_revenue['revenue'].sum(), info['quotePrecision'])} {info['quoteCoin']} (alltime)")
+print(f"Trade profit  : {defs.format_number(total_revenue, info['quotePrecision'])} {info['quoteCoin']} (alltime)")
 if compounding['enabled'] or compounding['start'] != 0:
     print(f"Real profit   : {defs.format_number((spot * equity_base + equity_quote) - compounding['start'], info['tickSize'])} {info['quoteCoin']} (alltime)")
 
 print()
 
 # Get the number of days from the argument
-num_days = args.days
+num_days = loader.arguments['days']
 
 # Filter the df_revenue DataFrame to only include the last 'num_days' days
-date_threshold = pd.Timestamp('now').normalize() - pd.Timedelta(days=num_days)
-filtered_df_revenue = df_revenue[df_revenue['createdTime'] >= date_threshold]
+date_threshold = today_date - pd.Timedelta(days=num_days)
+filtered_df_revenue = df_revenue[df_revenue['date'] >= date_threshold]
+
+# Profit per day, already totaled by the revenue store
+profit_per_day = filtered_df_revenue.reset_index(drop=True)
 
-# Group the filtered revenue data by date and calculate the total profit per day
-profit_per_day = filtered_df_revenue.groupby('date')['revenue'].sum().reset_index()
+# Load plotting libraries, only needed for the graphs
+import matplotlib.pyplot as plt
+import seaborn as sns
 
 # Create a figure and subplots
 fig, axes = plt.subplots(2, 1, figsize=(14, 10))
@@ -238,7 +235,7 @@ fig.text(0.01, 0.98, message, ha='left', va='top', fontsize=12, fontname='DejaVu
 # Add top right text
 message = message_dp_graph
 message = message + f"Todays profit: {defs.format_number(today_profit, info['quotePrecision'])} {info['quoteCoin']}\n"
-message = message + f"Trade profit: {defs.format_number(df_revenue['revenue'].sum(), info['quotePrecision'])} {info['quoteCoin']}"
+message = message + f"Trade profit: {defs.format_number(total_revenue, info['quotePrecision'])} {info['quoteCoin']}"
 fig.text(0.99, 0.98, message, ha='right', va='top', fontsize=12, fontname='DejaVu Sans Mono')
 
 # First subplot: Outstanding orders
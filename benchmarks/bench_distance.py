@@ -0,0 +1,111 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark distance.calculate() per wiggle method on synthetic prices and check the EMA engine against pandas
+
+# Load external libraries
+from pathlib import Path
+import os, random, sys, time
+import pandas as pd
+
+# Run from the root of Sunflow so the internal libraries and config can be found
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Load internal libraries
+import defs, distance
+from generators import create_prices
+
+# Initialize variables
+methods = ["Fixed", "Spot", "Wave", "EMA", "ATR", "ChatGPT"]
+ticks   = 2000
+limit   = 250                # Klines of the ATR engine
+number  = 100000             # Prices, like a long running Sunflow with a large prices_limit
+spacing = (300, 1500)        # Irregular time in ms between ticks, the number of prices in wave_timeframe varies
+
+# Prefill ATR engine with synthetic klines, prevents requesting klines from the exchange
+def prefill_atr():
+
+    # Initialize variables
+    close = 1.0
+
+    # Random walk of 1 minute klines
+    distance.atr_reset()
+    for i in range(limit):
+        first = close
+        close = first * (1 + random.gauss(0, 0.001))
+        distance.atr_update({'high': max(first, close) * 1.0005, 'low': min(first, close) * 0.9995, 'close': close})
+
+    # Return
+    return
+
+# Benchmark one wiggle method
+def bench(method):
+
+    # Initialize variables
+    prices       = create_prices(number, 1.0, spacing)
+    active_order = {'side': "Sell", 'wiggle': method, 'distance': 0.1, 'fluctuation': 0.1, 'wave': 0.1, 'start': prices['price'][-1], 'current': prices['price'][-1]}
+    timings      = []
+
+    # Silence stdout of distance.calculate()
+    stdout     = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+
+    # Simulate ticks
+    for i in range(ticks):
+        prices['time'].append(prices['time'][-1] + random.randint(*spacing))
+        prices['price'].append(prices['price'][-1] * (1 + random.gauss(0, 0.0005)))
+        prices['time'].pop(0)
+        prices['price'].pop(0)
+        active_order['current'] = prices['price'][-1]
+        start        = time.perf_counter_ns()
+        active_order = distance.calculate(active_order, prices)
+        timings.append(time.perf_counter_ns() - start)
+
+    # Restore stdout
+    sys.stdout.close()
+    sys.stdout = stdout
+
+    # Return timings in microseconds
+    timings.sort()
+    return timings[len(timings) // 2] / 1000, timings[int(len(timings) * 0.99)] / 1000
+
+# Wave of the EMA wiggle calculated with pandas over all prices, like before the EMA engine
+def reference_ema(prices):
+    span = len(prices['time']) - defs.get_closest_index_sorted(prices, prices['time'][-1] - distance.config.wave_timeframe)
+    std  = pd.Series(prices['price']).pct_change().ewm(span=max(span, 1), adjust=False).std()
+    return std.iloc[-1] / std.max()
+
+# Check the EMA engine against pandas while prices are added and removed, returns the largest relative error
+def check_ema(number, checks):
+
+    # Initialize variables
+    prices = create_prices(number, 1.0, spacing)
+    error  = 0.0
+
+    # Simulate ticks, prices are removed from the front like handle_ticker() does
+    for i in range(checks):
+        prices['time'].append(prices['time'][-1] + random.randint(*spacing))
+        prices['price'].append(prices['price'][-1] * (1 + random.gauss(0, 0.0005)))
+        if i % 4:
+            prices['time'].pop(0)
+            prices['price'].pop(0)
+        wave      = distance.calculate_ema(prices)
+        reference = reference_ema(prices)
+        error     = max(error, abs(wave - reference) / reference)
+
+    # Return largest relative error
+    return error
+
+# Run benchmark
+if __name__ == "__main__":
+    random.seed(42)
+    prefill_atr()
+    print(f"Benchmark of distance.calculate() over {ticks} ticks with {number} prices {spacing[0]} to {spacing[1]} ms apart\n")
+    print(f"{'Method':<8}{'p50 (us)':>12}{'p99 (us)':>12}")
+    for method in methods:
+        result = bench(method)
+        print(f"{method:<8}{result[0]:>12.1f}{result[1]:>12.1f}")
+
+    # Check EMA engine against pandas
+    print()
+    for size in (250, 10000):
+        print(f"EMA wave differs at most {check_ema(size, 500):.1e} relative from pandas over {size} prices")
@@ -0,0 +1,131 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark the hot paths of Sunflow on synthetic data and track the results over time
+#
+# Handlers and calculations run on generated tickers, books, trades, klines and buy order databases, no
+# exchange is contacted and all files are written to a temporary folder. Results are added to results.jsonl
+# and compared to the previous run on the same host, the exit code is 1 when a case got slower:
+#
+#   python benchmarks/bench_hotpaths.py -c config.py
+
+# Load external libraries
+from pathlib import Path
+import random, sys
+
+# Run from the root of Sunflow so the internal libraries and config can be found
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Load internal libraries
+from loader import load_config
+import loader
+
+# Load config, data and log files go to a temporary folder
+config = load_config()
+import generators, track
+generators.sandbox(loader.configs[0])
+
+# Load internal libraries, after the config is sandboxed
+import bench_distance, context, database, defs, indicators, optimum, orders, sunflow
+
+# Initialize variables
+symbol  = config.symbol
+spot    = 1.0
+prices  = 120000                                                  # Prices of the ticker and optimizer cases, more than optimizer_limit_min
+buys    = 5000                                                    # Buy orders in the database
+levels  = 400                                                     # Levels per side of a books snapshot
+changes = 20                                                      # Levels per side of a books update
+burst   = 20                                                      # Trades per trades message
+runs    = 2000                                                    # Calls per case, slow cases use less
+results = {}
+
+# Prepare context of the symbol, nothing can be bought or sold so no order is ever placed
+def prepare():
+    ctx = sunflow.contexts[symbol]
+    ctx.info                    = generators.create_info(symbol)
+    ctx.spot                    = spot
+    ctx.prices                  = generators.create_prices(prices, spot)
+    ctx.all_buys                = generators.create_all_buys(buys, symbol, spot * 1.5, 0.1)
+    ctx.optimizer['enabled']    = False
+    ctx.use_spread['enabled']   = False
+    ctx.active_order['active']  = False
+    ctx.active_order['side']    = "Sell"
+    ctx.use_orderbook['window'] = 10 ** 12
+    return ctx
+
+# Handle tickers, every ticker has a new price
+def bench_ticker(ctx):
+    now      = defs.now_utc()[4]
+    messages = iter([generators.create_ticker(symbol, spot * (1 + random.gauss(0, 0.001)), now + i) for i in range(runs)])
+    return track.measure(lambda: sunflow.handle_ticker(ctx, next(messages)), runs)
+
+# Handle books, a snapshot followed by updates in sequence
+def bench_orderbook(ctx):
+    now      = defs.now_utc()[4]
+    messages = iter([generators.create_book(symbol, spot, changes, i + 2, i + 1, now + i) for i in range(runs)])
+    sunflow.handle_orderbook(ctx, generators.create_book(symbol, spot, levels, 1, -1, now, "snapshot"))
+    return track.measure(lambda: sunflow.handle_orderbook(ctx, next(messages)), runs)
+
+# Handle trades, bursts of trades in sequence
+def bench_trade(ctx):
+    now      = defs.now_utc()[4]
+    messages = iter([generators.create_trades(symbol, spot, burst, i * burst + 1, now + i) for i in range(runs)])
+    return track.measure(lambda: sunflow.handle_trade(ctx, next(messages)), runs)
+
+# Calculate indicators and advice of one interval
+def bench_indicators(ctx):
+    klines = generators.create_klines(config.indicators_limit, config.indicators_interval_1, spot)
+    return track.measure(lambda: indicators.advice(indicators.calculate(klines, spot)), runs // 20)
+
+# Check which buy orders can be sold, around spot so orders are sold
+def bench_check_sell(ctx):
+    all_buys = generators.create_all_buys(buys, symbol, spot, 0.1)
+    return track.measure(orders.check_sell, runs, spot, ctx.profit, ctx.active_order, all_buys, ctx.use_pricelimit, ctx.pricelimit_advice, ctx.info)
+
+# Check spread, no nearby order so the whole database is checked
+def bench_check_spread(ctx):
+    return track.measure(defs.check_spread, runs, ctx.all_buys, spot, 0.01)
+
+# Optimize profit and distance over the prices
+def bench_optimize(ctx):
+    ctx.optimizer['enabled'] = True
+    result = track.measure(lambda: optimum.optimize(ctx.prices, ctx.profit, ctx.active_order, ctx.use_spread, ctx.optimizer), runs // 100)
+    ctx.optimizer['enabled'] = False
+    return result
+
+# Save and load the database with all buys
+def bench_database(ctx, save):
+    if save:
+        return track.measure(database.save, runs // 20, ctx.all_buys, ctx.info)
+    return track.measure(database.load, runs // 20, config.dbase_file, ctx.info)
+
+# Run benchmark
+if __name__ == "__main__":
+    random.seed(42)
+    ctx = prepare()
+    print(f"Benchmark of the hot paths of Sunflow with {prices} prices and {buys} buy orders\n")
+
+    # Handlers and calculations of the symbol
+    with context.use(ctx):
+        results['handle_ticker']     = bench_ticker(ctx)
+        results['handle_orderbook']  = bench_orderbook(ctx)
+        results['handle_trade']      = bench_trade(ctx)
+        results['orders.check_sell'] = bench_check_sell(ctx)
+        results['defs.check_spread'] = bench_check_spread(ctx)
+        results['optimum.optimize']  = bench_optimize(ctx)
+        results['database.save']     = bench_database(ctx, True)
+        results['database.load']     = bench_database(ctx, False)
+
+        # Indicators need pandas_ta
+        try:
+            results['indicators.calculate'] = bench_indicators(ctx)
+        except ImportError as e:
+            print(f"Skipping indicators, {e}\n")
+
+        # Distance of every wiggle method, on the prices and ATR of the distance benchmark
+        bench_distance.prefill_atr()
+        for method in bench_distance.methods:
+            p50, p99 = bench_distance.bench(method)
+            results[f"distance.calculate {method}"] = {'p50': p50, 'p99': p99, 'mean': 0, 'runs': bench_distance.ticks}
+
+    # Report, record and fail on regressions
+    sys.exit(1 if track.report("hotpaths", results) else 0)
@@ -0,0 +1,367 @@
+### Sunflow Cryptobot ###
+#
+# Load test Sunflow end to end, how many websocket messages per second can one process handle
+#
+# A local server in a separate process sends OKX formatted tickers, books, trades-all and candle messages at
+# ramping rates. Sunflow connects to it instead of OKX and handles every message like it does live, only nothing
+# can be bought or sold. Every step reports the handled rate, handler lag (exchange time of a message until it was
+# handled), coalesced tickers, messages sent but not yet handled and CPU time per handled message. Ramping stops at
+# the first saturated step, this gives a saturation curve of every feature set. Results are added to results.jsonl:
+#
+#   python benchmarks/bench_load.py -c config.py
+
+# Load external libraries
+from pathlib import Path
+import asyncio, json, multiprocessing, os, random, sys, time, websockets
+
+# Run from the root of Sunflow so the internal libraries and config can be found
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Load internal libraries
+from loader import load_config
+import loader
+
+# Load config, data and log files go to a temporary folder
+config = load_config()
+import generators, track
+generators.sandbox(loader.configs[0])
+
+# Load internal libraries, after the config is sandboxed
+import runtime, sunflow
+
+# Initialize variables
+symbol    = config.symbol
+port      = 8766
+rates     = [50, 100, 200, 500, 1000, 2000, 5000, 10000]          # Messages per second of every channel, ramped up step by step
+warmup    = 1                                                     # Seconds at a new rate before measuring
+step      = 5                                                     # Seconds every rate is measured
+fraction  = 0.95                                                  # Fraction of the sent messages that must be handled, else saturated
+lag_limit = 250                                                   # Handler lag p99 in ms, above this a step is saturated
+levels    = 400                                                   # Levels per side of a books snapshot
+changes   = 20                                                    # Levels per side of a books update
+prices    = 120000                                                # Prices of the optimizer, more than optimizer_limit_min
+buys      = 5000                                                  # Buy orders in the database, all far above spot
+channels  = ("tickers", "books", "trades", "candles")             # Kinds of channels, messages are counted per kind
+terminal  = sys.stdout                                            # Sunflow reports to stdout, results go to the terminal
+stats     = {'handled': [0] * len(channels), 'coalesced': 0, 'lags': []}
+
+# Feature sets, every set enables more channels of the symbol
+features = {
+    "Tickers"                          : ("tickers",),
+    "Tickers, books"                   : ("tickers", "books"),
+    "Tickers, books, trades"           : ("tickers", "books", "trades"),
+    "Tickers, books, trades, candles"  : ("tickers", "books", "trades", "candles"),
+    "All channels, optimizer"          : ("tickers", "books", "trades", "candles", "optimizer")
+}
+
+# Kind of a channel
+def kind(channel):
+    if channel == "tickers":
+        return 0
+    if channel.startswith(("books", "bbo")):
+        return 1
+    if channel.startswith("trades"):
+        return 2
+    return 3
+
+
+### Server ###
+
+# Create the next message of a channel, all channels share one market
+def create(channel, market, ts):
+
+    # Random walk of the price, stays far below the buy orders
+    market['price'] = min(max(market['price'] * (1 + random.gauss(0, 0.00002)), 0.9), 1.1)
+    price           = market['price']
+
+    # Books continue the sequence, only the books channel sends updates
+    if kind(channel) == 1:
+        market['seq'] = market['seq'] + 1
+        if channel == "books":
+            return generators.create_book(symbol, price, changes, market['seq'], market['seq'] - 1, ts)
+        return generators.create_book(symbol, price, 5 if channel == "books5" else 1, market['seq'], -1, ts, "snapshot")
+
+    # Trade IDs increase by one, also over reconnects
+    if kind(channel) == 2:
+        market['trade'] = market['trade'] + 1
+        return generators.create_trades(symbol, price, 1, market['trade'], ts)
+
+    # Tickers and candles
+    if kind(channel) == 0:
+        return generators.create_ticker(symbol, price, ts)
+    return generators.create_candle(symbol, channel.replace("candle", "", 1), price, ts)
+
+# Send messages of one channel at the current rate
+async def stream(ws, channel, rate, sent, market):
+
+    # Initialize variables
+    index   = kind(channel)
+    current = 0
+    count   = 0
+    start   = time.perf_counter()
+
+    # Books start with a snapshot
+    try:
+        if channel == "books":
+            market['seq'] = market['seq'] + 1
+            await ws.send(json.dumps(generators.create_book(symbol, market['price'], levels, market['seq'], -1, int(time.time() * 1000), "snapshot")))
+
+        # Send messages when due, restart pacing when the rate changed
+        while True:
+            if rate.value != current:
+                current = rate.value
+                count   = 0
+                start   = time.perf_counter()
+
+            # A server that falls behind skips messages instead of sending bursts, sent rate shows it
+            due = int((time.perf_counter() - start) * current) - count
+            if due > current / 10:
+                count = count + due - 1
+                due   = 1
+            for i in range(due):
+                await ws.send(json.dumps(create(channel, market, int(time.time() * 1000))))
+                count       = count + 1
+                sent[index] = sent[index] + 1
+            await asyncio.sleep(0.001)
+
+    # Client closed connection
+    except websockets.exceptions.ConnectionClosed:
+        return
+
+# Handle subscriptions of a client, like OKX every channel is confirmed with an event
+async def connection(ws, rate, sent, market):
+
+    # Initialize variables
+    tasks = {}
+
+    # Start and stop streams
+    try:
+        async for raw in ws:
+            if raw == "ping":
+                await ws.send("pong")
+                continue
+            request = json.loads(raw)
+            for arg in request.get('args', []):
+                channel = arg.get('channel', "")
+                if request.get('op') == "subscribe" and channel not in tasks:
+                    await ws.send(json.dumps({'event': "subscribe", 'arg': arg, 'connId': "load"}))
+                    tasks[channel] = asyncio.create_task(stream(ws, channel, rate, sent, market))
+                elif request.get('op') == "unsubscribe" and channel in tasks:
+                    tasks.pop(channel).cancel()
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+# Serve every client, runs in its own process
+def serve(rate, sent):
+
+    # Initialize variables
+    market = {'price': 1.0, 'seq': 1, 'trade': 1000000}
+
+    # Serve forever
+    async def main():
+        async with websockets.serve(lambda ws: connection(ws, rate, sent, market), "127.0.0.1", port, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+
+### Client ###
+
+# Count and time every message of the load server after Sunflow handled it, messages start with their channel
+def timed(callback):
+
+    def receive(raw, *args):
+
+        # Events are not counted
+        if not raw.startswith('{"arg"'):
+            return callback(raw, *args)
+
+        # Handle message
+        ctx    = sunflow.contexts[symbol]
+        before = ctx.ticker_ts
+        callback(raw, *args)
+        now    = time.time() * 1000
+
+        # Count message, a ticker that did not move the ticker time was coalesced
+        start = raw.find('"channel": "') + 12
+        index = kind(raw[start:raw.find('"', start)])
+        stats['handled'][index] = stats['handled'][index] + 1
+        if index == 0 and ctx.ticker_ts == before:
+            stats['coalesced'] = stats['coalesced'] + 1
+
+        # Lag since the exchange time, candles only have the start time of the kline
+        start = raw.rfind('"ts": "')
+        if start > 0:
+            start = start + 7
+            stats['lags'].append(now - int(raw[start:raw.find('"', start)]))
+
+    return receive
+
+# Prepare Sunflow, connect to the load server and nothing can be bought or sold
+def prepare():
+
+    # Connect to the load server with one public websocket
+    loader.configs[0].api_ws_public     = f"ws://127.0.0.1:{port}/ws/v5/public"
+    loader.configs[0].api_ws_business   = f"ws://127.0.0.1:{port}/ws/v5/business"
+    loader.configs[0].websocket_standby = False
+    sunflow.on_message_public           = timed(sunflow.on_message_public)
+    sunflow.on_message_business         = timed(sunflow.on_message_business)
+
+    # Context of the symbol, without indicators and spread no buy order is placed and all buy orders are far above spot
+    ctx = sunflow.contexts[symbol]
+    ctx.info                      = generators.create_info(symbol)
+    ctx.spot                      = 1.0
+    ctx.prices                    = generators.create_prices(prices, ctx.spot)
+    ctx.all_buys                  = generators.create_all_buys(buys, symbol, ctx.spot * 1.5, 0.1)
+    ctx.active_order['active']    = False
+    ctx.use_indicators['enabled'] = False
+    ctx.use_spread['enabled']     = False
+    ctx.periodic['enabled']       = False
+    ctx.reload['delay']           = 0
+    return ctx
+
+# Enable the channels and calculations of a feature set
+def apply(ctx, feature):
+    ctx.use_orderbook['enabled'] = "books" in feature
+    ctx.use_trade['enabled']     = "trades" in feature
+    ctx.candles                  = {"candle1m": True} if "candles" in feature else {}
+    ctx.active_order['wiggle']   = "ATR" if "candles" in feature else "Fixed"
+    ctx.optimizer['enabled']     = "optimizer" in feature
+
+# Counters at this moment
+def snapshot(sent):
+    return {'time': time.perf_counter(), 'cpu': time.process_time(), 'sent': sum(sent[:]), 'handled': sum(stats['handled']), 'coalesced': stats['coalesced']}
+
+# Wait until the websockets of a feature set replaced the old websockets
+async def connected(old):
+    for i in range(100):
+        runners = sunflow._state["runners"]
+        if runners and not set(runners) & old and all(r.health["connected"] for r in runners):
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+# Wait until the messages sent are handled or no more messages are handled
+async def drain(sent):
+    handled = -1
+    while handled != sum(stats['handled']):
+        handled = sum(stats['handled'])
+        await asyncio.sleep(1)
+
+# Ramp up the rate of a feature set until saturated
+async def ramp(ctx, name, feature, rate, sent):
+
+    # Initialize variables
+    rows    = []
+    streams = len([channel for channel in channels if channel in feature])
+
+    # Resubscribe to the channels of the feature set
+    apply(ctx, feature)
+    old = set(sunflow._state["runners"])
+    sunflow.request_resubscribe(f"Load benchmark of {name}")
+    if not await connected(old):
+        print(f"{name}: failed to connect to the load server\n", file=terminal)
+        return rows
+    first = snapshot(sent)
+    base  = first['sent'] - first['handled']
+
+    # Report to terminal
+    print(name, file=terminal)
+    print(f"{'Rate':>8}{'Sent/s':>10}{'Handled/s':>11}{'Lag p50':>10}{'Lag p99':>10}{'Coalesced':>11}{'Backlog':>9}{'CPU/msg':>9}", file=terminal)
+
+    # Measure every rate after warming up
+    for value in rates:
+        rate.value = value
+        await asyncio.sleep(warmup)
+        first = snapshot(sent)
+        stats['lags'] = []
+        await asyncio.sleep(step)
+        last  = snapshot(sent)
+        lags  = sorted(stats['lags'])
+
+        # Results of step, lag in ms and CPU time in us per handled message
+        seconds = last['time'] - first['time']
+        handled = last['handled'] - first['handled']
+        row     = {
+            'rate': value * streams, 'sent': (last['sent'] - first['sent']) / seconds, 'handled': handled / seconds,
+            'lag_p50': lags[len(lags) // 2] if lags else 0.0, 'lag_p99': lags[int(len(lags) * 0.99)] if lags else 0.0,
+            'coalesced': last['coalesced'] - first['coalesced'], 'backlog': last['sent'] - last['handled'] - base,
+            'cpu': (last['cpu'] - first['cpu']) * 1e6 / handled if handled else 0.0
+        }
+        row['saturated'] = row['handled'] < row['sent'] * fraction or row['lag_p99'] > lag_limit
+        row['limited']   = row['sent'] < row['rate'] * fraction
+        rows.append(row)
+
+        # Report to terminal
+        note = "  SATURATED" if row['saturated'] else "  SERVER LIMITED" if row['limited'] else ""
+        print(f"{row['rate']:>8}{row['sent']:>10.0f}{row['handled']:>11.0f}{row['lag_p50']:>10.1f}{row['lag_p99']:>10.1f}{row['coalesced']:>11}{row['backlog']:>9}{row['cpu']:>9.1f}{note}", file=terminal)
+
+        # Stop at saturation, or when the server can not send more
+        if row['saturated'] or row['limited']:
+            break
+
+    # Let Sunflow catch up before the next feature set
+    rate.value = 0
+    await drain(sent)
+    print(file=terminal)
+
+    # Return steps
+    return rows
+
+# Run Sunflow and ramp up every feature set
+async def load(rate, sent):
+
+    # Initialize variables
+    ctx     = prepare()
+    results = {}
+
+    # Run Sunflow, silence its reports to stdout
+    sys.stdout = open(os.devnull, 'w')
+    task       = asyncio.create_task(sunflow.main())
+    try:
+        for name, feature in features.items():
+            results[name] = await ramp(ctx, name, feature, rate, sent)
+    finally:
+        sunflow.halt_event.set()
+        await task
+        sys.stdout.close()
+        sys.stdout = terminal
+
+    # Return steps of every feature set
+    return results
+
+# Run benchmark
+if __name__ == "__main__":
+
+    # Start server, rate and sent messages are shared with the server process
+    rate   = multiprocessing.Value('d', 0.0)
+    sent   = multiprocessing.Array('q', len(channels))
+    server = multiprocessing.Process(target=serve, args=(rate, sent), daemon=True)
+    server.start()
+    time.sleep(1)
+
+    # Ramp up every feature set
+    print(f"Load test of Sunflow with {rates[0]} to {rates[-1]} messages per second per channel, lag in ms and CPU in us\n")
+    random.seed(42)
+    results = runtime.run(load(rate, sent))
+
+    # Stop server
+    server.terminate()
+
+    # Saturation point is the highest rate that was handled, compared to the previous run on this host, without previous result on the first run of a feature set
+    before  = track.previous("load")
+    summary = {}
+    print(f"{'Feature set':<36}{'Saturation':>12}{'Previous':>12}{'Change':>9}")
+    for name, rows in results.items():
+        handled       = [row['rate'] for row in rows if not row['saturated']]
+        summary[name] = {'saturation': max(handled, default=0), 'steps': rows}
+        last          = f"{before[name]['saturation']}" if track.baseline(before, name, 'saturation') else "-"
+        change        = f"{(summary[name]['saturation'] / before[name]['saturation'] - 1) * 100:+.0f}%" if track.baseline(before, name, 'saturation') else ""
+        print(f"{name:<36}{summary[name]['saturation']:>12}{last:>12}{change:>9}")
+
+    # Record results
+    track.record("load", summary)
+    print(f"\nResults added to {track.results_file}")
@@ -0,0 +1,102 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark websocket throughput and handler lag of the default and the performance runtime
+#
+# A local server in a separate process replays a high rate OKX books stream, the client decodes
+# every message like on_message_public() does. Throughput is messages per second received by the
+# handler, lag is the time between the server sending a message and the handler receiving it.
+# Results depend on the host, run this benchmark on the machine Sunflow runs on:
+#
+#   python benchmarks/bench_runtime.py -c config.py
+
+# Load external libraries
+from pathlib import Path
+import asyncio, json, multiprocessing, random, sys, time, websockets
+
+# Run from the root of Sunflow so the internal libraries and config can be found
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Load internal libraries
+from loader import load_config
+
+# Load config
+config = load_config()
+
+# Initialize variables
+port     = 8765
+messages = 50000
+levels   = 400
+
+# Create synthetic books message with the time it was sent
+def create_book(price):
+    bids = [[f"{price - i * 0.0001:.4f}", f"{random.uniform(1, 1000):.2f}", "0", "1"] for i in range(levels // 2)]
+    asks = [[f"{price + i * 0.0001:.4f}", f"{random.uniform(1, 1000):.2f}", "0", "1"] for i in range(levels // 2)]
+    return {'arg': {'channel': "books", 'instId': config.symbol}, 'action': "update", 'data': [{'asks': asks, 'bids': bids, 'ts': "0", 'checksum': 0, 'seqId': 0, 'prevSeqId': 0}]}
+
+# Replay books stream to every client as fast as possible
+def serve():
+
+    # Prepare messages, only the send time changes
+    book = create_book(1.0)
+
+    # Send all messages to a client
+    async def replay(ws):
+        for i in range(messages):
+            book['data'][0]['ts'] = str(time.time_ns())
+            await ws.send(json.dumps(book))
+        await ws.close()
+
+    # Serve forever
+    async def main():
+        async with websockets.serve(replay, "127.0.0.1", port, max_size=None):
+            await asyncio.Future()
+
+    asyncio.run(main())
+
+# Receive stream and measure
+async def receive(options):
+
+    # Initialize variables
+    lags  = []
+    count = 0
+
+    # Receive and decode every message like the websocket handler
+    start = time.perf_counter()
+    async with websockets.connect(f"ws://127.0.0.1:{port}", **options) as ws:
+        async for raw in ws:
+            message = json.loads(raw)
+            lags.append(time.time_ns() - int(message['data'][0]['ts']))
+            count = count + 1
+    seconds = time.perf_counter() - start
+
+    # Return messages per second and lag in ms
+    lags.sort()
+    return count / seconds, lags[len(lags) // 2] / 1e6, lags[int(len(lags) * 0.99)] / 1e6
+
+# Run benchmark
+if __name__ == "__main__":
+
+    # Runtimes to compare
+    default = {}
+    tuned   = {'max_size': config.runtime_max_size, 'max_queue': config.runtime_max_queue, 'compression': "deflate" if config.runtime_compression else None, 'ping_interval': config.runtime_ping_interval, 'ping_timeout': config.runtime_ping_timeout}
+    runs    = [("Default", default, asyncio.run), ("Tuned", tuned, asyncio.run)]
+    try:
+        import uvloop
+        runs.append(("Tuned + uvloop", tuned, uvloop.run))
+    except ImportError:
+        print("uvloop is not installed, skipping uvloop\n")
+
+    # Start server
+    server = multiprocessing.Process(target=serve, daemon=True)
+    server.start()
+    time.sleep(1)
+
+    # Measure every runtime
+    print(f"Benchmark of {messages} books messages with {levels} levels each\n")
+    print(f"{'Runtime':<16}{'msg/s':>10}{'lag p50 (ms)':>15}{'lag p99 (ms)':>15}")
+    for name, options, run in runs:
+        result = run(receive(options))
+        print(f"{name:<16}{result[0]:>10.0f}{result[1]:>15.2f}{result[2]:>15.2f}")
+
+    # Stop server
+    server.terminate()
@@ -0,0 +1,75 @@
+### Sunflow Cryptobot ###
+#
+# Benchmark startup time, everything Sunflow imports before it preloads data and subscribes to the websockets
+#
+# Every import is measured with python -X importtime in a fresh interpreter, the slowest modules are
+# shown and the heavy libraries that should only be imported by enabled features are checked:
+#
+#   python benchmarks/bench_startup.py -c config.py
+
+# Load external libraries
+from pathlib import Path
+import subprocess, sys
+
+# Run from the root of Sunflow so the internal libraries and config can be found
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+
+# Load internal libraries
+from loader import load_config
+
+# Load config
+config = load_config()
+
+# Initialize variables
+target  = 1000                                                              # Target time in ms to import everything
+runs    = 5                                                                 # Fresh interpreters to measure, the fastest run is used
+top     = 15                                                                # Number of slowest modules to show
+heavy   = ["pandas", "pandas_ta", "apprise", "matplotlib", "seaborn"]       # Only imported by features that use them
+imports = "import broker, cache, context, database, defs, distance, gaps, loader, optimum, orders, preload, runtime, storage, tradeflow, trailing"
+
+# Import the internal libraries of Sunflow in a fresh interpreter, returns the times in ms and the heavy libraries loaded
+def measure():
+
+    # Initialize variables
+    times = {}
+    code  = f"import sys; sys.argv = ['sunflow.py', '-c', {config.__file__!r}]; {imports}; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+
+    # Import with import time reporting
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=root, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit()
+
+    # Parse lines like "import time:  self [us] | cumulative | imported package", nested imports are indented
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name[1:]] = int(cumulative) / 1000
+
+    # Return times and heavy libraries
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return times, loaded
+
+# Run benchmark
+if __name__ == "__main__":
+
+    # Measure several runs, the fastest run has the least noise of the system, only top level imports add up
+    results = [measure() for _ in range(runs)]
+    totals  = [sum(value for name, value in result[0].items() if not name.startswith(" ")) for result in results]
+    total   = min(totals)
+    times, loaded = results[totals.index(total)]
+
+    # Report slowest modules
+    print(f"Startup imports of Sunflow, fastest of {runs} runs\n")
+    print(f"{'Module':<40}{'Cumulative (ms)':>16}")
+    for name, value in sorted(times.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"{name.strip():<40}{value:>16.1f}")
+
+    # Report totals
+    print(f"\nTotal import time is {total:.0f} ms, target is {target} ms: {'OK' if total <= target else 'TOO SLOW'}")
+    if loaded:
+        print(f"Heavy libraries imported at startup: {', '.join(loaded)}")
+    else:
+        print("No heavy libraries imported at startup")
@@ -0,0 +1,117 @@
+### Sunflow Cryptobot ###
+#
+# Synthetic data for the benchmarks, shaped like the data Sunflow receives from OKX and keeps in its databases
+
+# Load external libraries
+import os, random, tempfile
+
+# Load internal libraries
+import cache, defs
+
+# Create synthetic prices, one price every 100 to 400ms by default
+def create_prices(number, price=1.0, spacing=(100, 400)):
+
+    # Initialize variables
+    prices = {'time': [], 'price': []}
+    now    = defs.now_utc()[4] - (number * sum(spacing) // 2)
+
+    # Random walk
+    for i in range(number):
+        now   = now + random.randint(*spacing)
+        price = price * (1 + random.gauss(0, 0.0005))
+        prices['time'].append(now)
+        prices['price'].append(price)
+
+    # Return prices
+    return prices
+
+# Create synthetic klines up till now
+def create_klines(number, interval="1m", price=1.0):
+
+    # Initialize variables
+    klines = cache.empty()
+    ms     = defs.interval_ms(interval)
+    start  = defs.now_utc()[4] // ms * ms - (number - 1) * ms
+
+    # Random walk of closing prices
+    for i in range(number):
+        first  = price
+        price  = first * (1 + random.gauss(0, 0.001))
+        volume = random.uniform(1000, 100000)
+        klines['time'].append(start + i * ms)
+        klines['open'].append(first)
+        klines['high'].append(max(first, price) * (1 + random.uniform(0, 0.001)))
+        klines['low'].append(min(first, price) * (1 - random.uniform(0, 0.001)))
+        klines['close'].append(price)
+        klines['volume'].append(volume)
+        klines['turnover'].append(volume * price)
+        klines['status'].append(i < number - 1)
+
+    # Return klines
+    return klines
+
+# Create synthetic instrument info
+def create_info(symbol="XRP-EUR"):
+    base, _, quote = symbol.partition("-")
+    return {'time': defs.now_utc()[4], 'symbol': symbol, 'baseCoin': base, 'quoteCoin': quote, 'status': "live", 'basePrecision': 0.000001, 'quotePrecision': 0.0001, 'minOrderQty': 1.0, 'tickSize': 0.0001, 'minBuyBase': 1.0, 'minBuyQuote': 1.0}
+
+# Create synthetic tickers message
+def create_ticker(symbol, price, ts):
+    return {'arg': {'channel': "tickers", 'instId': symbol}, 'data': [{'instId': symbol, 'last': f"{price:.6f}", 'ts': str(ts)}]}
+
+# Create synthetic books message, a snapshot holds every level and an update holds a few changed levels
+def create_book(symbol, price, levels, seq, prev, ts, action="update"):
+
+    # Initialize variables
+    tick = price * 0.0001
+
+    # Levels around price
+    bids = [[f"{price - (i + 1) * tick:.6f}", f"{random.uniform(1, 1000):.2f}", "0", "1"] for i in range(levels)]
+    asks = [[f"{price + (i + 1) * tick:.6f}", f"{random.uniform(1, 1000):.2f}", "0", "1"] for i in range(levels)]
+
+    # Return books message
+    return {'arg': {'channel': "books", 'instId': symbol}, 'action': action, 'data': [{'asks': asks, 'bids': bids, 'ts': str(ts), 'checksum': 0, 'seqId': seq, 'prevSeqId': prev}]}
+
+# Create synthetic burst of trades, trade IDs increase by one
+def create_trades(symbol, price, number, first_id, ts):
+    data = [{'instId': symbol, 'tradeId': str(first_id + i), 'px': f"{price * (1 + random.gauss(0, 0.0002)):.6f}", 'sz': f"{random.expovariate(0.01):.2f}", 'side': random.choice(["buy", "sell"]), 'ts': str(ts)} for i in range(number)]
+    return {'arg': {'channel': "trades", 'instId': symbol}, 'data': data}
+
+# Create synthetic candle message of the running kline
+def create_candle(symbol, interval, price, ts):
+    ms     = defs.interval_ms(interval)
+    volume = random.uniform(1000, 100000)
+    row    = [str(ts // ms * ms), f"{price * 0.9995:.6f}", f"{price * 1.001:.6f}", f"{price * 0.999:.6f}", f"{price:.6f}", f"{volume:.2f}", f"{volume:.2f}", f"{volume * price:.2f}", "0"]
+    return {'arg': {'channel': "candle" + interval, 'instId': symbol}, 'data': [row]}
+
+# Create synthetic database of filled buy orders spread around price
+def create_all_buys(number, symbol="XRP-EUR", price=1.0, spread=0.2):
+
+    # Initialize variables
+    all_buys = []
+    now      = defs.now_utc()[4]
+
+    # Every buy order is a filled trailing buy
+    for i in range(number):
+        avg_price = price * (1 + random.uniform(-spread, spread))
+        qty       = round(random.uniform(10, 100), 6)
+        all_buys.append({
+            'createdTime': now - i * 60000, 'updatedTime': now - i * 60000, 'orderid': str(1000000000 + i), 'linkedid': str(2000000000 + i),
+            'symbol': symbol, 'side': "Buy", 'orderType': "Market", 'orderStatus': "Effective", 'qty': qty, 'triggerPrice': avg_price,
+            'avgPrice': avg_price, 'cumExecQty': qty, 'cumExecValue': qty * avg_price, 'cumExecFee': qty * 0.001, 'cumExecFeeCcy': symbol.split("-")[0],
+            'status': "Closed"
+        })
+
+    # Return all buys
+    return all_buys
+
+# Write the data and log files of a config to a temporary folder, benchmarks never touch the files of a running bot
+def sandbox(config):
+    folder               = tempfile.mkdtemp(prefix="sunflow_bench_") + os.sep
+    config.data_folder   = folder
+    config.data_suffix   = folder
+    config.dbase_file    = folder + "orders.json"
+    config.exchange_file = folder + "exchange.log"
+    config.error_file    = folder + "errors.log"
+    config.revenue_file  = folder + "revenue.log"
+    return folder
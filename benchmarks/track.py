@@ -0,0 +1,101 @@
+### Sunflow Cryptobot ###
+#
+# Measure benchmark cases and track the results over time in results.jsonl, a slower case than the previous
+# run on the same host is reported as a regression
+
+# Load external libraries
+from pathlib import Path
+import json, os, platform, subprocess, sys, time
+
+# Initialize variables
+results_file = Path(__file__).resolve().parent / "results.jsonl"    # Results of every run, one JSON object per line
+threshold    = 0.25                                                 # Fraction p50 may be slower than the previous run before it is a regression
+
+# Measure a function, returns p50, p99 and mean in microseconds
+def measure(function, number, *args):
+
+    # Initialize variables
+    timings = []
+
+    # Time every call, silence stdout of the functions of Sunflow
+    stdout     = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for i in range(number):
+            start = time.perf_counter_ns()
+            function(*args)
+            timings.append(time.perf_counter_ns() - start)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    # Return timings in microseconds
+    timings.sort()
+    return {'p50': timings[len(timings) // 2] / 1000, 'p99': timings[int(len(timings) * 0.99)] / 1000, 'mean': sum(timings) / len(timings) / 1000, 'runs': number}
+
+# Commit of the code that was measured
+def commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=results_file.parent, capture_output=True, text=True)
+        return result.stdout.strip()
+    except OSError:
+        return ""
+
+# Previous results of a benchmark on this host
+def previous(benchmark):
+
+    # No results yet
+    if not results_file.exists():
+        return {}
+
+    # Last run of the same benchmark on the same host
+    last = {}
+    with open(results_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                run = json.loads(line)
+            except ValueError:
+                continue
+            if run.get('benchmark') == benchmark and run.get('host') == platform.node():
+                last = run
+
+    # Return results
+    return last.get('results', {})
+
+# Check if a case has a previous result to compare to, by default its median
+def baseline(before, case, key='p50'):
+    return bool(before.get(case, {}).get(key))
+
+# Compare results to the previous run, returns the cases that got slower than the threshold, new cases are skipped
+def compare(benchmark, results):
+    before = previous(benchmark)
+    return {case: (before[case]['p50'], result['p50']) for case, result in results.items() if baseline(before, case) and result['p50'] > before[case]['p50'] * (1 + threshold)}
+
+# Add results of a run to the results file
+def record(benchmark, results):
+    run = {'time': int(time.time() * 1000), 'benchmark': benchmark, 'commit': commit(), 'host': platform.node(), 'python': platform.python_version(), 'results': results}
+    with open(results_file, 'a', encoding='utf-8') as file:
+        file.write(json.dumps(run) + "\n")
+
+# Report results and regressions, compared before recording, returns the number of regressions
+def report(benchmark, results):
+
+    # Compare to previous run
+    regressions = compare(benchmark, results)
+    before      = previous(benchmark)
+
+    # Report every case, without previous result on the first run of a case
+    print(f"{'Case':<36}{'p50 (us)':>12}{'p99 (us)':>12}{'Previous':>12}{'Change':>9}")
+    for case, result in results.items():
+        last   = f"{before[case]['p50']:.1f}" if baseline(before, case) else "-"
+        change = f"{(result['p50'] / before[case]['p50'] - 1) * 100:+.0f}%" if baseline(before, case) else ""
+        print(f"{case:<36}{result['p50']:>12.1f}{result['p99']:>12.1f}{last:>12}{change:>9}{'  SLOWER' if case in regressions else ''}")
+
+    # Record and report regressions
+    record(benchmark, results)
+    print(f"\nResults added to {results_file}")
+    if regressions:
+        print(f"{len(regressions)} cases are more than {threshold * 100:.0f}% slower than the previous run on this host")
+
+    # Return number of regressions
+    return len(regressions)
@@ -0,0 +1,105 @@
+### Sunflow Cryptobot ###
+#
+# Broker of the supervisor, shares the rate limit budget of the exchange and collects metrics of all workers
+
+# Load external libraries
+from multiprocessing.managers import BaseManager
+import os, secrets, threading, time
+
+# Initialize variables
+broker_env = "SUNFLOW_BROKER"    # Environment variable with address and key of the broker, set by the supervisor for every worker
+client     = {}                  # Connection of this worker to the broker
+
+# Rate limit budgets and metrics of all workers, lives in the supervisor
+class Broker:
+
+    # Initialize budgets and reports
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.budgets = {}
+        self.reports = {}
+
+    # Reserve one request of a budget, returns the delay in seconds before the request may be sent
+    def reserve(self, name, per_second):
+
+        # Only one worker at a time takes a token
+        with self.lock:
+
+            # Refill tokens, at most one second of requests
+            now    = time.monotonic()
+            budget = self.budgets.setdefault(name, {'tokens': per_second, 'time': now, 'waited': 0})
+            budget['tokens'] = min(per_second, budget['tokens'] + ((now - budget['time']) * per_second))
+            budget['time']   = now
+
+            # Take token, when there are none left the worker waits until its token is refilled
+            budget['tokens'] = budget['tokens'] - 1
+            delay = 0.0
+            if budget['tokens'] < 0:
+                delay = -budget['tokens'] / per_second
+                budget['waited'] = budget['waited'] + int(delay * 1000)
+
+        # Return delay
+        return delay
+
+    # Store metrics of a symbol
+    def report(self, symbol, metrics):
+        with self.lock:
+            self.reports[symbol] = metrics
+
+    # Get metrics of all symbols
+    def get_reports(self):
+        with self.lock:
+            return dict(self.reports)
+
+    # Get time in ms every budget waited in total
+    def get_waited(self):
+        with self.lock:
+            return {name: budget['waited'] for name, budget in self.budgets.items()}
+
+# Manager that serves the broker to the workers
+class BrokerManager(BaseManager):
+    pass
+
+# Start broker in a background thread of the supervisor, returns the broker and the value for broker_env
+def serve():
+
+    # Initialize variables
+    broker  = Broker()
+    authkey = secrets.token_bytes(16)
+
+    # Serve broker on localhost only
+    BrokerManager.register('get_broker', callable=lambda: broker)
+    manager = BrokerManager(address=('127.0.0.1', 0), authkey=authkey)
+    server  = manager.get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Return broker and address
+    host, port = server.address
+    return broker, f"{host}:{port}:{authkey.hex()}"
+
+# Connect to the broker of the supervisor, returns None when not running under the supervisor
+def connect():
+
+    # Only connect once
+    if 'broker' in client:
+        return client['broker']
+    client['broker'] = None
+
+    # Not running under the supervisor
+    value = os.environ.get(broker_env)
+    if not value:
+        return client['broker']
+
+    # Connect to broker
+    host, port, authkey = value.split(":")
+    BrokerManager.register('get_broker')
+    manager = BrokerManager(address=(host, int(port)), authkey=bytes.fromhex(authkey))
+    manager.connect()
+    client['broker'] = manager.get_broker()
+
+    # Return broker
+    return client['broker']
+
+# Disconnect from the broker, for example when the supervisor is gone
+def disconnect():
+    client['broker'] = None
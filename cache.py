@@ -0,0 +1,205 @@
+### Sunflow Cryptobot ###
+#
+# Shared kline cache, serves indicators, prices, optimizer and ATR from memory
+
+# Load external libraries
+from loader import load_config
+import threading
+
+# Load internal libraries
+import context, defs, preload, storage
+
+# Load config
+config = load_config()
+
+# Create kline cache of a symbol
+def new_state():
+
+    # Initialize kline store, keyed by (symbol, interval)
+    store = {}
+    locks = {}    # One lock per key, only one thread at a time loads klines of an interval
+
+    # Initialize cache statistics
+    stats              = {}
+    stats['hits']      = 0        # Requests served from memory
+    stats['disk']      = 0        # Requests served from disk
+    stats['derived']   = 0        # Requests served by combining klines of a smaller interval
+    stats['fetches']   = 0        # Requests that needed the exchange
+
+    # Return state
+    return {'store': store, 'stats': stats, 'locks': locks, 'lock': threading.Lock()}
+
+# Intervals in ms that can be derived from smaller intervals, larger intervals are aligned to Hong Kong time by the exchange
+intervals = {'1m': 60000, '3m': 180000, '5m': 300000, '15m': 900000, '30m': 1800000, '1H': 3600000, '2H': 7200000, '4H': 14400000}
+
+# Kline keys
+keys = ['time', 'open', 'high', 'low', 'close', 'volume', 'turnover', 'status']
+
+# Create empty klines
+def empty():
+    return {key: [] for key in keys}
+
+# Copy the last limit klines
+def tail(klines, limit):
+    return {key: klines[key][-limit:] for key in keys}
+
+# Add or update a single kline, klines are in chronological order
+def merge(kline, klines):
+
+    # Update the last kline, most common case
+    if klines['time'] and kline['time'] == klines['time'][-1]:
+        for key in keys:
+            klines[key][-1] = kline[key]
+
+    # Append a new kline
+    elif not klines['time'] or kline['time'] > klines['time'][-1]:
+        for key in keys:
+            klines[key].append(kline[key])
+
+    # Update an older kline
+    elif kline['time'] in klines['time']:
+        index = klines['time'].index(kline['time'])
+        for key in keys:
+            klines[key][index] = kline[key]
+
+    # Return klines
+    return klines
+
+# Combine klines of a smaller interval into klines of a larger interval
+def combine(source, source_ms, target_ms):
+
+    # Initialize variables
+    klines = empty()
+    number = target_ms // source_ms
+    count  = 0
+
+    # Group source klines on start time of target interval
+    for i in range(len(source['time'])):
+        start = source['time'][i] - (source['time'][i] % target_ms)
+        if klines['time'] and klines['time'][-1] == start:
+            klines['high'][-1]     = max(klines['high'][-1], source['high'][i])
+            klines['low'][-1]      = min(klines['low'][-1], source['low'][i])
+            klines['close'][-1]    = source['close'][i]
+            klines['volume'][-1]   = klines['volume'][-1] + source['volume'][i]
+            klines['turnover'][-1] = klines['turnover'][-1] + source['turnover'][i]
+            count = count + 1
+        else:
+            if klines['time'] and count != number:
+                klines['status'][-1] = -1
+            for key, value in zip(keys, [start, source['open'][i], source['high'][i], source['low'][i], source['close'][i], source['volume'][i], source['turnover'][i], 0]):
+                klines[key].append(value)
+            count = 1
+        klines['status'][-1] = 1 if (count == number and source['status'][i] == 1) else 0
+
+    # Incomplete target klines can only be at the start or end
+    if klines['time'] and klines['status'][0] != 1 and len(klines['time']) > 1:
+        for key in keys:
+            klines[key].pop(0)
+    if -1 in klines['status']:
+        return empty()
+
+    # Return klines
+    return klines
+
+# Try to derive klines from a smaller interval already in the store
+def derive(symbol, interval, limit):
+
+    # Initialize variables
+    klines = empty()
+    store  = context.current().cache['store']
+
+    # Only intervals aligned to UTC
+    if interval not in intervals:
+        return klines
+
+    # Find the largest smaller interval with enough klines
+    for source_interval, source_ms in sorted(intervals.items(), key=lambda item: item[1], reverse=True):
+        target_ms = intervals[interval]
+        if source_ms >= target_ms or target_ms % source_ms != 0:
+            continue
+        source = store.get((symbol, source_interval))
+        if not source or len(source['klines']['time']) < (limit + 1) * (target_ms // source_ms):
+            continue
+        klines = combine(source['klines'], source_ms, target_ms)
+        if len(klines['time']) >= limit:
+            return klines
+
+    # Return klines
+    return empty()
+
+# Get lock of a key, threads preloading the same interval wait for each other and are then served from memory
+def get_lock(state, key):
+    with state['lock']:
+        return state['locks'].setdefault(key, threading.Lock())
+
+# Get klines from the store, fetch from exchange when required
+def get_klines(interval, limit, refresh=False):
+
+    # Initialize variables
+    state = context.current().cache
+    key   = (config.symbol, interval)
+
+    # Load klines
+    with get_lock(state, key):
+        return load_klines(state, key, interval, limit, refresh)
+
+# Get klines from the store of a symbol, fetch from exchange when required
+def load_klines(state, key, interval, limit, refresh):
+
+    # Debug
+    debug = False
+
+    # Initialize variables
+    store  = state['store']
+    stats  = state['stats']
+    symbol = key[0]
+    entry  = store.get(key)
+
+    # Serve from memory
+    if not refresh and entry and len(entry['klines']['time']) >= limit:
+        stats['hits'] = stats['hits'] + 1
+        entry['limit'] = max(entry['limit'], limit)
+        if debug: defs.announce(f"Debug: Served {limit} klines with {interval} interval from cache")
+        return tail(entry['klines'], limit)
+
+    # Load from disk, derive from a smaller interval, otherwise fetch from exchange
+    klines = empty()
+    if not refresh and not entry and config.cache_enabled:
+        klines = storage.get_klines(interval, limit)
+        if len(klines['time']) >= limit:
+            stats['disk'] = stats['disk'] + 1
+    if not refresh and len(klines['time']) < limit:
+        klines = derive(symbol, interval, limit)
+        if len(klines['time']) >= limit:
+            stats['derived'] = stats['derived'] + 1
+            defs.announce(f"Derived {limit} klines with {interval} interval from cache")
+    if len(klines['time']) < limit:
+        stats['fetches'] = stats['fetches'] + 1
+        klines = preload.fetch_klines(interval, limit)
+
+    # Store klines
+    store[key] = {'klines': klines, 'limit': max(limit, entry['limit'] if entry else 0)}
+
+    # Return klines
+    return tail(klines, limit)
+
+# Add a kline from the websocket to the store
+def add_kline(kline, interval):
+
+    # Initialize variables
+    symbol = config.symbol
+    entry  = context.current().cache['store'].get((symbol, interval))
+
+    # Nothing to keep up to date
+    if not entry:
+        return
+
+    # Add kline and keep the largest requested number of klines plus the running kline
+    klines = merge(kline, entry['klines'])
+    excess = len(klines['time']) - (entry['limit'] + 1)
+    if excess > 0:
+        for key in keys:
+            del klines[key][:excess]
+
+    # Return
+    return
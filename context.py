@@ -0,0 +1,277 @@
+### Sunflow Cryptobot ###
+#
+# Context of a symbol, holds all mutable state of one trading symbol
+
+# Load external libraries
+import contextlib, contextvars
+
+# Load internal libraries
+import cache, defs, distance, gaps, ledger, loader, profiler, reloader, storage, tradeflow, trailing
+
+# Initialize variables
+active  = contextvars.ContextVar("context", default=None)     # Context of the symbol being handled
+default = {}                                                  # Context used when no symbol is being handled, created on first use
+on_halt = []                                                  # Functions called with the context that registers a halt, from any thread
+
+# Context of a symbol, every symbol has its own config, orders, prices and advice
+class Context:
+
+    # Initialize all variables of a symbol from its config
+    def __init__(self, config):
+
+        # Config of symbol
+        self.config = config
+
+        # Debug
+        self.debug                           = config.debug                                # Debug
+
+        # Errors
+        self.halt_sunflow                    = False                                       # Register halt or continue
+        self.df_errors                       = 0                                           # Dataframe error counter
+
+        # Set default values
+        self.symbol                          = config.symbol                               # Symbol bot used for trading
+        self.info                            = {}                                          # Instrument info on symbol
+        self.spot                            = 0                                           # Spot price, always equal to lastPrice
+        self.ticker                          = {}                                          # Ticker data, including lastPrice and time
+        self.ticker_ts                       = 0                                           # Exchange time of the last handled ticker, the standby websocket sends the same tickers
+        self.profit                          = config.profit                               # Minimum profit percentage
+        self.multiplier                      = config.multiplier                           # Multiply minimum order quantity by this
+        self.prices                          = {}                                          # Last prices based on ticker data
+        self.timestamp                       = defs.now_utc()[4]                           # Get the current time
+
+        # Minimum spread between historical buy orders
+        self.use_spread                      = {}                                          # Spread
+        self.use_spread['enabled']           = config.spread_enabled                       # Use spread as buy trigger
+        self.use_spread['distance']          = config.spread_distance                      # Minimum spread in percentages
+
+        # Technical
+        self.use_indicators                  = {}                                          # Technical indicators
+        self.use_indicators['enabled']       = config.indicators_enabled                   # Use technical indicators as buy trigger
+        self.use_indicators['minimum']       = config.indicators_minimum                   # Minimum advice value
+        self.use_indicators['maximum']       = config.indicators_maximum                   # Maximum advice value
+        self.use_indicators['klines']        = {}                                          # Klines for symbol
+        self.use_indicators['limit']         = config.indicators_limit                     # Number of klines
+        self.use_indicators['average']       = config.indicators_average                   # Calculate average of all active intervales
+        self.use_indicators['intervals']      = {}                                         # Klines intervals
+        self.use_indicators['intervals'][0]   = 0                                          # Average of all active intervals
+        self.use_indicators['intervals'][1]   = config.indicators_interval_1               # Klines timeframe interval 1
+        self.use_indicators['intervals'][2]   = config.indicators_interval_2               # Klines timeframe interval 2
+        self.use_indicators['intervals'][3]   = config.indicators_interval_3               # Klines timeframe interval 3
+
+        # Orderbook
+        self.use_orderbook                   = {}                                          # Orderbook
+        self.use_orderbook['enabled']        = config.orderbook_enabled                    # Use orderbook as buy trigger
+        self.use_orderbook['depth']          = config.orderbook_bandwith                   # Depth bandwith in percentages used to calculate market depth from orderbook
+        self.use_orderbook['window']         = config.orderbook_window                     # Rolling window orderbook data
+        self.use_orderbook['minimum']        = config.orderbook_minimum                    # Minimum orderbook buy percentage
+        self.use_orderbook['maximum']        = config.orderbook_maximum                    # Maximum orderbook buy percentage
+        self.use_orderbook['average']        = config.orderbook_average                    # Average out orderbook depth data or use last data point
+        self.use_orderbook['limit']          = config.orderbook_limit                      # Number of orderbook data elements to keep in database
+        self.use_orderbook['timeframe']      = config.orderbook_timeframe                  # Timeframe for averaging out
+        self.depth_data                      = {'time': [], 'buy_perc': [], 'sell_perc': []}
+
+        # Trade
+        self.use_trade                       = {}
+        self.use_trade['enabled']            = config.trade_enabled                        # Use realtime trades as buy trigger
+        self.use_trade['minimum']            = config.trade_minimum                        # Minimum trade buy ratio percentage
+        self.use_trade['maximum']            = config.trade_maximum                        # Maximum trade buy ratio percentage
+        self.use_trade['limit']              = config.trade_limit                          # Number of trade orders to keep in database
+        self.use_trade['timeframe']          = config.trade_timeframe                      # Timeframe in ms to collect realtime trades
+        self.use_trade['extras']             = config.trade_extras                         # Calculate VWAP, trade size percentiles and imbalance
+        self.trades                          = tradeflow.new_state(config.trade_limit, [config.trade_timeframe] + config.trade_windows)
+
+        # Optimize profit and trigger price distance
+        self.optimizer                       = {}                                          # Profit and trigger price distance optimizer
+        self.optimizer['enabled']            = config.optimizer_enabled                    # Try to optimize the minimum profit and distance percentage
+        self.optimizer['spread_enabled']     = config.optimizer_spread                     # If optimizer is active, also optimize spread
+        self.optimizer['sides']              = config.optimizer_sides                      # If optimizer is active, optimize both buy and sell, or only sell
+        self.optimizer['method']             = config.optimizer_method                     # Method used to optimize distance, profit and / or spread
+        self.optimizer['profit']             = config.profit                               # Initial profit percentage when Sunflow started, will never change
+        self.optimizer['distance']           = config.wave_distance                        # Initial trigger price distance percentage when Sunflow started, will never change
+        self.optimizer['spread']             = config.spread_distance                      # Initial minimum spread in percentages when Sunflow started, will never change
+        self.optimizer['interval']           = config.optimizer_interval                   # Interval used for indicator KPI
+        self.optimizer['prices']             = config.optimizer_prices                     # Number of prices to download
+        self.optimizer['delta']              = config.optimizer_delta                      # Delta used for indicator KPI
+        self.optimizer['limit_min']          = config.optimizer_limit_min                  # Minimum miliseconds of spot price data
+        self.optimizer['limit_max']          = config.optimizer_limit_max                  # Maximum miliseconds of spot price data
+        self.optimizer['adj_min']            = config.optimizer_adj_min                    # Minimum adjustment
+        self.optimizer['adj_max']            = config.optimizer_adj_max                    # Maximum adjustment
+        self.optimizer['scaler']             = config.optimizer_scaler                     # Scales the final optimizer value by multiplying by this value
+        self.optimizer['df']                 = None                                        # Dataframe is created on first use
+
+        # Price limits
+        self.use_pricelimit                  = {}                                          # Use pricelimits to prevent buy or sell
+        self.use_pricelimit['enabled']       = config.pricelimit_enabled                   # Set pricelimits functionality
+        self.use_pricelimit['max_buy_enabled'] = False                                       # Set pricelimits maximum buy price toggle  
+        self.use_pricelimit['min_sell_enabled'] = False                                       # Set pricelimits minimum sell price toggle
+        self.use_pricelimit['max_sell_enabled'] = False                                       # Set pricelimits maximum sell price toggle
+        self.use_pricelimit['min_buy']       = config.pricelimit_min_buy                   # Minimum buy price 
+        self.use_pricelimit['max_buy']       = config.pricelimit_max_buy                   # Maximum buy price 
+        self.use_pricelimit['min_sell']      = config.pricelimit_min_sell                  # Minimum sell price
+        self.use_pricelimit['max_sell']      = config.pricelimit_max_sell                  # Maximum sell price
+        if config.pricelimit_min_buy > 0     : self.use_pricelimit['min_buy_enabled'] = True    # Minimum buy price enabled
+        if config.pricelimit_max_buy > 0     : self.use_pricelimit['max_buy_enabled'] = True    # Maximum buy price enabled
+        if config.pricelimit_min_sell > 0    : self.use_pricelimit['min_sell_enabled'] = True   # Minimum sell price enabled
+        if config.pricelimit_max_sell > 0    : self.use_pricelimit['max_sell_enabled'] = True   # Maximum sell price enabled
+
+        # Trailing order
+        self.active_order                    = {}                                          # Trailing order data
+        self.active_order['side']            = ""                                          # Trailing Buy or Sell
+        self.active_order['active']          = False                                       # Trailing order active or not
+        self.active_order['start']           = 0                                           # Start price when trailing order began     
+        self.active_order['previous']        = 0                                           # Previous price
+        self.active_order['current']         = 0                                           # Current price
+        self.active_order['created']         = 0                                           # Create timestamp in ms
+        self.active_order['updated']         = 0                                           # Update timestamp in ms
+        self.active_order['wiggle']          = config.wave_wiggle                          # Method to use to calculate trigger price distance
+        self.active_order['distance']        = config.wave_distance                        # Default trigger price distance percentage
+        self.active_order['wave']            = config.wave_distance                        # Calculated trigger price distance percentage
+        self.active_order['fluctuation']     = config.wave_distance                        # Applied trigger price distance percentage
+        self.active_order['last']            = config.wave_distance                        # Last applied trigger price distance percentage
+        self.active_order['orderid']         = ""                                          # Order ID
+        self.active_order['linkedid']        = ""                                          # Linked SL order ID
+        self.active_order['trigger']         = 0                                           # Trigger price for order
+        self.active_order['trigger_new']     = 0                                           # New trigger price when trailing 
+        self.active_order['trigger_ini']     = 0                                           # Initial trigger price when trailing
+        self.active_order['qty']             = 0                                           # Order quantity
+        self.active_order['qty_new']         = 0                                           # New order quantity when trailing
+
+        # Databases for buy and sell orders
+        self.all_buys                        = {}                                          # All buys retreived from database file buy orders
+        self.all_sells                       = {}                                          # Sell order linked to database with all buys orders
+
+        # Websockets to use
+        self.ws_kline                        = False                                       # Initialize ws_kline
+        self.ws_orderbook                    = False                                       # Initialize ws_orderbook
+        self.ws_trade                        = False                                       # Initialize ws_trade
+        if config.indicators_enabled         : self.ws_kline     = True                         # Use klines websocket
+        if config.orderbook_enabled          : self.ws_orderbook = True                         # Use orderbook websocket
+        if config.trade_enabled              : self.ws_trade     = True                         # Use trade websocker
+
+        # Initialize indicators advice variable
+        self.indicators_advice = {}
+        self.indicators_advice[0] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Average advice of all active intervals
+        self.indicators_advice[1] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 1
+        self.indicators_advice[2] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 2
+        self.indicators_advice[3] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 3
+
+        # Initialize orderbook advice variable
+        self.orderbook_advice                = {}
+        self.orderbook_advice['buy_perc']    = 0
+        self.orderbook_advice['sell_perc']   = 0
+        self.orderbook_advice['result']      = False
+
+        # Initialize trade advice variable
+        self.trade_advice                    = {}
+        self.trade_advice['buy_ratio']       = 0
+        self.trade_advice['sell_ratio']      = 0
+        self.trade_advice['result']          = False
+
+        # Initialize pricelimit advice variable
+        self.pricelimit_advice               = {}
+        self.pricelimit_advice['buy_result'] = False
+        self.pricelimit_advice['sell_result'] = False
+
+        # Compounding
+        self.compounding                     = {}
+        self.compounding['enabled']          = config.compounding_enabled
+        self.compounding['start']            = config.compounding_start
+        self.compounding['now']              = config.compounding_start
+
+        # Locking handle_ticker function to prevent race conditions
+        self.lock_ticker                     = {}
+        self.lock_ticker['time']             = self.timestamp
+        self.lock_ticker['delay']            = 5000
+        self.lock_ticker['enabled']          = False
+        self.lock_ticker['pending']          = []                                  # Handlers waiting while the symbol is busy
+
+        # Uptime ping
+        self.uptime_ping                     = {}
+        self.uptime_ping['time']             = self.timestamp
+        self.uptime_ping['record']           = self.timestamp
+        self.uptime_ping['delay']            = config.uptime_delay                         # 10 seconds
+        self.uptime_ping['expire']           = config.uptime_expire                        # 1 hour
+        self.uptime_ping['enabled']          = True
+
+        # Periodic tasks
+        self.periodic                        = {}
+        self.periodic['time']                = self.timestamp
+        self.periodic['delay']               = 3600000                                     # 1 hour
+        self.periodic['enabled']             = True
+        self.periodic['loading']             = False                                       # Background request for info is running
+
+        # Metrics report to supervisor
+        self.metrics                         = {}
+        self.metrics['time']                 = self.timestamp
+        self.metrics['delay']                = config.supervisor_report
+
+        # Reload strategy settings when the config file changes
+        self.reload                          = reloader.new_state(config)
+
+        # Start the profiler when the profile request file is created
+        self.profile                         = profiler.new_state(config)
+
+        # Rolling cache for last window of book levels, keyed by price per side
+        self.orderbook_levels                = {'bids': {}, 'asks': {}}
+
+        # Kline channels to subscribe to
+        self.candles                         = {}
+        for interval in (1, 2, 3):
+            if self.use_indicators['enabled'] and self.use_indicators['intervals'][interval] != "":
+                self.candles["candle" + self.use_indicators['intervals'][interval]] = True
+        if self.active_order['wiggle'] == "ATR":
+            self.candles["candle1m"] = True
+
+        # State of internal libraries
+        with loader.use(config):
+            self.distance = distance.new_state()
+            self.trailing = trailing.new_state()
+            self.storage  = storage.new_state()
+            self.cache    = cache.new_state()
+            self.gaps     = gaps.new_state()
+            self.ledger   = ledger.new_state()
+
+# Check if every context registered a halt, Sunflow stops when no symbol is left
+def halted(contexts):
+    return all(context.halt_sunflow for context in contexts)
+
+# Register halt of a context, the context of the symbol being handled by default, and wake up whoever waits for it
+def halt(context=None):
+
+    # Register halt
+    if context is None:
+        context = current()
+    context.halt_sunflow = True
+
+    # Notify
+    for function in on_halt:
+        function(context)
+
+    # Return
+    return
+
+# Get context of the symbol being handled
+def current():
+
+    # Context is active
+    context = active.get()
+    if context is not None:
+        return context
+
+    # Use default context, for example when a library is used without Sunflow
+    if not default:
+        default['context'] = Context(loader.load_configs()[0])
+
+    # Return context
+    return default['context']
+
+# Make context active for the symbol being handled, also activates its config
+@contextlib.contextmanager
+def use(context):
+    token = active.set(context)
+    try:
+        with loader.use(context.config):
+            yield context
+    finally:
+        active.reset(token)
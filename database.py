@@ -7,7 +7,7 @@ import pprint, json
 
 # Load internal libraries
 from loader import load_config
-import defs, orders
+import context, defs, orders
 
 # Load config
 config = load_config()
@@ -58,7 +58,7 @@ def load(dbase_file, info):
             all_buys = json.load(json_file)
     except FileNotFoundError:
         defs.announce("Database with all buys not found, exiting...")
-        defs.halt_sunflow = True
+        context.halt()
         exit()
     except json.decoder.JSONDecodeError:
         defs.announce("Database with all buys not yet filled, may come soon!")
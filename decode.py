@@ -82,8 +82,8 @@ def klines(response):
         pprint.pprint(response)
         print()
 
-    # Mapping klines
-    for row in response['data']:
+    # Mapping klines, exchange returns newest first so reverse to chronological order
+    for row in reversed(response['data']):
         klines['time'].append(int(row[0]))            # Time (timestamp in ms)
         klines['open'].append(float(row[1]))          # Open price
         klines['high'].append(float(row[2]))          # High price
@@ -102,6 +102,38 @@ def klines(response):
     # Return klines
     return klines
 
+# Decode trades
+def trades(response):
+        
+    # Debug
+    debug = False
+    
+    # Initialize variables
+    trades = {'id': [], 'time': [], 'side': [], 'size': [], 'price': []}
+    
+    # Debug
+    if debug:
+        defs.announce(f"Debug: Before decode trades:")
+        pprint.pprint(response)
+        print()
+
+    # Mapping trades, exchange returns newest first so reverse to chronological order
+    for row in reversed(response['data']):
+        trades['id'].append(int(row['tradeId']))             # Trade ID, increases by one for every trade of a symbol
+        trades['time'].append(int(row['ts']))                # Time (timestamp in ms)
+        trades['side'].append(row['side'].capitalize())      # Side, "buy"/"sell" -> "Buy"/"Sell"
+        trades['size'].append(float(row['sz']))              # Trade size
+        trades['price'].append(float(row['px']))             # Trade price
+    
+    # Debug
+    if debug:
+        defs.announce(f"Debug: After decoded trades:")
+        pprint.pprint(trades)
+        print()
+    
+    # Return trades
+    return trades
+
 # Decode instrument info
 def info(response):
 
@@ -5,23 +5,15 @@
 # Load external libraries
 from pathlib import Path
 from datetime import datetime, timezone
-import apprise, inspect, math, pprint, pytz, time
+import bisect, json, math, pprint, pytz, sys, time
 
 # Load internal libraries
 from loader import load_config
-import defs, indicators, preload
+import context, defs, indicators, logwriter, notify, preload
 
 # Load config
 config = load_config()
 
-# Create an Apprise instance
-apobj = apprise.Apprise()
-apobj.add(config.notify_url)
-
-# Initialize variables 
-df_errors    = 0        # Dataframe error counter
-halt_sunflow = False    # Register halt or continue
-
 # Add new kline and remove the oldest
 def new_kline(kline, klines):
 
@@ -154,18 +146,28 @@ def log_exchange(response, message, full_log=False):
     to_log        = ""
     response_full = {}
     
-    # Create log message   
-    to_log = message + "\n"
+    # Exchange log disabled
+    if not config.exchange_log:
+        return
+
+    # Create log message as one JSON object per line
+    if config.exchange_log_format == "jsonl":
+        record = {'time': int(time.time() * 1000), 'message': message}
+        if config.exchange_log_full or full_log:
+            record['response'] = response
+        to_log = json.dumps(record, default=str) + "\n"
+
+    # Create log message as text
+    else:
+        to_log = message + "\n"
     
-    # Extend log message based on error level
-    if config.exchange_log_full or full_log:
-        response_full = pprint.pformat(response)
-        to_log        = message + "\n" + response_full + "\n\n"
+        # Extend log message based on error level
+        if config.exchange_log_full or full_log:
+            response_full = pprint.pformat(response)
+            to_log        = message + "\n" + response_full + "\n\n"
     
-    # Write to exchange log file
-    if config.exchange_log:    
-        with open(config.exchange_file, 'a', encoding='utf-8') as file:
-            file.write(to_log)
+    # Write to exchange log file in the background
+    logwriter.write(config.exchange_file, to_log)
 
 # Log all errors
 def log_error(exception):
@@ -173,9 +175,6 @@ def log_error(exception):
     # Debug
     debug = False
 
-    # Declare global variables
-    global halt_sunflow
-    
     # Debug to stdout
     if debug:
         defs.announce("Debug: Error logging")
@@ -185,11 +184,10 @@ def log_error(exception):
        
     # Initialize variables
     halt_execution = True
-    stack          = inspect.stack()
-    call_frame     = stack[1]
-    filename       = Path(call_frame.filename).name
-    functionname   = call_frame.function
-    line           = call_frame.lineno
+    call_frame     = sys._getframe(1)
+    filename       = Path(call_frame.f_code.co_filename).name
+    functionname   = call_frame.f_code.co_name
+    line           = call_frame.f_lineno
     timestamp      = now_utc()[6]
 
     # Safeguard from type errors
@@ -204,21 +202,21 @@ def log_error(exception):
       
     # Error: Dataframe failure
     if ("(30908)" in exception) or ("Length of values" in exception) or ("All arrays must be of the same length" in exception):
-        defs.announce(f"*** Warning: Dataframe issue for the {df_errors + 1} time! ***")
+        defs.announce(f"*** Warning: Dataframe issue for the {context.current().df_errors + 1} time! ***")
         halt_execution = False
        
-    # Write to error log file
-    with open(config.error_file, 'a', encoding='utf-8') as file:
-        file.write(message + "\n\n")
+    # Write to error log file in the background
+    logwriter.write(config.error_file, message + "\n\n")
     
     # Report to stdout
     defs.announce(f"{exception}\n>>> File: {filename} | Function: {functionname} | Line: {line}")
     
     # Terminate hard
     if halt_execution:
-        defs.announce("*** Error Terminating Sunflow! ***")
+        defs.announce(f"*** Error Terminating {config.symbol}! ***")
         defs.announce(exception)
-        halt_sunflow = True
+        defs.announce(f"terminating {config.symbol}, {exception}", True, "high")
+        context.halt()
 
 # Log revenue data
 def log_revenue(active_order, order, revenue, info, sides=True, extended=False):
@@ -273,9 +271,8 @@ def log_revenue(active_order, order, revenue, info, sides=True, extended=False):
         defs.announce("Debug: Revenue log file message")
         print(message)
     
-    # Write to revenue log file
-    with open(config.revenue_file, 'a', encoding='utf-8') as file:
-        file.write(message + "\n")
+    # Write to revenue log file in the background
+    logwriter.write(config.revenue_file, message + "\n")
         
     # Return
     return
@@ -631,14 +628,13 @@ def calc_compounding(info, spot, compounding):
     # Return
     return info
 
-# Send out a notification via stdout
-def announce(message, external=False):
+# Send out a notification via stdout, or queue it for Apprise with a priority of low, normal or high
+def announce(message, external=False, priority="normal"):
    
     # Initialize variables
-    stack        = inspect.stack()
-    call_frame   = stack[1]
-    filename     = Path(call_frame.filename).name
-    functionname = call_frame.function
+    call_frame   = sys._getframe(1)
+    filename     = Path(call_frame.f_code.co_filename).name
+    functionname = call_frame.f_code.co_name
     announcement = ""
     
     # Local or UTC time
@@ -666,12 +662,9 @@ def announce(message, external=False):
     if not external:
         print(announcement + "\n")
     
-    # Report via Apprise for other messages
+    # Report via Apprise for other messages, sent in the background
     if external and config.notify_enabled:
-        apobj.notify(
-            body  = str(message),
-            title = "Sunflow@OKX"
-        )
+        notify.send(str(message), priority)
  
     # Return message
     return announcement
@@ -757,6 +750,24 @@ def get_closest_index(data, span):
     # Return closest index
     return closest_index
 
+# Get index of element closest to span, same as get_closest_index() but for data sorted on time
+def get_closest_index_sorted(data, span):
+
+    # Initialize variables
+    times = data['time']
+
+    # Nothing to find
+    if not times:
+        return None
+
+    # Binary search and compare with left neighbour, first index wins on ties
+    index = bisect.bisect_left(times, span)
+    if index == len(times) or (index > 0 and abs(times[index - 1] - span) <= abs(times[index] - span)):
+        index = bisect.bisect_left(times, times[index - 1])
+
+    # Return closest index
+    return index
+
 # Calcuate number of items to use
 def get_index_number(data, timeframe, limit):
     
@@ -902,4 +913,18 @@ def format_ms(milliseconds):
     # Format with leading zeros
     formatted_time = f"{hours:02}:{minutes:02}:{seconds:02}.{hundreds:02}"
 
-    return formatted_time
\ No newline at end of file
+    return formatted_time
+
+# Convert kline interval to miliseconds, months are counted as 30 days
+def interval_ms(interval):
+
+    # Initialize variables
+    units = {'s': 1000, 'm': 60000, 'H': 3600000, 'D': 86400000, 'W': 604800000, 'M': 2592000000}
+
+    # Remove timezone suffix and split number and unit
+    interval = interval.replace("utc", "")
+    number   = int(interval[:-1])
+    unit     = interval[-1]
+
+    # Return miliseconds
+    return number * units[unit]
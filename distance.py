@@ -3,80 +3,558 @@
 # Calculate trigger price distance
 
 # Load external libraries
+from collections import deque
 import numpy as np
-import math, pandas as pd, pandas_ta as ta
+import math, sys, threading
 
 # Load internal libraries
 from loader import load_config
-import defs, preload
+import context, defs, loader, preload
 
 # Load config
 config = load_config()
 
-# Initialize ATR timer
-atr_timer             = {}
-atr_timer['check']    = False
-atr_timer['time']     = 0
-atr_timer['interval'] = 60000
+# Create distance state of a symbol, ATR refresher and the ATR, EMA and ChatGPT engines
+def new_state():
+
+    # Initialize ATR refresher, 1m klines arrive via the candle1m websocket
+    atr_refresh             = {}
+    atr_refresh['time']     = 0                          # Time of last closed kline in the ATR engine
+    atr_refresh['interval'] = 60000                      # Interval of klines in ms
+    atr_refresh['loading']  = False                      # Background request for klines is running
+    atr_refresh['pending']  = None                       # Klines received by background request, not yet loaded
+
+    # Initialize ATR Klines
+    atr_klines = {'time': [], 'open': [], 'high': [], 'low': [], 'close': [], 'volume': [], 'turnover': []}
+
+    # Initialize ATR engine, running ATR (RMA of true range) and rolling average of ATR percentage
+    atr                   = {}
+    atr['length']         = 14                           # ATR length
+    atr['window']         = config.prices_limit          # Number of ATR percentages to average
+    atr['close']          = None                         # Previous close
+    atr['weighted']       = math.nan                     # Running RMA of true range
+    atr['old_wt']         = 1.0                          # Running weight of RMA
+    atr['nobs']           = 0                            # Number of true ranges observed
+    atr['values']         = deque()                      # Rolling ATR percentages
+    atr['sum']            = 0.0                          # Rolling sum of ATR percentages
+    atr['percentage']     = math.nan                     # Last ATR percentage
+    atr['average']        = math.nan                     # Average ATR percentage
+    atr['multiplier']     = math.nan                     # Last ATR percentage divided by average
+
+    # Initialize EMA engines, running EWM standard deviation of returns and rolling maximum for every span in use
+    ema                   = {}
+    ema['prices']         = None                         # Prices object the engines are built on
+    ema['engines']        = {}                           # Engine of every span, see ema_engine()
+    ema['tail']           = 10                           # Spans of prices after which the first price weighs less than 1e-8
+    ema['head']           = (None, math.nan)             # Key and maximum of the first prices, calculated from the first price
+
+    # Initialize ChatGPT engine, EWMA variance and trend of returns and the committed distance
+    chatgpt               = {}
+    chatgpt['prices']     = None                         # Prices object the engine is built on
+    chatgpt['time']       = 0                            # Time of last processed price
+    chatgpt['price']      = None                         # Previous price
+    chatgpt['variance']   = 0.0                          # EWMA variance of returns
+    chatgpt['trend']      = 0.0                          # EMA of returns
+    chatgpt['nobs']       = 0                            # Number of returns observed
+    chatgpt['order']      = None                         # Trailing order the committed distance belongs to
+    chatgpt['distance']   = 0.0                          # Committed distance
+    chatgpt['skipped']    = 0                            # Updates suppressed by hysteresis
+
+    # Return state
+    return {'atr_refresh': atr_refresh, 'atr_klines': atr_klines, 'atr': atr, 'ema': ema, 'chatgpt': chatgpt}
+
+# Reset ATR engine
+def atr_reset():
+
+    # Get distance state of symbol
+    state = context.current().distance
+    atr   = state['atr']
+
+    # Reset running values
+    atr['close']      = None
+    atr['weighted']   = math.nan
+    atr['old_wt']     = 1.0
+    atr['nobs']       = 0
+    atr['values']     = deque()
+    atr['sum']        = 0.0
+    atr['percentage'] = math.nan
+    atr['average']    = math.nan
+    atr['multiplier'] = math.nan
+
+    # Return
+    return
+
+# Update ATR engine with a closed kline, identical to pandas_ta atr(length=14) and its ATR percentage mean
+def atr_update(kline):
+
+    # Get distance state of symbol
+    state = context.current().distance
+    atr   = state['atr']
 
-# Initialize ATR Klines
-atr_klines = {'time': [], 'open': [], 'high': [], 'low': [], 'close': [], 'volume': [], 'turnover': []}
+    # Initialize variables
+    high  = kline['high']
+    low   = kline['low']
+    close = kline['close']
+
+    # First kline has no true range
+    if atr['close'] is None:
+        atr['close'] = close
+        return
+
+    # Calculate true range
+    high_low = high - low
+    if high_low == 0:
+        high_low = sys.float_info.epsilon
+    true_range   = max(abs(high_low), abs(high - atr['close']), abs(atr['close'] - low))
+    atr['close'] = close
+    atr['nobs']  = atr['nobs'] + 1
+
+    # Running RMA, same recurrence as pandas ewm(alpha=1/length, adjust=True)
+    if atr['weighted'] == atr['weighted']:
+        atr['old_wt'] = atr['old_wt'] * (1 - (1 / atr['length']))
+        if atr['weighted'] != true_range:
+            atr['weighted'] = ((atr['old_wt'] * atr['weighted']) + true_range) / (atr['old_wt'] + 1)
+        atr['old_wt'] = atr['old_wt'] + 1
+    else:
+        atr['weighted'] = true_range
+
+    # Not enough data yet
+    if atr['nobs'] < atr['length']:
+        return
+
+    # Rolling average of ATR percentage
+    atr['percentage'] = (atr['weighted'] / close) * 100
+    atr['values'].append(atr['percentage'])
+    atr['sum'] = atr['sum'] + atr['percentage']
+    if len(atr['values']) > atr['window']:
+        atr['sum'] = atr['sum'] - atr['values'].popleft()
+    atr['average']    = atr['sum'] / len(atr['values'])
+    atr['multiplier'] = atr['percentage'] / atr['average']
+
+    # Return
+    return
+
+# Load ATR klines into the ATR engine, only closed klines are used
+def atr_load(klines):
+
+    # Get distance state of symbol
+    state       = context.current().distance
+    atr_refresh = state['atr_refresh']
+    atr_klines  = state['atr_klines']
+    atr         = state['atr']
+
+    # Rebuild ATR engine
+    atr_reset()
+    for key in atr_klines:
+        atr_klines[key] = []
+    for i in range(len(klines['time'])):
+        if klines['status'][i] != 1:
+            continue
+        for key in atr_klines:
+            atr_klines[key].append(klines[key][i])
+        atr_update({'high': klines['high'][i], 'low': klines['low'][i], 'close': klines['close'][i]})
+    if atr_klines['time']:
+        atr_refresh['time'] = atr_klines['time'][-1]
+
+    # Report ATR data
+    print("ATR Data (experimental)")
+    print(f"ATR current percentage is {atr['percentage']} %")
+    print(f"ATR average percentage over {len(atr_klines['time'])} klines is {atr['average']} %")
+    print(f"ATR multiplier is {atr['multiplier']}\n")
+
+    # Return
+    return
+
+# Request ATR klines from exchange, runs in a background thread
+def atr_fetch():
+
+    # Get distance state of symbol
+    state       = context.current().distance
+    atr_refresh = state['atr_refresh']
+
+    # Get klines and hand them over to the websocket or ticker thread
+    try:
+        start_time = defs.now_utc()[4]
+        atr_refresh['pending'] = preload.get_klines('1m', config.prices_limit, True)
+        end_time   = defs.now_utc()[4]
+        defs.announce(f"Received {config.prices_limit} ATR klines in the background in {end_time - start_time}ms")
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to get ATR klines: {e} ***")
+    finally:
+        atr_refresh['loading'] = False
+
+    # Return
+    return
+
+# Request ATR klines from exchange without blocking
+def atr_request():
+
+    # Get distance state of symbol
+    state       = context.current().distance
+    atr_refresh = state['atr_refresh']
+
+    # Only one request at a time
+    if atr_refresh['loading']:
+        return
+    atr_refresh['loading'] = True
+
+    # Start background thread
+    defs.announce(f"Requesting {config.prices_limit} klines for ATR in the background")
+    threading.Thread(target=loader.bind(atr_fetch), daemon=True).start()
+
+    # Return
+    return
+
+# Preload ATR klines, only at startup
+def atr_preload():
+
+    # Load klines
+    atr_load(preload.get_klines('1m', config.prices_limit))
+
+    # Return
+    return
+
+# Add a kline from the candle1m websocket to the ATR engine, ATR is only recalculated when a kline closes
+def atr_kline(kline):
+
+    # Debug
+    debug = False
+
+    # Get distance state of symbol
+    state       = context.current().distance
+    atr_refresh = state['atr_refresh']
+    atr_klines  = state['atr_klines']
+    atr         = state['atr']
+
+    # Load klines received in the background
+    if atr_refresh['pending'] is not None:
+        klines = atr_refresh['pending']
+        atr_refresh['pending'] = None
+        atr_load(klines)
+
+    # Only closed and new klines
+    if kline['status'] != 1 or kline['time'] <= atr_refresh['time']:
+        return
+
+    # Klines were missed, request all klines again and continue meanwhile
+    if atr_refresh['time'] and kline['time'] - atr_refresh['time'] > atr_refresh['interval']:
+        defs.announce(f"*** Warning: Missed {int((kline['time'] - atr_refresh['time']) / atr_refresh['interval']) - 1} ATR klines! ***")
+        atr_request()
+
+    # Add kline and update ATR engine
+    if len(atr_klines['time']) < config.prices_limit:
+        for key in atr_klines:
+            atr_klines[key].append(kline[key])
+    else:
+        defs.new_kline(kline, atr_klines)
+    atr_update(kline)
+    atr_refresh['time'] = kline['time']
 
-# Calculate ATR as percentage
+    # Debug to stdout
+    if debug:
+        defs.announce(f"Debug: ATR percentage is {atr['percentage']} %, on average it was {atr['average']} % and the multiplier is {atr['multiplier']}")
+
+    # Return
+    return
+
+# Get ATR as percentage
 def calculate_atr():
-    
+
+    # Get distance state of symbol
+    state       = context.current().distance
+    atr_refresh = state['atr_refresh']
+    atr         = state['atr']
+
+    # Load klines received in the background
+    if atr_refresh['pending'] is not None:
+        klines = atr_refresh['pending']
+        atr_refresh['pending'] = None
+        atr_load(klines)
+
+    # ATR was never loaded
+    if atr['nobs'] == 0:
+        atr_request()
+
+    # Return ATR as percentage, precalculated when the last kline closed
+    return atr['percentage'], atr['average'], atr['multiplier']
+
+# Create EMA engine of a span
+def ema_engine(span):
+
+    # Initialize engine
+    engine            = {}
+    engine['span']    = span                             # EWM span in number of prices
+    engine['time']    = 0                                # Time of last processed price
+    engine['price']   = None                             # Previous price
+    engine['mean']    = math.nan                         # Running EWM mean of returns
+    engine['cov']     = 0.0                              # Running EWM variance of returns
+    engine['sum_wt']  = 1.0                              # Running sum of weights
+    engine['sum_wt2'] = 1.0                              # Running sum of squared weights
+    engine['old_wt']  = 1.0                              # Running weight
+    engine['std']     = math.nan                         # Last EWM standard deviation
+    engine['peaks']   = deque()                          # Monotonic deque of (time, std) for rolling maximum
+
+    # Return engine
+    return engine
+
+# Update EMA engine with a price, identical to pandas pct_change().ewm(span, adjust=False).std()
+def ema_update(engine, time, price):
+
+    # Initialize variables
+    alpha     = 2 / (engine['span'] + 1)
+    old_price = engine['price']
+
+    # Store price
+    engine['time']  = time
+    engine['price'] = price
+
+    # First price has no return
+    if old_price is None:
+        return
+
+    # Calculate return
+    value = (price / old_price) - 1
+
+    # Running EWM variance, same recurrence as pandas ewmcov(adjust=False, bias=False)
+    if engine['mean'] == engine['mean']:
+        engine['sum_wt']  = engine['sum_wt'] * (1 - alpha)
+        engine['sum_wt2'] = engine['sum_wt2'] * (1 - alpha) * (1 - alpha)
+        engine['old_wt']  = engine['old_wt'] * (1 - alpha)
+        old_mean          = engine['mean']
+        if old_mean != value:
+            engine['mean'] = ((engine['old_wt'] * old_mean) + (alpha * value)) / (engine['old_wt'] + alpha)
+        engine['cov']     = ((engine['old_wt'] * (engine['cov'] + ((old_mean - engine['mean']) * (old_mean - engine['mean'])))) + (alpha * ((value - engine['mean']) * (value - engine['mean'])))) / (engine['old_wt'] + alpha)
+        engine['sum_wt']  = (engine['sum_wt'] + alpha) / (engine['old_wt'] + alpha)
+        engine['sum_wt2'] = (engine['sum_wt2'] + (alpha * alpha)) / ((engine['old_wt'] + alpha) * (engine['old_wt'] + alpha))
+        engine['old_wt']  = 1.0
+    else:
+        engine['mean'] = value
+
+    # Unbiased standard deviation
+    numerator   = engine['sum_wt'] * engine['sum_wt']
+    denominator = numerator - engine['sum_wt2']
+    if denominator > 0:
+        engine['std'] = math.sqrt((numerator / denominator) * engine['cov'])
+    else:
+        engine['std'] = math.nan
+
+    # Return
+    return
+
+# Exponential moving average of values with adjust=False, in blocks so the powers of the decay never overflow
+def ema_filter(values, alpha):
+
+    # Initialize variables
+    decay  = 1 - alpha
+    result = np.empty(len(values))
+    carry  = values[0]
+    block  = max(int(500 / -math.log(decay)), 1)
+
+    # Every value is the carry and the values of its block, weighted by their age
+    for start in range(0, len(values), block):
+        part   = values[start:start + block]
+        powers = decay ** np.arange(len(part))
+        result[start:start + len(part)] = (decay * powers * carry) + (alpha * powers * np.cumsum(part / powers))
+        carry  = result[start + len(part) - 1]
+
+    # Return averages
+    return result
+
+# EWM standard deviation of returns of every price, identical to pandas pct_change().ewm(span, adjust=False).std()
+def ema_series(price, span):
+
+    # Initialize variables
+    alpha  = 2 / (span + 1)
+    result = {'std': np.full(len(price), np.nan), 'mean': math.nan, 'cov': 0.0, 'sum_wt2': 1.0}
+
+    # Needs two returns, a span of 1 only weighs the last return
+    if len(price) < 2 or alpha >= 1:
+        return result
+
+    # Weighted mean, variance and sum of squared weights of the returns
+    returns = (price[1:] / price[:-1]) - 1
+    mean    = ema_filter(returns, alpha)
+    cov     = np.maximum(ema_filter(returns * returns, alpha) - (mean * mean), 0.0)
+    decay   = (1 - alpha) ** (2 * np.arange(len(returns)))
+    sum_wt2 = decay + ((alpha * alpha) * (1 - decay) / (1 - ((1 - alpha) * (1 - alpha))))
+
+    # Unbiased standard deviation, the first return has none
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['std'][1:] = np.where(sum_wt2 < 1, np.sqrt(cov / (1 - sum_wt2)), np.nan)
+
+    # Running values after the last price
+    result['mean']    = float(mean[-1])
+    result['cov']     = float(cov[-1])
+    result['sum_wt2'] = float(sum_wt2[-1])
+
+    # Return series
+    return result
+
+# Build EMA engine of a span from all prices, values of the first prices are left to the head
+def ema_build(prices, span, head):
+
+    # Initialize variables
+    engine = ema_engine(span)
+    series = ema_series(np.array(prices['price']), span)
+    std    = series['std']
+    times  = prices['time']
+
+    # Running values after the last price
+    engine['time']    = times[-1]
+    engine['price']   = prices['price'][-1]
+    engine['mean']    = series['mean']
+    engine['cov']     = series['cov']
+    engine['sum_wt2'] = series['sum_wt2']
+    engine['std']     = float(std[-1])
+
+    # Rolling maximum, a value is kept while no later value is as large
+    later = np.maximum.accumulate(np.nan_to_num(std[head:], nan=-np.inf)[::-1])[::-1]
+    for i in np.flatnonzero(std[head:] > np.append(later[1:], -np.inf)):
+        engine['peaks'].append((times[head + i], float(std[head + i])))
+
+    # Return engine
+    return engine
+
+# Calculate EWM standard deviation of returns normalized to its maximum, identical to
+# pandas pct_change().ewm(span, adjust=False).std() over all prices, last value divided by its maximum.
+#
+# The span follows the prices in the wave timeframe, every span has its own engine that only processes new prices.
+# Values after the first tail spans of prices no longer depend on the first price and come from the engine, the
+# values of the first prices change when prices are removed and are calculated again.
+def calculate_ema(prices):
+
     # Debug
     debug = False
 
-    # Declare ATR timer and klines variables global
-    global atr_timer, atr_klines
+    # Get distance state of symbol
+    state = context.current().distance
+    ema   = state['ema']
 
     # Initialize variables
-    get_atr_klines = False
-
-    # Check every interval
-    current_time = defs.now_utc()[4]
-    if atr_timer['check']:
-        atr_timer['check'] = False
-        atr_timer['time']  = current_time
-    if current_time - atr_timer['time'] > atr_timer['interval']:
-        defs.announce(f"Requesting {config.limit} klines for ATR")
-        atr_timer['check'] = True
-        atr_timer['time']  = 0
-        get_atr_klines = True
-
-    # Get ATR klines if required
-    if get_atr_klines:
-        start_time = defs.now_utc()[4]
-        atr_klines = preload.get_klines('1m', config.limit)
-        end_time   = defs.now_utc()[4]
-        defs.announce(f"Received {config.limit} ATR klines in {end_time - start_time}ms")
-    
-    # Initialize dataframe
-    df = pd.DataFrame(atr_klines)
-    
-    # Calculate ATR and ATR percentage
-    start_time     = defs.now_utc()[4]
-    df['ATR']      = ta.atr(df['high'], df['low'], df['close'], length=14)
-    df['ATRP']     = (df['ATR'] / df['close']) * 100
-    atr_percentage = df['ATRP'].iloc[-1]
-    atr_perc_avg   = df['ATRP'].mean()
-    atr_multiplier = atr_percentage / atr_perc_avg
-    end_time       = defs.now_utc()[4]
+    times = prices['time']
+    new   = 0
+
+    # Number of prices in wave timeframe determines the span
+    span = len(times) - defs.get_closest_index_sorted(prices, times[-1] - config.wave_timeframe)
+    span = max(span, 1)
+    head = (ema['tail'] * span) + 1
+
+    # Prices were replaced
+    if ema['prices'] is not prices:
+        ema['prices']  = prices
+        ema['engines'] = {}
+        ema['head']    = (None, math.nan)
+
+    # Few prices, calculate all values
+    if len(times) <= head:
+        std = ema_series(np.array(prices['price']), span)['std']
+        if np.isnan(std).all() or not np.nanmax(std) > 0:
+            return math.nan
+        return float(std[-1] / np.nanmax(std))
+
+    # Maximum of the first prices, calculated again when prices were removed or the span changed
+    key = (span, times[0], times[head - 1])
+    if ema['head'][0] != key:
+        std         = ema_series(np.array(prices['price'][:head]), span)['std']
+        ema['head'] = (key, float(np.nanmax(std)) if not np.isnan(std).all() else math.nan)
+
+    # Engine of the span, built again when it missed too many prices
+    engine = ema['engines'].get(span)
+    if engine is not None:
+        while new < len(times) and times[-(new + 1)] > engine['time']:
+            new = new + 1
+    if engine is None or engine['time'] < times[0] or new > max(head, len(times) // 64):
+        engine = ema_build(prices, span, head)
+        ema['engines'][span] = engine
+        new = 0
+        if debug: defs.announce(f"Debug: Built EMA engine with span {span} from {len(times)} prices")
+
+    # Process new prices
+    for i in range(len(times) - new, len(times)):
+        ema_update(engine, times[i], prices['price'][i])
+        if i >= head and engine['std'] == engine['std']:
+            while engine['peaks'] and engine['peaks'][-1][1] <= engine['std']:
+                engine['peaks'].pop()
+            engine['peaks'].append((times[i], engine['std']))
+
+    # Remove maximums of prices that are now part of the first prices
+    while engine['peaks'] and engine['peaks'][0][0] < times[head]:
+        engine['peaks'].popleft()
+
+    # Remove engines of spans that fell out of the prices
+    for old in [old for old, item in ema['engines'].items() if item['time'] < times[0]]:
+        del ema['engines'][old]
+
+    # Normalize the last value to a 0-1 scale
+    peaks   = [ema['head'][1]] + ([engine['peaks'][0][1]] if engine['peaks'] else [])
+    maximum = max((peak for peak in peaks if peak == peak), default=math.nan)
+    if not maximum > 0:
+        return math.nan
+    return engine['std'] / maximum
+
+# Update ChatGPT engine with a price
+def chatgpt_update(time, price):
+
+    # Get distance state of symbol
+    state   = context.current().distance
+    chatgpt = state['chatgpt']
 
-    # Report ATR data
-    if get_atr_klines:
-        print("ATR Data (experimental)")
-        print(f"ATR current percentage is {atr_percentage} %")
-        print(f"ATR average percentage over {config.limit} klines is {atr_perc_avg} %")
-        print(f"ATR multiplier is {atr_multiplier}\n")
+    # Initialize variables
+    alpha_vol   = 2 / (config.chatgpt_vol_ewma_span + 1)
+    alpha_trend = 2 / (config.chatgpt_trend_ema_span + 1)
+    old_price   = chatgpt['price']
 
-   # Debug to stdout
-    if debug:
-        defs.announce(f"Debug: ATR percentage is {atr_percentage} %, on average it was {atr_perc_avg} %, the multiplier is {atr_multiplier} and it took {end_time - start_time}ms to calculate")
-      
-    # Return ATR as percentage
-    return atr_percentage, atr_perc_avg, atr_multiplier
+    # Store price
+    chatgpt['time']  = time
+    chatgpt['price'] = price
+
+    # First price has no return
+    if old_price is None:
+        return
+
+    # Return in percentages
+    value = ((price / old_price) - 1) * 100
+
+    # EWMA variance and EMA trend of returns
+    if chatgpt['nobs'] == 0:
+        chatgpt['variance'] = value * value
+        chatgpt['trend']    = value
+    else:
+        chatgpt['variance'] = ((1 - alpha_vol) * chatgpt['variance']) + (alpha_vol * value * value)
+        chatgpt['trend']    = ((1 - alpha_trend) * chatgpt['trend']) + (alpha_trend * value)
+    chatgpt['nobs'] = chatgpt['nobs'] + 1
+
+    # Return
+    return
+
+# Feed new prices to the ChatGPT engine
+def calculate_chatgpt(prices):
+
+    # Get distance state of symbol
+    state   = context.current().distance
+    chatgpt = state['chatgpt']
+
+    # Initialize variables
+    times = prices['time']
+    new   = 0
+
+    # Rebuild from all prices when prices were replaced, otherwise only process new prices
+    if chatgpt['prices'] is not prices:
+        chatgpt['prices']   = prices
+        chatgpt['time']     = 0
+        chatgpt['price']    = None
+        chatgpt['variance'] = 0.0
+        chatgpt['trend']    = 0.0
+        chatgpt['nobs']     = 0
+        new = len(times)
+    else:
+        while new < len(times) and times[-(new + 1)] > chatgpt['time']:
+            new = new + 1
+    for i in range(len(times) - new, len(times)):
+        chatgpt_update(times[i], prices['price'][i])
+
+    # Return volatility and trend of returns in percentages
+    return math.sqrt(chatgpt['variance']), chatgpt['trend']
 
 # Protect buy and sell
 def protect(active_order, price_distance):
@@ -189,7 +667,7 @@ def distance_wave(active_order, prices, price_distance, prevent=True):
     span = latest_time - config.wave_timeframe      # timeframe in milliseconds
 
     # Get the closest index in the time {timeframe}
-    closest_index = defs.get_closest_index(prices, span)
+    closest_index = defs.get_closest_index_sorted(prices, span)
 
     # Calculate the change in price
     price_change      = 0
@@ -218,26 +696,8 @@ def distance_ema(active_order, prices, price_distance):
     # Devide normalized value by this, ie. 2 means it will range between 0 and 0.5
     scaler = 1
     
-    # Number of prices to use
-    number = defs.get_index_number(prices, config.timeframe, config.prices_limit)
-
-    # Convert the lists to a pandas DataFrame
-    df = pd.DataFrame({
-        'price': prices['price'],
-        'time': pd.to_datetime(prices['time'], unit='ms')
-    })
-    
-    # Set time as the index
-    df.set_index('time', inplace=True)
-        
-    # Calculate the periodic returns
-    df['returns'] = df['price'].pct_change()
-    
-    # Apply an exponentially weighted moving standard deviation to the returns
-    df['ewm_std'] = df['returns'].ewm(span=number, adjust=False).std()
-    
-    # Normalize the last value of EWM_Std to a 0-1 scale
-    wave = df['ewm_std'].iloc[-1] / df['ewm_std'].max()
+    # Normalized EWM standard deviation of returns, only new prices are processed
+    wave = calculate_ema(prices)
     
     # Calculate trigger price distance percentage
     active_order['wave'] = (wave / scaler)
@@ -259,12 +719,14 @@ def distance_atr(active_order, prices, price_distance):
     scaler = 1
     result = ()
     
-    # Get ATR percentage and average
+    # Get ATR multiplier
     result         = calculate_atr()
-    atr_percentage = result[0]
-    atr_perc_avg   = result[1]
     atr_multiplier = result[2] * scaler
 
+    # ATR not available yet
+    if math.isnan(atr_multiplier):
+        atr_multiplier = 1
+
     # Get wave
     active_order = distance_wave(active_order, prices, price_distance, False)
 
@@ -277,6 +739,92 @@ def distance_atr(active_order, prices, price_distance):
     # Return active_order
     return active_order
 
+# Calculate distance by blending Fixed, Wave and Spot adapted to volatility and trend
+def distance_chatgpt(active_order, prices, price_distance):
+
+    # Debug
+    debug = False
+
+    # Get distance state of symbol
+    state   = context.current().distance
+    chatgpt = state['chatgpt']
+
+    # Initialize variables
+    default = active_order['distance']
+    result  = ()
+
+    # Start a new committed distance for every trailing order
+    order = (active_order['side'], active_order['start'])
+    if chatgpt['order'] != order:
+        chatgpt['order']    = order
+        chatgpt['distance'] = default
+        chatgpt['skipped']  = 0
+
+    # Get volatility and trend, only new prices are processed
+    result     = calculate_chatgpt(prices)
+    volatility = result[0]
+    trend      = result[1]
+
+    # Normalize volatility against default distance and trend against volatility to a 0-1 scale
+    vol_norm   = 0
+    trend_norm = 0
+    if default > 0:
+        vol_norm = min(1, (volatility * config.chatgpt_vol_scale) / default)
+    if volatility > 0:
+        trend_norm = min(1, (abs(trend) * config.chatgpt_trend_scale) / volatility)
+
+    # Only a favorable trend tightens towards Spot
+    if (active_order['side'] == "Sell" and trend < 0) or (active_order['side'] == "Buy" and trend > 0):
+        trend_norm = 0
+
+    # Candidate distances
+    candidate_fixed = default
+    candidate_wave  = abs(distance_wave(dict(active_order), prices, price_distance, False)['wave'])
+    candidate_spot  = distance_spot(dict(active_order), price_distance)['fluctuation']
+
+    # Shift weight from Fixed to Wave on volatility and from Fixed to Spot on a favorable trend
+    w_fixed = config.chatgpt_w_fixed
+    w_wave  = config.chatgpt_w_wave + (w_fixed * vol_norm)
+    w_spot  = config.chatgpt_w_spot + (w_fixed * (1 - vol_norm) * trend_norm)
+    w_fixed = w_fixed * (1 - vol_norm) * (1 - trend_norm)
+    w_total = w_fixed + w_wave + w_spot
+    if w_total <= 0:
+        w_fixed, w_total = 1, 1
+
+    # Blend candidates and keep between default and the maximum multiplier
+    target = ((w_fixed * candidate_fixed) + (w_wave * candidate_wave) + (w_spot * candidate_spot)) / w_total
+    target = max(default, min(target, default * config.chatgpt_max_multiplier))
+
+    # Smooth towards target and limit the step size
+    committed = chatgpt['distance']
+    proposal  = committed + (config.chatgpt_smoothing_alpha * (target - committed))
+    max_step  = committed * config.chatgpt_max_step_pct
+    if committed > 0:
+        proposal = max(committed - max_step, min(proposal, committed + max_step))
+
+    # Hysteresis, only commit when the change is large enough to be worth an amend
+    if committed > 0 and abs(proposal - committed) / committed < config.chatgpt_hysteresis_pct:
+        chatgpt['skipped'] = chatgpt['skipped'] + 1
+    else:
+        chatgpt['distance'] = proposal
+
+    # Set wave
+    active_order['wave'] = chatgpt['distance']
+
+    # Check for failures
+    if math.isnan(active_order['wave']):
+        active_order['wave'] = default
+
+    # Debug to stdout
+    if debug:
+        defs.announce(f"Debug: Volatility {volatility:.4f} %, trend {trend:.4f} %, fixed {candidate_fixed:.4f} %, wave {candidate_wave:.4f} %, spot {candidate_spot:.4f} %, target {target:.4f} % and committed {chatgpt['distance']:.4f} %")
+
+    # Prevent sell at loss and other issues
+    active_order = protect(active_order, price_distance)
+
+    # Return active_order
+    return active_order
+
 # Calculate trigger price distance
 def calculate(active_order, prices):
 
@@ -314,6 +862,10 @@ def calculate(active_order, prices):
     if active_order['wiggle'] == "EMA":
         active_order = distance_ema(active_order, prices, price_distance)
 
+    ''' Use CHATGPT to set trigger price distance '''
+    if active_order['wiggle'] == "ChatGPT":
+        active_order = distance_chatgpt(active_order, prices, price_distance)
+
     # Report to stdout
     if active_order['last'] != active_order['fluctuation']:
         defs.announce(f"Adviced trigger price distance is now {active_order['fluctuation']:.4f} %")
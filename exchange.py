@@ -7,12 +7,12 @@ from loader import load_config
 import pprint, time
 
 # Load internal libraries
-import defs, okx
+import defs, limiter, okx
 
 # Load config
 config = load_config()
 
-# Connect exchange
+# Connect exchange, clients are shared by all symbols
 import okx.Trade as Trade
 import okx.MarketData as MarketData
 import okx.PublicData as PublicData
@@ -22,6 +22,9 @@ publicDataAPI = PublicData.PublicAPI(flag=config.api_env)
 tradeAPI      = Trade.TradeAPI(config.api_key, config.api_secret, config.api_passphrase, False, config.api_env, config.api_site)
 accountAPI    = Account.AccountAPI(config.api_key, config.api_secret, config.api_passphrase, False, config.api_env, config.api_site)
 
+# Initialize rate limiter, one exchange connection is shared by all symbols and workers of the supervisor
+rate = limiter.new_rate(config.api_rate, "api")
+
 # Check the response of a request
 def check_response(response, silent=False):
     
@@ -118,6 +121,7 @@ def get_ticker():
     # Get response
     for attempt in range(3):
         message = defs.announce(f"session: marketDataAPI.get_ticker()")
+        limiter.throttle(rate)
         try:
             response = marketDataAPI.get_ticker(
                 instId = config.symbol
@@ -165,6 +169,7 @@ def get_klines(interval, limit):
     # Get response
     for attempt in range(3):
         message = defs.announce("session: marketDataAPI.get_candlesticks()")
+        limiter.throttle(rate)
         try:
             response = marketDataAPI.get_candlesticks(
                 instId = config.symbol,
@@ -199,6 +204,106 @@ def get_klines(interval, limit):
     # Return data
     return response, error_code, error_msg
 
+# Get recent trades, newest first
+def get_trades(limit=500):
+
+    # Debug
+    debug = False
+    
+    # Initialize variables
+    response   = {}
+    error_code = 0
+    error_msg  = ""
+    rate_limit = False    
+
+    # Get response
+    for attempt in range(3):
+        message = defs.announce("session: marketDataAPI.get_trades()")
+        limiter.throttle(rate)
+        try:
+            response = marketDataAPI.get_trades(
+                instId = config.symbol,
+                limit  = limit
+            )
+        except Exception as e:
+            message = f"*** Error: Failed to get trades ***\n>>> Message: {e}"
+            defs.log_error(message)
+
+        # Log response
+        if config.exchange_log:
+            defs.log_exchange(response, message)
+
+        # Check response for errors
+        result     = check_response(response)
+        error_code = result[4]
+        error_msg  = result[5]
+
+        # Check API rate limit
+        rate_limit = check_limit(result[0], result[2])
+        
+        # Break out of loop
+        if not rate_limit: break
+
+    # Debug to stdout
+    if debug:
+        defs.announce("Debug: Exchange response:")
+        pprint.pprint(response)
+        print()
+
+    # Return data
+    return response, error_code, error_msg
+
+# Get history klines, older than after (timestamp in ms)
+def get_history_klines(interval, after, limit=100):
+
+    # Debug
+    debug = False
+    
+    # Initialize variables
+    response   = {}
+    error_code = 0
+    error_msg  = ""
+    rate_limit = False    
+
+    # Get response
+    for attempt in range(3):
+        message = defs.announce("session: marketDataAPI.get_history_candlesticks()")
+        limiter.throttle(rate)
+        try:
+            response = marketDataAPI.get_history_candlesticks(
+                instId = config.symbol,
+                after  = str(after),
+                bar    = interval,
+                limit  = limit
+            )
+        except Exception as e:
+            message = f"*** Error: Failed to get history klines ***\n>>> Message: {e}"
+            defs.log_error(message)
+
+        # Log response
+        if config.exchange_log:
+            defs.log_exchange(response, message)
+
+        # Check response for errors
+        result     = check_response(response)
+        error_code = result[4]
+        error_msg  = result[5]
+
+        # Check API rate limit
+        rate_limit = check_limit(result[0], result[2])
+        
+        # Break out of loop
+        if not rate_limit: break
+
+    # Debug to stdout
+    if debug:
+        defs.announce("Debug: Exchange response:")
+        pprint.pprint(response)
+        print()
+
+    # Return data
+    return response, error_code, error_msg
+
 # Get info
 def get_instruments():
     
@@ -214,6 +319,7 @@ def get_instruments():
     # Get reponse
     for attempt in range(3):
         message = defs.announce("session: publicDataAPI.get_instruments()")
+        limiter.throttle(rate)
         try:
             response = publicDataAPI.get_instruments(
                 instType = "SPOT",
@@ -262,6 +368,7 @@ def get_balance(currency):
     # Get reponse
     for attempt in range(3):    
         message = defs.announce("session: accountAPI.get_account_balance()")
+        limiter.throttle(rate)
         try:
             response = accountAPI.get_account_balance(
                 ccy = currency
@@ -309,6 +416,7 @@ def get_fees():
     # Get response
     for attempt in range(3):
         message = defs.announce("session: accountAPI.get_fee_rates()")
+        limiter.throttle(rate)
         try:
             response = accountAPI.get_fee_rates(
                 instType = "SPOT",
@@ -370,6 +478,7 @@ def place_order(active_order):
     # Get response
     for attempt in range(3):
         message = defs.announce("session: tradeAPI.place_algo_order()")
+        limiter.throttle(rate)
         try:
             kwargs = {
                 "instId":      config.symbol,
@@ -439,6 +548,7 @@ def place_market_order(qty):
     # Get response
     for attempt in range(3):
         message = defs.announce("session: tradeAPI.place_order()")
+        limiter.throttle(rate)
         try:
             response = tradeAPI.place_order(
                 instId  = config.symbol,
@@ -499,6 +609,7 @@ def get_order(orderid, skip=False):
         
         # Query exchange
         message = defs.announce("session: tradeAPI.get_algo_order_details()")
+        limiter.throttle(rate)
         try:
             response = tradeAPI.get_algo_order_details(
                 algoId = str(orderid)
@@ -570,6 +681,7 @@ def get_linked_order(linkedid):
         
         # Query exchange
         message = defs.announce("session: tradeAPI.get_order()")
+        limiter.throttle(rate)
         try:
             response = tradeAPI.get_order(
                 instId = config.symbol,
@@ -631,6 +743,7 @@ def cancel_order(orderid):
     # Get reponse
     for attempt in range(3):
         message = defs.announce("session: tradeAPI.amend_algo_order()")
+        limiter.throttle(rate)
         try:
             response = tradeAPI.amend_algo_order(
                 instId         = config.symbol,
@@ -691,6 +804,7 @@ def amend_order(orderid, new_price=0, new_qty=0):
     # Get reponse
     for attempt in range(3):
         message = defs.announce("session: tradeAPI.amend_algo_order()")
+        limiter.throttle(rate)
         try:
 
             if new_price !=0:
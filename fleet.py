@@ -0,0 +1,203 @@
+### Sunflow Cryptobot ###
+#
+# Fleet analyzer reports profit, inventory and exposure of all bots in the data folder, without exchange access
+#
+# Every bot is found by its buy orders database or revenue log and analyzed in its own process. Instrument info
+# and last price come from the state every bot saves (see fleet_state in the config file) or from the price cache.
+#
+# Use with or without config file, the data folder of the config file is analyzed:
+# python fleet.py
+# python fleet.py -c {optional path/}your_config.py -d 7
+
+
+### Initialize ###
+
+# Load external libraries
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import csv, glob, json, os, pprint
+
+# Load internal libraries
+from loader import load_config
+import defs, ledger, loader, storage
+
+# Load config
+config = load_config()
+
+# Initialize variables
+debug        = False
+orders_name  = "orders.json"
+revenue_name = "revenue.log"
+day_ms       = ledger.periods['daily']
+
+
+### Functions ###
+
+# Find all bots in a data folder, returns the data suffix of every bot
+def discover(folder):
+
+    # Initialize variables
+    suffixes = set()
+
+    # Every buy orders database and revenue log belongs to a bot
+    for name in (orders_name, revenue_name):
+        for filename in glob.glob(glob.escape(folder) + "*" + name):
+            suffixes.add(filename[:-len(name)])
+
+    # Return data suffixes
+    return sorted(suffixes)
+
+# Last known price of a symbol from the price cache, returns price and time
+def cached_price(symbol, suffix):
+    array = storage.read(storage.price_file(symbol, suffix), storage.price_dtype)
+    if array is None or len(array) == 0:
+        return 0.0, 0
+    return float(array['price'][-1]), int(array['time'][-1])
+
+# Name of a bot, the stem of its config file or the data folder for config.py, which has no data suffix
+def bot_name(suffix):
+    return os.path.basename(suffix).rstrip("_") or Path(os.path.dirname(suffix) or ".").resolve().name
+
+# Analyze one bot, runs in a worker process
+def analyze(suffix, days, now):
+
+    # Initialize variables
+    result   = {'bot': bot_name(suffix), 'symbol': "", 'quote': "", 'spot': 0.0, 'age': 0, 'orders': 0, 'qty': 0.0, 'cost': 0.0, 'value': 0.0, 'unrealized': 0.0, 'sells': 0, 'profit': 0.0, 'today': 0.0, 'recent': 0.0, 'daily': 0.0}
+    state    = storage.load_state(suffix)
+    all_buys = []
+
+    # Load buy orders, only filled orders are inventory
+    try:
+        with open(suffix + orders_name, 'r', encoding='utf-8') as file:
+            all_buys = json.load(file)
+    except (OSError, ValueError):
+        all_buys = []
+    all_buys = [order for order in all_buys if order.get('status') == "Closed"]
+
+    # Symbol and quote coin
+    result['symbol'] = state.get('symbol') or (all_buys[0].get('symbol', "") if all_buys else "")
+    result['quote']  = state.get('info', {}).get('quoteCoin') or result['symbol'].partition("-")[2]
+
+    # Last known price, from the state of the bot or the price cache
+    result['spot'], spot_time = state.get('spot', 0.0), state.get('time', 0)
+    if not result['spot'] and result['symbol']:
+        result['spot'], spot_time = cached_price(result['symbol'], suffix)
+    result['age'] = (now - spot_time) // 60000 if spot_time else -1
+
+    # Inventory and exposure
+    result['orders']     = len(all_buys)
+    result['qty']        = sum(float(order['cumExecQty']) for order in all_buys)
+    result['cost']       = sum(float(order['cumExecValue']) for order in all_buys)
+    result['value']      = result['qty'] * result['spot']
+    result['unrealized'] = result['value'] - result['cost'] if result['spot'] else 0.0
+
+    # Revenue totals per day, from the revenue store or else from the revenue log
+    daily = ledger.load_rollup("daily", suffix)
+    if len(daily) == 0 and os.path.exists(suffix + revenue_name):
+        daily = ledger.rollup(ledger.read_log(suffix + revenue_name), day_ms)
+    daily = daily[daily['sells'] > 0]
+
+    # Profit
+    if len(daily):
+        today            = now - now % day_ms
+        span             = (daily['last'].max() - daily['first'].min()) / day_ms
+        result['sells']  = int(daily['sells'].sum())
+        result['profit'] = float(daily['revenue'].sum())
+        result['today']  = float(daily['revenue'][daily['time'] == today].sum())
+        result['recent'] = float(daily['revenue'][daily['time'] > today - days * day_ms].sum())
+        result['daily']  = result['profit'] / span if span > 0 else 0.0
+
+    # Return result
+    return result
+
+# Report every bot and the totals per quote coin
+def report(results, days):
+
+    # Initialize variables
+    totals = {}
+
+    # Totals per quote coin, bots with different quote coins can not be added up
+    for result in results:
+        total = totals.setdefault(result['quote'], {'bots': 0, 'orders': 0, 'cost': 0.0, 'value': 0.0, 'unrealized': 0.0, 'profit': 0.0, 'today': 0.0, 'recent': 0.0, 'daily': 0.0})
+        total['bots'] = total['bots'] + 1
+        for key in ('orders', 'cost', 'value', 'unrealized', 'profit', 'today', 'recent', 'daily'):
+            total[key] = total[key] + result[key]
+
+    # Exposure is the share of a bot in the inventory value of its quote coin
+    for result in results:
+        value = totals[result['quote']]['value']
+        result['exposure'] = result['value'] / value * 100 if value else 0.0
+
+    # Report every bot
+    print("Bots")
+    print("====")
+    print(f"{'Bot':<20}{'Symbol':<14}{'Orders':>8}{'Inventory':>14}{'Spot':>14}{'Value':>14}{'Unrealized':>14}{'Exposure':>10}{'Profit':>14}{'Today':>12}{f'{days} days':>12}{'Per day':>12}{'Age (m)':>9}")
+    for result in sorted(results, key=lambda item: (item['quote'], -item['value'])):
+        print(f"{result['bot']:<20}{result['symbol']:<14}{result['orders']:>8}{result['qty']:>14.4f}{result['spot']:>14.6g}{result['value']:>14.2f}{result['unrealized']:>14.2f}{result['exposure']:>9.1f}%{result['profit']:>14.2f}{result['today']:>12.2f}{result['recent']:>12.2f}{result['daily']:>12.2f}{result['age']:>9}")
+    print()
+
+    # Report totals
+    for quote, total in totals.items():
+        print(f"Fleet in {quote or 'unknown quote coin'}")
+        print("=" * len(f"Fleet in {quote or 'unknown quote coin'}"))
+        print(f"Bots          : {total['bots']} bots with {total['orders']} orders to sell")
+        print(f"Inventory     : {total['value']:.2f} {quote} (bought for {total['cost']:.2f} {quote}, unrealized {total['unrealized']:.2f} {quote})")
+        print(f"Trade profit  : {total['profit']:.2f} {quote} (alltime)")
+        print(f"Recent profit : {total['recent']:.2f} {quote} (last {days} days)")
+        print(f"Todays profit : {total['today']:.2f} {quote} (today)")
+        print(f"Daily profit  : {total['daily']:.2f} {quote} / day")
+        print()
+
+    # Return totals
+    return totals
+
+
+### Analysis ###
+
+if __name__ == "__main__":
+
+    # Display welcome screen
+    print("\n****************************************")
+    print("*** Sunflow Cryptobot Fleet Analyzer ***")
+    print("****************************************\n")
+    print(f"DATA FOLDER IN USE: {Path(config.data_folder).resolve()}\n")
+
+    # Initialize variables
+    stime    = defs.now_utc()[4]
+    days     = loader.arguments['days']
+    suffixes = discover(config.data_folder)
+    results  = []
+
+    # Check if we can run
+    if not suffixes:
+        defs.announce("No bots found in the data folder, no analysis possible")
+        exit()
+
+    # Analyze every bot in its own process
+    with ProcessPoolExecutor(max_workers=max(1, min(config.fleet_workers, len(suffixes)))) as executor:
+        futures = {suffix: executor.submit(analyze, suffix, days, stime) for suffix in suffixes}
+        for suffix, future in futures.items():
+            try:
+                results.append(future.result())
+            except Exception as e:
+                defs.announce(f"*** Warning: Failed to analyze bot {suffix}: {e} ***")
+
+    # Debug to stdout
+    if debug:
+        pprint.pprint(results)
+
+    # Output to stdout
+    print("*** Sunflow Cryptobot Fleet Report ***\n")
+    report(results, days)
+
+    # Check if we can save
+    if not results:
+        defs.announce("No bots could be analyzed, no report saved")
+        exit()
+
+    # Save report of every bot
+    with open(config.data_folder + "fleet.csv", 'w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    defs.announce(f"Analyzed {len(results)} bots in {defs.now_utc()[4] - stime} ms, report saved to {config.data_folder}fleet.csv")
@@ -0,0 +1,260 @@
+### Sunflow Cryptobot ###
+#
+# Gap detection of websocket streams, missed klines and trades are filled from the exchange
+
+# Load external libraries
+from loader import load_config
+import bisect, threading
+
+# Load internal libraries
+import cache, context, decode, defs, exchange, history, loader
+
+# Load config
+config = load_config()
+
+# Create gap detection state of a symbol
+def new_state():
+
+    # Initialize gaps
+    gaps            = {}
+    gaps['books']   = {'seq': None, 'resync': False}    # Last seqId of the orderbook, waiting for a snapshot after a gap
+    gaps['tickers'] = {}                                # Last exchange time of the tickers of every websocket
+    gaps['trades']  = {'id': 0, 'time': 0}              # Last trade ID and exchange time of the trades
+
+    # Initialize repairs, missed trades and klines are loaded in a background thread and merged on the next message
+    gaps['repair']  = {'ranges': [], 'trades': None, 'klines': {}, 'loading': set()}
+
+    # Initialize metrics
+    gaps['counts']  = {'books': 0, 'tickers': 0, 'trades': 0, 'klines': 0}    # Gaps detected
+    gaps['filled']  = {'trades': 0, 'klines': 0}                              # Missed trades and klines filled from the exchange
+
+    # Return state
+    return gaps
+
+# Check sequence of an orderbook message, returns if the book can be used and if a gap was found
+def check_book(book, action):
+
+    # Initialize variables
+    gaps  = context.current().gaps
+    state = gaps['books']
+    seq   = book.get('seqId')
+    prev  = book.get('prevSeqId')
+
+    # Channels books5 and bbo-tbt always send the full book
+    if seq is None or prev is None:
+        return True, False
+    seq  = int(seq)
+    prev = int(prev)
+
+    # Snapshot starts a new sequence
+    if action == "snapshot" or prev == -1:
+        state['seq']    = seq
+        state['resync'] = False
+        return True, False
+
+    # Waiting for a snapshot, updates can not be trusted
+    if state['resync']:
+        return False, False
+
+    # Every update continues where the previous one ended
+    if state['seq'] is not None and prev != state['seq']:
+        gaps['counts']['books'] = gaps['counts']['books'] + 1
+        state['resync'] = True
+        defs.log_error(f"*** Warning: Orderbook gap, expected prevSeqId {state['seq']} but received {prev}, resyncing orderbook ***")
+        return False, True
+
+    # Return book is usable
+    state['seq'] = seq
+    return True, False
+
+# Check exchange time of a ticker, every websocket should send its tickers in order
+def check_ticker(source, ts):
+
+    # Initialize variables
+    gaps = context.current().gaps
+    last = gaps['tickers'].get(source, 0)
+
+    # Ticker went back in time
+    if ts < last:
+        gaps['counts']['tickers'] = gaps['counts']['tickers'] + 1
+        defs.log_error(f"*** Warning: Ticker of {source} websocket went back in time from {last} to {ts} ms ***")
+        return
+
+    # Return
+    gaps['tickers'][source] = ts
+    return
+
+# Load missed trades from the exchange, runs in a background thread
+def fill_trades(ranges):
+
+    # Initialize variables
+    repair  = context.current().gaps['repair']
+    trades  = {'id': [], 'time': [], 'side': [], 'size': [], 'price': []}
+    missing = sum(before - after - 1 for after, before in ranges)
+
+    # Load recent trades and keep the missed trades
+    try:
+        result = exchange.get_trades()
+        if result[1] != 0:
+            defs.log_error(f"*** Warning: Failed to fill trade gap ***\n>>> Message {result[1]} - {result[2]}")
+            return
+        recent = decode.trades(result[0])
+        for i in range(len(recent['id'])):
+            if any(after < recent['id'][i] < before for after, before in ranges):
+                for key in trades:
+                    trades[key].append(recent[key][i])
+
+        # Report to stdout
+        if len(trades['id']) < missing:
+            defs.log_error(f"*** Warning: Filled {len(trades['id'])} of {missing} missed trades, the others are too old ***")
+        else:
+            defs.announce(f"Filled gap of {missing} missed trades")
+
+        # Hand trades over to the next message
+        repair['trades'] = trades
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to fill trade gap: {e} ***")
+    finally:
+        repair['loading'].discard("trades")
+
+    # Return
+    return
+
+# Check trades of a message, returns the trades to add including missed trades loaded in the background
+def check_trades(data):
+
+    # Initialize variables
+    gaps   = context.current().gaps
+    state  = gaps['trades']
+    repair = gaps['repair']
+    trades = {'time': [], 'side': [], 'size': [], 'price': []}
+
+    # Add missed trades loaded in the background first, the trade flow stays in chronological order
+    filled = repair['trades']
+    if filled is not None:
+        repair['trades'] = None
+        gaps['filled']['trades'] = gaps['filled']['trades'] + len(filled['id'])
+        for i in range(len(filled['id'])):
+            trades['time'].append(max(filled['time'][i], state['time']))
+            for key in ('side', 'size', 'price'):
+                trades[key].append(filled[key][i])
+
+    # Check every trade
+    for t in data:
+        trade_id = int(t['tradeId'])
+        ts       = int(t['ts'])
+
+        # Already received, for example again after a reconnect
+        if trade_id <= state['id']:
+            continue
+
+        # OKX numbers the trades of an instrument one by one, a skipped trade ID is a missed trade
+        if state['id'] and trade_id > state['id'] + 1:
+            gaps['counts']['trades'] = gaps['counts']['trades'] + 1
+            repair['ranges'].append((state['id'], trade_id))
+
+        # Trade went back in time
+        if ts < state['time']:
+            gaps['counts']['trades'] = gaps['counts']['trades'] + 1
+            defs.log_error(f"*** Warning: Trade {trade_id} went back in time from {state['time']} to {ts} ms ***")
+
+        # Add trade
+        trades['time'].append(ts)
+        trades['side'].append(t['side'].capitalize())
+        trades['size'].append(float(t['sz']))
+        trades['price'].append(float(t['px']))
+        state['id']   = trade_id
+        state['time'] = max(state['time'], ts)
+
+    # Load missed trades in the background, never on the event loop
+    if repair['ranges'] and "trades" not in repair['loading']:
+        repair['loading'].add("trades")
+        threading.Thread(target=loader.bind(fill_trades), args=(repair['ranges'],), daemon=True).start()
+        repair['ranges'] = []
+
+    # Return trades
+    return trades
+
+# Load missed klines from the exchange, runs in a background thread
+def fill_klines(interval, last, limit):
+
+    # Initialize variables
+    repair = context.current().gaps['repair']
+
+    # Fill the gap after the last cached kline, reload all klines when the gap is larger than the cache
+    try:
+        klines = history.fill(interval, last, limit + 1)
+        if klines['time']:
+            repair['klines'][interval] = klines
+        else:
+            cache.get_klines(interval, limit, True)
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to fill gap of klines with {interval} interval: {e} ***")
+    finally:
+        repair['loading'].discard(interval)
+
+    # Return
+    return
+
+# Insert klines loaded in the background into cached klines, klines already cached are kept, returns number inserted
+def insert(klines, filled, limit):
+
+    # Initialize variables
+    inserted = 0
+
+    # Every filled kline at its place in time
+    for i in range(len(filled['time'])):
+        index = bisect.bisect_left(klines['time'], filled['time'][i])
+        if index < len(klines['time']) and klines['time'][index] == filled['time'][i]:
+            continue
+        for key in cache.keys:
+            klines[key].insert(index, filled[key][i])
+        inserted = inserted + 1
+
+    # Keep the largest requested number of klines plus the running kline
+    excess = len(klines['time']) - (limit + 1)
+    if excess > 0:
+        for key in cache.keys:
+            del klines[key][:excess]
+
+    # Return number of inserted klines
+    return inserted
+
+# Check if a kline continues the klines in the cache, missed klines are loaded in the background
+def check_kline(interval, kline):
+
+    # Initialize variables
+    gaps   = context.current().gaps
+    repair = gaps['repair']
+    entry  = context.current().cache['store'].get((config.symbol, interval))
+
+    # Nothing cached
+    if not entry or not entry['klines']['time']:
+        return
+
+    # Add missed klines loaded in the background
+    filled = repair['klines'].pop(interval, None)
+    if filled is not None:
+        inserted = insert(entry['klines'], filled, entry['limit'])
+        gaps['filled']['klines'] = gaps['filled']['klines'] + inserted
+
+    # Kline starts right after the last cached kline
+    ms      = defs.interval_ms(interval)
+    missing = ((kline['time'] - entry['klines']['time'][-1]) // ms) - 1
+    if missing <= 0:
+        return
+
+    # Fill the gap in the background, never on the event loop
+    gaps['counts']['klines'] = gaps['counts']['klines'] + 1
+    defs.log_error(f"*** Warning: Missed {missing} klines with {interval} interval, filling gap in the background ***")
+    if interval not in repair['loading']:
+        repair['loading'].add(interval)
+        last = {key: entry['klines'][key][-1:] for key in cache.keys}
+        threading.Thread(target=loader.bind(fill_klines), args=(interval, last, entry['limit']), daemon=True).start()
+
+    # Return
+    return
+
+# Total number of gaps detected
+def total(gaps):
+    return sum(gaps['counts'].values())
@@ -0,0 +1,159 @@
+### Sunflow Cryptobot ###
+#
+# Load kline history from exchange in parallel pages
+
+# Load external libraries
+from concurrent.futures import ThreadPoolExecutor
+from loader import load_config
+import numpy as np
+
+# Load internal libraries
+import cache, decode, defs, exchange, limiter, loader, preload
+
+# Load config
+config = load_config()
+
+# Initialize variables
+page_limit   = 100        # Maximum number of klines per history request
+recent_limit = 300        # Maximum number of recent klines per request
+
+# Initialize rate limiter of history requests, shared by all threads and workers of the supervisor
+rate = limiter.new_rate(config.cache_rate, "history")
+
+# Get one page of history klines, older than after
+def get_page(interval, after):
+
+    # Initialize variables
+    result     = ()
+    response   = {}
+    error_code = 0
+    error_msg  = ""
+
+    # Load history klines
+    limiter.throttle(rate)
+    result     = exchange.get_history_klines(interval, after, page_limit)
+    response   = result[0]
+    error_code = result[1]
+    error_msg  = result[2]
+    if error_code != 0:
+        message = f"*** Warning: Failed to get history klines ***\n>>> Message {error_code} - {error_msg}"
+        defs.log_error(message)
+        return cache.empty()
+
+    # Return klines
+    return decode.klines(response)
+
+# Stitch pages into one list of klines, pages are in chronological order and do not overlap except at the edges
+def stitch(pages, first):
+
+    # Initialize variables
+    klines = cache.empty()
+    last   = first - 1
+
+    # Append every kline newer than the last one
+    for page in pages:
+        for i in range(len(page['time'])):
+            if page['time'][i] > last:
+                for key in cache.keys:
+                    klines[key].append(page[key][i])
+                last = page['time'][i]
+
+    # Return klines
+    return klines
+
+# Convert klines to columnar arrays
+def arrays(klines):
+    return {key: np.asarray(klines[key], dtype=np.int64 if key in ('time', 'status') else np.float64) for key in cache.keys}
+
+# Load klines between start and end (timestamps in ms) using parallel requests, optionally as columnar arrays
+def load(interval, start, end, columnar=False):
+
+    # Debug
+    debug = False
+    stime = defs.now_utc()[4]
+
+    # Initialize variables
+    klines = cache.empty()
+    ms     = defs.interval_ms(interval)
+    first  = start + ((ms - (start % ms)) % ms)
+    last   = end - (end % ms)
+
+    # Nothing to load
+    if last < first:
+        return arrays(klines) if columnar else klines
+
+    # Every page holds the klines before its after timestamp
+    number = ((last - first) // ms) + 1
+    pages  = -(-number // page_limit)
+    afters = [last + ms - (page * page_limit * ms) for page in range(pages)]
+
+    # Request pages in parallel
+    with ThreadPoolExecutor(max_workers=config.cache_workers) as executor:
+        results = list(executor.map(loader.bind(lambda after: get_page(interval, after)), afters))
+
+    # Stitch pages oldest first, skip klines before start
+    klines = stitch(reversed(results), first)
+
+    # Report to stdout
+    defs.announce(f"Loaded {len(klines['time'])} history klines with {interval} interval in {pages} pages")
+
+    # Debug to stdout
+    if debug:
+        defs.announce(f"Debug: Waited {rate['waited']}ms in total for the rate limit")
+        defs.announce(defs.report_exec(stime))
+
+    # Return klines
+    if columnar:
+        return arrays(klines)
+    return klines
+
+# Load the latest klines, also when more klines are requested than one request allows
+def latest(interval, limit):
+
+    # Initialize variables
+    ms     = defs.interval_ms(interval)
+    recent = preload.fetch_klines(interval, recent_limit)
+    older  = cache.empty()
+
+    # Load older klines from history
+    if recent['time'] and limit > len(recent['time']):
+        older = load(interval, recent['time'][0] - ((limit - len(recent['time'])) * ms), recent['time'][0] - 1)
+
+    # Stitch and keep the latest klines
+    klines = stitch([older, recent], 0)
+    klines = cache.tail(klines, limit)
+
+    # Return klines
+    return klines
+
+# Fill the gap between cached klines and now, returns empty klines if the cache is too old to be useful
+def fill(interval, klines, limit):
+
+    # Initialize variables
+    ms      = defs.interval_ms(interval)
+    now     = defs.now_utc()[4]
+    missing = 0
+
+    # Nothing cached
+    if not klines['time']:
+        return cache.empty()
+
+    # Number of klines since the last cached kline, which is loaded again because it might not have closed
+    missing = ((now - klines['time'][-1]) // ms) + 1
+    if missing >= limit:
+        return cache.empty()
+
+    # Load older missing klines from history and recent klines in one request
+    if missing > recent_limit:
+        older = load(interval, klines['time'][-1], now - (recent_limit * ms))
+        for i in range(len(older['time'])):
+            cache.merge({key: older[key][i] for key in cache.keys}, klines)
+    recent = preload.fetch_klines(interval, min(missing, recent_limit))
+    for i in range(len(recent['time'])):
+        cache.merge({key: recent[key][i] for key in cache.keys}, klines)
+
+    # Report to stdout
+    defs.announce(f"Filled gap of {missing} klines with {interval} interval in cache")
+
+    # Return klines
+    return klines
@@ -2,11 +2,12 @@
 #
 # Calculate technical indicators
 
-# Load external libraries
-import pandas as pd, pandas_ta as ta
-
 # Load internal libraries
-import defs
+import defs, loader
+
+# Load external libraries, only imported when indicators are calculated
+pd = loader.lazy("pandas")
+ta = loader.lazy("pandas_ta")
 
 # Calculcate indicators based on klines
 def calculate(klines, spot):
@@ -0,0 +1,387 @@
+### Sunflow Cryptobot ###
+#
+# Revenue store, every revenue event in a columnar file per day and hourly and daily totals kept up to date at write time
+#
+# Revenue events are queued and written by a background thread, finished days are compacted by a task of every symbol
+
+# Load external libraries
+from datetime import datetime, timezone
+from loader import load_config
+import numpy as np
+import atexit, csv, glob, os, threading
+
+# Load internal libraries
+import defs, loader
+
+# Load config
+config = load_config()
+
+# Load external libraries, only imported when finished days are stored as Parquet
+pa = loader.lazy("pyarrow")
+pq = loader.lazy("pyarrow.parquet")
+
+# Columns of revenue events, side is 1 for buy and -1 for sell
+event_dtype  = np.dtype([('time', 'i8'), ('created', 'i8'), ('side', 'i1'), ('price', 'f8'), ('qty', 'f8'), ('value', 'f8'), ('fee', 'f8'), ('revenue', 'f8'), ('orderid', 'S32'), ('linkedid', 'S32')])
+
+# Columns of totals per period, revenue, minimum, maximum, first and last are of sells only
+rollup_dtype = np.dtype([('time', 'i8'), ('buys', 'i8'), ('sells', 'i8'), ('bought', 'f8'), ('sold', 'f8'), ('revenue', 'f8'), ('min', 'f8'), ('max', 'f8'), ('first', 'i8'), ('last', 'i8')])
+
+# Periods of the totals in ms
+periods = {'hourly': 3600000, 'daily': 86400000}
+
+# Initialize variables
+condition = threading.Condition()
+queue     = []                # Revenue events and compactions to write, with the data suffix of their symbol
+dispatch  = {'thread': None, 'busy': False}
+
+# Create revenue store state of a symbol
+def new_state():
+
+    # Initialize compaction
+    compaction          = {}
+    compaction['time']  = defs.now_utc()[4]    # Time of last check for finished days
+    compaction['day']   = ""                   # Day of last compaction, empty to compact at start
+    compaction['delay'] = 3600000              # Time in ms between checks for finished days
+
+    # Return state
+    return compaction
+
+# Folder of the events, of another bot when its data suffix is given
+def folder(suffix=None):
+    return (suffix or config.data_suffix) + "revenue/"
+
+# Filename of the events of a day, day is formatted as YYYY-MM-DD in UTC
+def day_file(day, extension="bin", suffix=None):
+    return folder(suffix) + f"{day}.{extension}"
+
+# Filename of the totals of a period, of another bot when its data suffix is given
+def rollup_file(name, suffix=None):
+    return (suffix or config.data_suffix) + f"revenue_{name}.bin"
+
+# Day in UTC of a time in ms
+def day_of(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m-%d')
+
+# Check if the revenue store exists
+def exists():
+    return os.path.exists(rollup_file("daily"))
+
+# Create revenue event of a closed order
+def event(active_order, order, revenue, ms):
+
+    # Initialize variables
+    record = np.zeros(1, dtype=event_dtype)
+
+    # Fill columns
+    record['time']     = ms
+    record['created']  = int(order['createdTime'])
+    record['side']     = 1 if active_order['side'] == "Buy" else -1
+    record['price']    = float(order['avgPrice'])
+    record['qty']      = float(order['cumExecQty'])
+    record['value']    = float(order['cumExecValue'])
+    record['fee']      = float(order['cumExecFee'])
+    record['revenue']  = float(revenue) if record['side'][0] == -1 else 0.0
+    record['orderid']  = str(order['orderid']).encode()
+    record['linkedid'] = str(order['linkedid']).encode()
+
+    # Return event
+    return record
+
+# Totals per period of events sorted by time
+def rollup(events, period):
+
+    # Initialize variables
+    starts         = events['time'] - events['time'] % period
+    keys, index    = np.unique(starts, return_index=True)
+    sell           = events['side'] == -1
+    result         = np.zeros(len(keys), dtype=rollup_dtype)
+    if len(keys) == 0:
+        return result
+
+    # Sum every period
+    result['time']    = keys
+    result['buys']    = np.add.reduceat((~sell).astype(np.int64), index)
+    result['sells']   = np.add.reduceat(sell.astype(np.int64), index)
+    result['bought']  = np.add.reduceat(np.where(sell, 0.0, events['value']), index)
+    result['sold']    = np.add.reduceat(np.where(sell, events['value'], 0.0), index)
+    result['revenue'] = np.add.reduceat(np.where(sell, events['revenue'], 0.0), index)
+    result['min']     = np.minimum.reduceat(np.where(sell, events['revenue'], np.inf), index)
+    result['max']     = np.maximum.reduceat(np.where(sell, events['revenue'], -np.inf), index)
+    result['first']   = np.minimum.reduceat(np.where(sell, events['time'], np.iinfo(np.int64).max), index)
+    result['last']    = np.maximum.reduceat(np.where(sell, events['time'], 0), index)
+
+    # Periods without sells have no minimum, maximum, first and last
+    none = result['sells'] == 0
+    result['min'][none] = result['max'][none] = 0.0
+    result['first'][none] = result['last'][none] = 0
+
+    # Return totals
+    return result
+
+# Add the totals of a period to the totals of the same period
+def merge(row, new):
+
+    # Add first sell of period
+    if row['sells'] == 0:
+        for key in ('min', 'max', 'first', 'last'):
+            row[key] = new[key]
+    elif new['sells'] > 0:
+        row['min']   = min(row['min'], new['min'])
+        row['max']   = max(row['max'], new['max'])
+        row['first'] = min(row['first'], new['first'])
+        row['last']  = max(row['last'], new['last'])
+
+    # Add counts and sums
+    for key in ('buys', 'sells', 'bought', 'sold', 'revenue'):
+        row[key] = row[key] + new[key]
+
+    # Return row
+    return row
+
+# Update the totals of a period in place, usually the last period is updated or a new period is added
+def update(filename, new):
+
+    # Initialize variables
+    size = rollup_dtype.itemsize
+    mode = 'r+b' if os.path.exists(filename) else 'w+b'
+
+    # Find period, a partially written row of a crash is overwritten
+    with open(filename, mode) as file:
+        rows  = file.seek(0, os.SEEK_END) // size
+        index = rows
+        row   = new.copy()
+        if rows:
+            file.seek((rows - 1) * size)
+            last = np.frombuffer(file.read(size), dtype=rollup_dtype).copy()[0]
+            if last['time'] == new['time']:
+                index = rows - 1
+                row   = merge(last, new)
+
+            # Event of an earlier period, rare so all totals are read
+            elif last['time'] > new['time']:
+                file.seek(0)
+                totals = np.frombuffer(file.read(rows * size), dtype=rollup_dtype).copy()
+                index  = int(np.searchsorted(totals['time'], new['time']))
+                if totals['time'][index] == new['time']:
+                    row = merge(totals[index], new)
+                else:
+                    totals = np.insert(totals, index, new)
+                    file.seek(0)
+                    file.write(totals.tobytes())
+                    file.truncate()
+                    return
+
+        # Write period
+        file.seek(index * size)
+        file.write(np.array([row], dtype=rollup_dtype).tobytes())
+        file.truncate()
+
+    # Return
+    return
+
+# Queue work for the writer, returns right away
+def put(kind, payload):
+
+    # Add to queue, the data suffix is taken now because the writer runs without the config of the symbol
+    with condition:
+        queue.append((kind, config.data_suffix, payload))
+        condition.notify()
+
+        # Start writer on first event, queued events are also written when Sunflow exits unexpectedly
+        if dispatch['thread'] is None:
+            dispatch['thread'] = threading.Thread(target=worker, name="ledger", daemon=True)
+            dispatch['thread'].start()
+            atexit.register(flush)
+
+    # Return
+    return
+
+# Write queued revenue events and compactions
+def worker():
+    while True:
+
+        # Take everything queued
+        with condition:
+            condition.wait_for(lambda: queue)
+            batch = queue[:]
+            queue.clear()
+            dispatch['busy'] = True
+
+        # Write in order of arrival
+        for kind, suffix, payload in batch:
+            if kind == "event":
+                store(payload, suffix)
+            else:
+                compact(payload, suffix)
+
+        # Wake up flush
+        with condition:
+            dispatch['busy'] = False
+            condition.notify_all()
+
+# Append revenue event to the events of its day and update totals, runs in the writer
+def store(record, suffix):
+    try:
+        day = day_of(int(record['time'][0]))
+        if not os.path.exists(folder(suffix)):
+            os.makedirs(folder(suffix))
+        with open(day_file(day, "bin", suffix), 'ab') as file:
+            file.truncate(file.tell() - file.tell() % event_dtype.itemsize)
+            record.tofile(file)
+        for name, period in periods.items():
+            update(rollup_file(name, suffix), rollup(record, period)[0])
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to add revenue to the revenue store: {e} ***")
+
+# Add revenue event of a closed order to the store, never stops trading
+def add(active_order, order, revenue):
+
+    # Queue event
+    try:
+        put("event", event(active_order, order, revenue, defs.now_utc()[4]))
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to add revenue to the revenue store: {e} ***")
+
+    # Return
+    return
+
+# Queue compaction of finished days once a day, runs as a task of a symbol
+def check(ctx, current_time):
+
+    # Initialize variables
+    ctx.ledger['time'] = current_time
+    today              = day_of(current_time)
+
+    # Compact when the day changed
+    if ctx.ledger['day'] != today:
+        ctx.ledger['day'] = today
+        put("compact", today)
+
+    # Return
+    return
+
+# Wait until all queued revenue events are written, for example before Sunflow terminates
+def flush(timeout=30):
+
+    # Nothing was ever queued
+    if dispatch['thread'] is None:
+        return
+
+    # Wait for writer
+    with condition:
+        condition.wait_for(lambda: not queue and not dispatch['busy'], timeout)
+
+    # Return
+    return
+
+# Store the events of finished days as Parquet when the pyarrow library is installed, the smallest columnar files
+def compact(today, suffix=None):
+
+    # Check library
+    try:
+        pa.__version__
+    except ImportError:
+        return
+
+    # Convert every finished day
+    for filename in sorted(glob.glob(glob.escape(folder(suffix)) + "*.bin")):
+        day = os.path.basename(filename)[:-4]
+        if day >= today:
+            continue
+        try:
+            events    = np.fromfile(filename, dtype=event_dtype)
+            table     = pa.table({name: events[name] for name in event_dtype.names})
+            temp_file = day_file(day, "parquet", suffix) + ".tmp"
+            pq.write_table(table, temp_file)
+            os.replace(temp_file, day_file(day, "parquet", suffix))
+            os.remove(filename)
+        except Exception as e:
+            defs.log_error(f"*** Warning: Failed to store revenue of {day} as Parquet: {e} ***")
+
+    # Return
+    return
+
+# Load the events of a day, for drill down of the totals
+def load_day(day):
+
+    # Events of today or when pyarrow is not installed
+    if os.path.exists(day_file(day)):
+        size = os.path.getsize(day_file(day)) // event_dtype.itemsize
+        return np.fromfile(day_file(day), dtype=event_dtype, count=size)
+
+    # Events of a finished day
+    if os.path.exists(day_file(day, "parquet")):
+        table  = pq.read_table(day_file(day, "parquet"))
+        events = np.zeros(table.num_rows, dtype=event_dtype)
+        for name in event_dtype.names:
+            events[name] = table.column(name).to_numpy()
+        return events
+
+    # Return no events
+    return np.zeros(0, dtype=event_dtype)
+
+# Load the totals of a period, hourly or daily
+def load_rollup(name, suffix=None):
+    filename = rollup_file(name, suffix)
+    if not os.path.exists(filename):
+        return np.zeros(0, dtype=rollup_dtype)
+    size = os.path.getsize(filename) // rollup_dtype.itemsize
+    return np.fromfile(filename, dtype=rollup_dtype, count=size)
+
+# Read the events of a revenue log sorted by time
+def read_log(revenue_file):
+
+    # Initialize variables
+    columns = {'UTCTime': [], 'createdTime': [], 'side': [], 'avgPrice': [], 'cumExecQty': [], 'cumExecValue': [], 'cumExecFee': [], 'revenue': [], 'orderid': [], 'linkedid': []}
+    numbers = ('createdTime', 'avgPrice', 'cumExecQty', 'cumExecValue', 'cumExecFee', 'revenue')
+
+    # Read revenue log, lines of the extended format are skipped
+    if os.path.exists(revenue_file):
+        with open(revenue_file, newline='', encoding='utf-8') as file:
+            for line in csv.DictReader(file):
+                try:
+                    values = {key: float(line[key]) if key in numbers else line[key].replace(" ", "T") if key == 'UTCTime' else line[key] for key in columns}
+                    np.datetime64(values['UTCTime'], 'ms')
+                except (AttributeError, KeyError, TypeError, ValueError):
+                    continue
+                for key in columns:
+                    columns[key].append(values[key])
+
+    # Create events sorted by time
+    events             = np.zeros(len(columns['UTCTime']), dtype=event_dtype)
+    events['time']     = np.array(columns['UTCTime'], dtype='datetime64[ms]').astype(np.int64)
+    events['created']  = columns['createdTime']
+    events['side']     = np.where(np.array(columns['side']) == "Buy", 1, -1)
+    events['price']    = columns['avgPrice']
+    events['qty']      = columns['cumExecQty']
+    events['value']    = columns['cumExecValue']
+    events['fee']      = columns['cumExecFee']
+    events['revenue']  = np.where(events['side'] == -1, columns['revenue'], 0.0)
+    events['orderid']  = columns['orderid']
+    events['linkedid'] = columns['linkedid']
+    events             = events[np.argsort(events['time'], kind='stable')]
+
+    # Return events
+    return events
+
+# Build the revenue store from the revenue log, used once for revenue logged before the revenue store existed
+def rebuild(revenue_file):
+
+    # Read revenue log
+    events = read_log(revenue_file)
+
+    # Write events per day and totals
+    if not os.path.exists(folder()):
+        os.makedirs(folder())
+    days = events['time'] // periods['daily']
+    for day in np.unique(days):
+        events[days == day].tofile(day_file(day_of(int(day) * periods['daily'])))
+    for name, period in periods.items():
+        rollup(events, period).tofile(rollup_file(name))
+    compact(day_of(defs.now_utc()[4]))
+
+    # Report to stdout
+    defs.announce(f"Revenue store built from {len(events)} lines of the revenue log")
+
+    # Return
+    return
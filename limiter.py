@@ -0,0 +1,77 @@
+### Sunflow Cryptobot ###
+#
+# Rate limiters for requests to the exchange
+
+# Load external libraries
+import threading, time
+
+# Load internal libraries
+import broker
+
+# Create a token bucket rate limiter, shared by all threads using it, and by all workers of the supervisor when named
+def new_rate(per_second, name=""):
+
+    # Initialize rate limiter
+    rate               = {}
+    rate['lock']       = threading.Lock()
+    rate['name']       = name                 # Name of the budget shared by all workers of the supervisor
+    rate['per_second'] = per_second           # Maximum number of requests per second
+    rate['tokens']     = per_second           # Requests that can be sent right away
+    rate['time']       = time.monotonic()     # Time of last refill
+    rate['waited']     = 0                    # Total time in ms spent waiting for the rate limit
+
+    # Return rate limiter
+    return rate
+
+# Wait until a request is allowed by the budget of the supervisor, returns False when there is no supervisor
+def throttle_shared(rate):
+
+    # Not running under the supervisor
+    if not rate['name'] or not broker.connect():
+        return False
+
+    # Reserve request at the broker and wait
+    try:
+        delay = broker.connect().reserve(rate['name'], rate['per_second'])
+    except Exception as e:
+        import defs    # Imported here, defs depends on this library
+        defs.log_error(f"*** Warning: Lost connection to supervisor, using rate limit of this worker only: {e} ***")
+        broker.disconnect()
+        return False
+    if delay > 0:
+        time.sleep(delay)
+        rate['waited'] = rate['waited'] + int(delay * 1000)
+
+    # Return
+    return True
+
+# Wait until a request is allowed by the rate limiter
+def throttle(rate):
+
+    # Use budget shared by all workers
+    if throttle_shared(rate):
+        return
+
+    # Initialize variables
+    delay = 0.0
+
+    # Only one thread at a time takes a token
+    with rate['lock']:
+
+        # Refill tokens, at most one second of requests
+        now = time.monotonic()
+        rate['tokens'] = min(rate['per_second'], rate['tokens'] + ((now - rate['time']) * rate['per_second']))
+        rate['time']   = now
+
+        # Take token, when there are none left the delay until it is refilled is reserved
+        rate['tokens'] = rate['tokens'] - 1
+        if rate['tokens'] < 0:
+            delay = -rate['tokens'] / rate['per_second']
+            rate['waited'] = rate['waited'] + int(delay * 1000)
+
+    # Wait without holding the lock, other threads reserve the tokens after this one
+    if delay > 0:
+        time.sleep(delay)
+
+    # Return
+    return
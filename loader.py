@@ -4,27 +4,99 @@
 
 # Load external libraries
 from pathlib import Path
-import argparse, importlib, sys
+import argparse, contextlib, contextvars, importlib, sys
+
+# Initialize variables
+configs   = []                                                 # All loaded config modules, the first one is the default
+arguments = {}                                                 # Command line arguments, parsed once
+active    = contextvars.ContextVar("config", default=None)     # Config of the symbol being handled
+
+# Config that reads from the config of the symbol being handled, or the default config
+class Config:
+
+    # Get setting
+    def __getattr__(self, name):
+        module = active.get()
+        if module is None:
+            module = configs[0]
+        return getattr(module, name)
+
+# Shared config object for all internal libraries
+proxy = Config()
+
+# Module that is imported on first use, heavy libraries of disabled features never slow down the startup
+class Lazy:
+
+    # Remember module name
+    def __init__(self, name):
+        self.name   = name
+        self.module = None
+
+    # Import module and get attribute
+    def __getattr__(self, name):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, name)
+
+# Import module on first use
+def lazy(name):
+    return Lazy(name)
+
+# Load all configuration files, use -c multiple times for multiple symbols
+def load_configs():
+
+    # Only load once
+    if configs:
+        return configs
 
-# Load configuration file
-def load_config():
-    
     # Parse command line arguments
     parser = argparse.ArgumentParser()
-    parser.add_argument('-c', '--config', default='config.py')
-    parser.add_argument('-d', '--days', type=int, default=30,)
+    parser.add_argument('-c', '--config', action='append', help='Config file (with .py extension), use multiple times for multiple symbols.')
+    parser.add_argument('-d', '--days', type=int, default=30, help='Number of days to display in the profit per day graph of the analyzer.')
     args = parser.parse_args()
+    arguments.update(vars(args))
+
+    # Load every config file
+    for config_file in args.config or ['config.py']:
+
+        # Resolve config file path
+        config_path = Path(config_file).resolve()
+        if not config_path.exists():
+            print(f"Config file not found at {config_path}, aborting...\n")
+            sys.exit()
+
+        # Dynamically load the config module
+        sys.path.append(str(config_path.parent))
+        config_module_name = config_path.stem
+        if config_module_name in sys.modules:
+            print(f"Config file {config_path} has the same name as another config file or module, aborting...\n")
+            sys.exit()
+        configs.append(importlib.import_module(config_module_name))
+
+    # Return configs
+    return configs
+
+# Load configuration file
+def load_config():
+
+    # Load config files
+    load_configs()
 
-    # Resolve config file path
-    config_path = Path(args.config).resolve()
-    if not config_path.exists():
-        print(f"Config file not found at {config_path}, aborting...\n")
-        sys.exit()
-
-    # Dynamically load the config module
-    sys.path.append(str(config_path.parent))
-    config_module_name = config_path.stem
-    config = importlib.import_module(config_module_name)
-    
     # Return config
-    return config
\ No newline at end of file
+    return proxy
+
+# Make config active for the symbol being handled
+@contextlib.contextmanager
+def use(config):
+    token = active.set(config)
+    try:
+        yield config
+    finally:
+        active.reset(token)
+
+# Bind function to the active config, used for threads which do not inherit the active config
+def bind(function):
+    context = contextvars.copy_context()
+    def run(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+    return run
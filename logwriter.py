@@ -0,0 +1,210 @@
+### Sunflow Cryptobot ###
+#
+# Log files written by a background thread in batches, rotated by size or age and optionally compressed
+
+# Load external libraries
+from loader import load_config
+import atexit, glob, gzip, os, shutil, threading, time
+
+# Load internal libraries
+import defs, loader
+
+# Load config
+config = load_config()
+
+# Load external libraries, only imported when rotated log files are compressed with zstd
+zstandard = loader.lazy("zstandard")
+
+# Initialize variables
+condition = threading.Condition()
+files     = {}                # Buffered lines and rotation settings of every log file
+dispatch  = {'thread': None, 'busy': False, 'flush': False}
+
+# Initialize metrics
+metrics              = {}
+metrics['lines']     = 0      # Lines written
+metrics['bytes']     = 0      # Bytes written
+metrics['batches']   = 0      # Times the buffers were written
+metrics['rotations'] = 0      # Log files rotated
+metrics['max']       = 0      # Maximum lines buffered
+
+# Register a log file, settings are taken from the config of the symbol that writes first
+def register(filename, header="", rotate=True):
+
+    # Initialize variables
+    size = os.path.getsize(filename) if os.path.exists(filename) else 0
+
+    # Initialize log file
+    with condition:
+        files[filename] = {
+            'lines'   : files[filename]['lines'] if filename in files else [],
+            'header'  : header,                                   # Written at the start of every new log file
+            'rotate'  : rotate,                                   # Rotate this log file
+            'size'    : size,                                     # Size in bytes of the log file
+            'start'   : defs.now_utc()[4],                        # Time in ms the log file was started or first written
+            'max_size': config.log_rotate_size,                   # Rotate when larger than this size in bytes
+            'max_time': config.log_rotate_time,                   # Rotate after this time in ms
+            'keep'    : config.log_rotate_keep,                   # Number of rotated log files to keep
+            'compress': config.log_compress,                      # Compression of rotated log files
+            'buffer'  : config.log_buffer,                        # Lines buffered before writing right away
+            'flush'   : config.log_flush                          # Time in ms between writes
+        }
+
+    # Return
+    return
+
+# Buffer text for a log file, returns right away
+def write(filename, text):
+
+    # Register log file on first write
+    if filename not in files:
+        register(filename)
+
+    # Add to buffer
+    with condition:
+        entry = files[filename]
+        entry['lines'].append(text)
+        metrics['max'] = max(metrics['max'], len(entry['lines']))
+        if len(entry['lines']) >= entry['buffer']:
+            condition.notify()
+
+        # Start writer on first line, buffered lines are also written when Sunflow exits unexpectedly
+        if dispatch['thread'] is None:
+            dispatch['thread'] = threading.Thread(target=worker, name="logwriter", daemon=True)
+            dispatch['thread'].start()
+            atexit.register(flush)
+
+    # Return
+    return
+
+# Take the buffered lines of all log files, waits until the buffers are full or log_flush ms passed
+def take():
+    with condition:
+        delay    = min(entry['flush'] for entry in files.values()) / 1000
+        deadline = time.monotonic() + delay
+        while not dispatch['flush']:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or any(len(entry['lines']) >= entry['buffer'] for entry in files.values()):
+                break
+            condition.wait(remaining)
+        batch = {}
+        for filename, entry in files.items():
+            if entry['lines']:
+                batch[filename] = entry['lines']
+                entry['lines']  = []
+        dispatch['busy'] = bool(batch)
+    return batch
+
+# Write buffered lines to the log files
+def worker():
+    while True:
+
+        # Write every log file in one go
+        batch = take()
+        for filename, lines in batch.items():
+            entry = files[filename]
+            data  = "".join(lines).encode('utf-8')
+            try:
+                if due(entry, len(data)):
+                    rotate(filename, entry)
+                with open(filename, 'ab') as file:
+                    file.write(data)
+                entry['size'] = entry['size'] + len(data)
+            except OSError as e:
+                defs.announce(f"*** Warning: Failed to write {len(lines)} lines to {filename}: {e} ***")
+                continue
+            metrics['lines'] = metrics['lines'] + len(lines)
+            metrics['bytes'] = metrics['bytes'] + len(data)
+
+        # Update metrics
+        with condition:
+            if batch:
+                metrics['batches'] = metrics['batches'] + 1
+            dispatch['busy'] = False
+            condition.notify_all()
+
+# Check if a log file has to be rotated before writing size bytes
+def due(entry, size):
+
+    # Rotation disabled or nothing written yet
+    if not entry['rotate'] or entry['size'] <= len(entry['header']):
+        return False
+
+    # Too large or too old
+    too_large = entry['max_size'] and entry['size'] + size > entry['max_size']
+    too_old   = entry['max_time'] and defs.now_utc()[4] - entry['start'] >= entry['max_time']
+    return bool(too_large or too_old)
+
+# Rotate a log file, the old file gets a timestamp and is compressed, the oldest rotated files are removed
+def rotate(filename, entry):
+
+    # Rename the log file
+    now     = time.time()
+    rotated = f"{filename}.{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}{int(now * 1000) % 1000:03d}"
+    if os.path.exists(filename):
+        os.replace(filename, rotated)
+        compress(rotated, entry['compress'])
+
+    # Start a new log file
+    with open(filename, 'w', encoding='utf-8') as file:
+        file.write(entry['header'])
+    entry['size']  = len(entry['header'].encode('utf-8'))
+    entry['start'] = defs.now_utc()[4]
+    metrics['rotations'] = metrics['rotations'] + 1
+
+    # Remove the oldest rotated log files, timestamps sort in chronological order
+    rotated_files = sorted(glob.glob(glob.escape(filename) + ".*"))
+    for old_file in rotated_files[:max(len(rotated_files) - entry['keep'], 0)]:
+        os.remove(old_file)
+
+    # Return
+    return
+
+# Compress a rotated log file with gzip or zstd
+def compress(filename, method):
+
+    # Not compressed
+    if method not in ("gzip", "zstd"):
+        return
+
+    # Compress with zstd, fall back to gzip when the zstandard library is not installed
+    if method == "zstd":
+        try:
+            compressor = zstandard.ZstdCompressor()
+        except ImportError:
+            compressor = None
+            defs.announce("*** Warning: Library zstandard not installed, compressing log files with gzip ***")
+        if compressor:
+            with open(filename, 'rb') as source, open(filename + ".zst", 'wb') as target:
+                compressor.copy_stream(source, target)
+            os.remove(filename)
+            return
+
+    # Compress with gzip
+    with open(filename, 'rb') as source, gzip.open(filename + ".gz", 'wb') as target:
+        shutil.copyfileobj(source, target)
+    os.remove(filename)
+
+    # Return
+    return
+
+# Wait until all buffered lines are written, for example before Sunflow terminates
+def flush(timeout=30):
+
+    # Nothing was ever written
+    if dispatch['thread'] is None:
+        return
+
+    # Write right away and wait for writer
+    with condition:
+        dispatch['flush'] = True
+        condition.notify_all()
+        condition.wait_for(lambda: not any(entry['lines'] for entry in files.values()) and not dispatch['busy'], timeout)
+        dispatch['flush'] = False
+
+    # Return
+    return
+
+# Report metrics
+def report():
+    return f"Log files: {metrics['lines']:,} lines and {metrics['bytes']:,} bytes written in {metrics['batches']:,} batches, {metrics['rotations']} rotations, at most {metrics['max']:,} lines buffered"
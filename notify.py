@@ -0,0 +1,159 @@
+### Sunflow Cryptobot ###
+#
+# Notifications via Apprise, sent by a background thread so a slow messaging service never delays trading
+
+# Load external libraries
+from loader import load_config
+import threading, time
+
+# Load internal libraries
+import defs, loader
+
+# Load config
+config = load_config()
+
+# Load external libraries, only imported when notifications are sent
+apprise = loader.lazy("apprise")
+
+# Priorities, when the queue is full the lowest priority is dropped first, high priority is sent right away
+priorities = {'low': 0, 'normal': 1, 'high': 2}
+
+# Initialize variables
+condition = threading.Condition()
+pending   = []                # Messages waiting to be sent
+apobjs    = {}                # Apprise instance of every notify URL
+dispatch  = {'thread': None, 'busy': False, 'flush': False}
+
+# Initialize metrics
+metrics              = {}
+metrics['queued']    = 0      # Messages queued
+metrics['sent']      = 0      # Messages sent
+metrics['batches']   = 0      # Notifications sent, one notification holds all messages of a digest
+metrics['retries']   = 0      # Notifications sent again after a failure
+metrics['failed']    = 0      # Messages that could not be sent
+metrics['dropped']   = 0      # Messages dropped because the queue was full
+metrics['latency']   = 0      # Time in ms from queueing to sending of the last message
+metrics['max']       = 0      # Maximum time in ms from queueing to sending
+
+# Get the Apprise instance of a notify URL, created on first notification
+def get_apobj(url):
+    if url not in apobjs:
+        apobj = apprise.Apprise()
+        apobj.add(list(url))
+        apobjs[url] = apobj
+    return apobjs[url]
+
+# Queue message, returns right away
+def send(message, priority="normal"):
+
+    # Initialize variables, the notify URL is taken now because the worker runs without the config of the symbol
+    url  = tuple(config.notify_url) if isinstance(config.notify_url, (list, tuple)) else (config.notify_url,)
+    item = {'message': message, 'priority': priorities[priority], 'time': time.monotonic(), 'url': url}
+
+    # Add to queue
+    with condition:
+
+        # Queue is full, drop the oldest message of the lowest priority, or this message when that is lower
+        if len(pending) >= config.notify_queue:
+            lowest = min(pending, key=lambda queued: queued['priority'])
+            metrics['dropped'] = metrics['dropped'] + 1
+            if item['priority'] <= lowest['priority']:
+                return
+            pending.remove(lowest)
+
+        # Queue message
+        pending.append(item)
+        metrics['queued'] = metrics['queued'] + 1
+        condition.notify()
+
+        # Start worker on first message
+        if dispatch['thread'] is None:
+            dispatch['thread'] = threading.Thread(target=worker, name="notify", daemon=True)
+            dispatch['thread'].start()
+
+    # Return
+    return
+
+# Take the next digest from the queue, waits until the oldest message is notify_digest seconds old
+def take():
+    with condition:
+        while not pending:
+            condition.wait()
+        while True:
+            remaining = pending[0]['time'] + config.notify_digest - time.monotonic()
+            if remaining <= 0 or dispatch['flush'] or any(item['priority'] == priorities['high'] for item in pending):
+                break
+            condition.wait(remaining)
+        batch = list(pending)
+        pending.clear()
+        dispatch['busy'] = True
+    return batch
+
+# Send notifications from the queue
+def worker():
+    while True:
+
+        # Combine all messages of a digest into one notification per notify URL
+        groups = {}
+        for item in take():
+            groups.setdefault(item['url'], []).append(item)
+        for url, batch in groups.items():
+            deliver(url, batch)
+
+        # Wake up flush
+        with condition:
+            dispatch['busy'] = False
+            condition.notify_all()
+
+# Send one notification of a batch of messages
+def deliver(url, batch):
+
+    # Initialize variables
+    body  = "\n\n".join(item['message'] for item in batch)
+    delay = 1
+    sent  = False
+
+    # Send with retries and a doubling delay
+    for attempt in range(config.notify_retries + 1):
+        try:
+            sent = get_apobj(url).notify(body=body, title="Sunflow@OKX")
+        except Exception as e:
+            defs.announce(f"*** Warning: Notification failed: {e} ***")
+        if sent:
+            break
+        if attempt < config.notify_retries:
+            metrics['retries'] = metrics['retries'] + 1
+            time.sleep(delay)
+            delay = delay * 2
+
+    # Update metrics
+    with condition:
+        now = time.monotonic()
+        if sent:
+            metrics['sent']    = metrics['sent'] + len(batch)
+            metrics['batches'] = metrics['batches'] + 1
+            metrics['latency'] = int((now - batch[-1]['time']) * 1000)
+            metrics['max']     = max(metrics['max'], int((now - batch[0]['time']) * 1000))
+        else:
+            metrics['failed'] = metrics['failed'] + len(batch)
+            defs.announce(f"*** Warning: Dropped notification of {len(batch)} message(s) after {config.notify_retries} retries ***")
+
+    # Return
+    return
+
+# Wait until all queued messages are sent, for example before Sunflow terminates
+def flush(timeout=30):
+
+    # Send digest right away and wait for worker
+    with condition:
+        dispatch['flush'] = True
+        condition.notify_all()
+        condition.wait_for(lambda: not pending and not dispatch['busy'], timeout)
+        dispatch['flush'] = False
+
+    # Return
+    return
+
+# Report metrics
+def report():
+    return f"Notifications: {metrics['sent']} sent in {metrics['batches']} batches, {metrics['failed']} failed, {metrics['dropped']} dropped, {metrics['retries']} retries, latency {metrics['latency']:,} ms (max {metrics['max']:,} ms)"
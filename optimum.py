@@ -3,11 +3,14 @@
 # Find optimal trigger price distance and profit percentage
 
 # Load external libraries
-import math, pandas as pd, pprint
+import math, pprint
 
 # Load internal libraries
 from loader import load_config
-import defs
+import context, defs, loader
+
+# Load external libraries, only imported when the optimizer runs
+pd = loader.lazy("pandas")
 
 # Load config
 config = load_config()
@@ -54,7 +57,7 @@ def build_df(optimizer, prices, interval):
     stime = defs.now_utc()[4]
 
     # Resample and create dataframe for the first time or get it from cache
-    if optimizer['df'].empty:
+    if optimizer['df'] is None or optimizer['df'].empty:
         df = resample_optimzer(prices, interval)
     else:
         df = optimizer['df']
@@ -109,15 +112,14 @@ def calc_volatility(optimizer, df, prices, distance, spread, profit, length=10):
     speed = True
     stime = defs.now_utc()[4]
 
-    # Global error counter
-    global df_errors, halt_sunflow
+    # Error counter of symbol
+    ctx = context.current()
     
     # Initialize variables
     distance_new = distance
     spread_new   = spread
     profit_new   = profit
     success      = False
-    df_errors    = 0
     
     try:
         # Debug
@@ -172,18 +174,18 @@ def calc_volatility(optimizer, df, prices, distance, spread, profit, length=10):
     except Exception as e:
         
         # Count the errors and log
-        df_errors  = df_errors + 1
+        ctx.df_errors = ctx.df_errors + 1
         message = f"*** Error Optimize failed: {e} ***"
         defs.log_error(message)
         
         # After three consecutive errors halt
-        if df_errors > 2:
-            halt_sunflow = True
+        if ctx.df_errors > 2:
+            context.halt(ctx)
         if speed: defs.announce(defs.report_exec(stime, "early return due to error"))    
         return distance, spread, profit
    
     # Reset error counter
-    df_errors = 0
+    ctx.df_errors = 0
     
     # Report to stdout
     if volatility != 0:
@@ -207,9 +209,6 @@ def optimize(prices, profit, active_order, use_spread, optimizer):
     speed = True
     stime = defs.now_utc()[4]
     
-    # Global error counter
-    global df_errors, halt_sunflow
-  
     # Initialize variables
     limit        = str(int(''.join(filter(str.isdigit, optimizer['interval']))))
     interval     = limit + optimizer['delta']   # Interval used for indicator KPI (in our case historical volatility)
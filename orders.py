@@ -4,7 +4,7 @@
 
 # Load external libraries
 from loader import load_config
-import pprint, requests
+import pprint
 
 # Load internal libraries
 import database, decode, defs, exchange, distance, preload
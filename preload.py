@@ -3,15 +3,54 @@
 # Preload ticker, klines, instrument info and other data
 
 # Load external libraries
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from loader import load_config
 import os, pprint
 
 # Load internal libraries
-import database, decode, defs, exchange, orders
+import cache, database, decode, defs, exchange, history, ledger, loader, logwriter, orders
 
 # Load config
 config = load_config()
 
+# Run a preload step and store its time in ms
+def timed(timings, name, function, *args):
+    stime         = defs.now_utc()[4]
+    result        = function(*args)
+    timings[name] = defs.now_utc()[4] - stime
+    return result
+
+# Run preload steps, every step starts as soon as the steps it depends on are done. Steps are
+# {name: (depends, function)}, function gets the results of all steps done so far. Returns results.
+def run_steps(steps, timings):
+
+    # Initialize variables
+    results = {}
+    running = {}
+    waiting = dict(steps)
+
+    # Run steps in threads with the config and context of the symbol
+    with ThreadPoolExecutor(max_workers=max(1, config.preload_workers)) as executor:
+        while waiting or running:
+
+            # Start every step that can run
+            for name, (depends, function) in list(waiting.items()):
+                if all(depend in results for depend in depends):
+                    running[executor.submit(loader.bind(timed), timings, name, function, dict(results))] = name
+                    del waiting[name]
+
+            # Steps can not run, their dependencies do not exist
+            if not running:
+                raise ValueError(f"Preload steps {', '.join(waiting)} depend on unknown steps")
+
+            # Wait for a step to finish
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    # Return results
+    return results
+
 # Preload ticker
 def get_ticker():
 
@@ -49,11 +88,19 @@ def get_ticker():
     # Return ticker
     return ticker
 
-# Preload klines
-def get_klines(interval, limit):
+# Preload klines, served from the shared kline cache
+def get_klines(interval, limit, refresh=False):
+    return cache.get_klines(interval, limit, refresh)
+
+# Fetch klines from exchange
+def fetch_klines(interval, limit):
    
     # Debug
     debug = False
+
+    # More klines than one request allows are loaded from history
+    if limit > history.recent_limit:
+        return history.latest(interval, limit)
     
     # Initialize variables
     klines     = {}
@@ -120,23 +167,28 @@ def get_prices(interval, limit):
     # Return prices
     return prices
 
-# Combine two lists of prices
+# Combine two lists of prices, both sorted by time, prices_1 wins when times are equal
 def combine_prices(prices_1, prices_2):
     
-    # Combine and sort by 'time'
-    prices = sorted(zip(prices_1['time'] + prices_2['time'], prices_1['price'] + prices_2['price']))
-
-    # Use a dictionary to remove duplicates, keeping the first occurrence of each 'time'
-    unique_prices = {}
-    for t, p in prices:
-        if t not in unique_prices:
-            unique_prices[t] = p
-
-    # Separate into 'time' and 'price' lists
-    combined_prices = {
-        'time': list(unique_prices.keys()),
-        'price': list(unique_prices.values())
-    }
+    # Initialize variables
+    combined_prices = {'time': [], 'price': []}
+    times_1, values_1 = prices_1['time'], prices_1['price']
+    times_2, values_2 = prices_2['time'], prices_2['price']
+    i, j = 0, 0
+
+    # Merge both lists in one pass and skip duplicate times
+    while i < len(times_1) or j < len(times_2):
+        if j >= len(times_2) or (i < len(times_1) and times_1[i] <= times_2[j]):
+            time, price = times_1[i], values_1[i]
+            if j < len(times_2) and times_2[j] == time:
+                j = j + 1
+            i = i + 1
+        else:
+            time, price = times_2[j], values_2[j]
+            j = j + 1
+        if not combined_prices['time'] or combined_prices['time'][-1] != time:
+            combined_prices['time'].append(time)
+            combined_prices['price'].append(price)
     
     # Return combined list
     return combined_prices
@@ -249,6 +301,15 @@ def check_files():
     create_file(config.error_file)                      # Errors log file
     create_file(config.exchange_file)                   # Exchange log file
     create_file(config.revenue_file, revenue_header)    # Revenue log file
+
+    # Register log files, the header is written again after every rotation
+    logwriter.register(config.error_file)
+    logwriter.register(config.exchange_file)
+    logwriter.register(config.revenue_file, revenue_header, config.revenue_rotate)
+
+    # Build the revenue store from the revenue log on first use
+    if config.revenue_store and not ledger.exists():
+        ledger.rebuild(config.revenue_file)
     
     defs.announce("All folders and files checked")
     
@@ -0,0 +1,178 @@
+### Sunflow Cryptobot ###
+#
+# Sampling profiler started while Sunflow runs, shows where the time goes without editing speed flags into the source
+#
+# The stack of the main thread, that runs the event loop and all handlers, is sampled for some seconds. Collapsed
+# stacks for flamegraphs (flamegraph.pl, speedscope) and a table of the top functions are written to the data folder.
+# Start profiling with a signal or by creating the request file, that may hold the number of seconds:
+#
+#   kill -USR1 {pid of sunflow}
+#   echo 60 > {data folder}profile.request
+
+# Load external libraries
+from collections import Counter
+from loader import load_config
+import os, signal, sys, threading, time
+
+# Load internal libraries
+import defs
+
+# Load config
+config = load_config()
+
+# Initialize variables
+lock    = threading.Lock()
+session = {'thread': None}
+
+# Create profile state of a symbol
+def new_state(config):
+
+    # Initialize profile
+    profile          = {}
+    profile['file']  = config.data_suffix + "profile.request"    # Create this file to start profiling
+    profile['time']  = defs.now_utc()[4]                          # Time of last check
+    profile['delay'] = config.profile_check                       # Time in ms between checks, 0 is disabled
+
+    # Return state
+    return profile
+
+# Start profiling the main thread in the background, returns False when already profiling
+def start(seconds=0):
+
+    # Initialize variables
+    seconds = seconds or config.profile_seconds
+    prefix  = config.data_suffix + "profile_" + time.strftime("%Y%m%d_%H%M%S")
+    options = (threading.main_thread().ident, seconds, config.profile_interval / 1000, prefix, config.profile_top)
+
+    # Only one profile at a time
+    with lock:
+        if session['thread'] is not None and session['thread'].is_alive():
+            defs.announce("*** Warning: Profiler is already running ***")
+            return False
+        session['thread'] = threading.Thread(target=run, args=options, name="profiler", daemon=True)
+        session['thread'].start()
+
+    # Report to stdout
+    defs.announce(f"Profiling for {seconds} seconds, sampling every {config.profile_interval} ms")
+
+    # Return
+    return True
+
+# Start profiling on SIGUSR1, not available on Windows. The event loop runs start after the signal handler returned,
+# a plain signal handler could interrupt start while it holds the lock
+def install(loop):
+    if hasattr(signal, "SIGUSR1"):
+        loop.add_signal_handler(signal.SIGUSR1, start)
+
+# Start profiling when the request file exists, runs as a task of a symbol
+def check(ctx, current_time):
+
+    # Initialize variables
+    ctx.profile['time'] = current_time
+    seconds             = 0
+
+    # Nothing requested
+    if not os.path.exists(ctx.profile['file']):
+        return
+
+    # Number of seconds is optional
+    try:
+        with open(ctx.profile['file'], 'r', encoding='utf-8') as file:
+            seconds = int(file.read().strip() or 0)
+    except (OSError, ValueError):
+        seconds = 0
+
+    # Remove request and start
+    try:
+        os.remove(ctx.profile['file'])
+    except OSError as e:
+        defs.log_error(f"*** Warning: Failed to remove profile request {ctx.profile['file']}: {e} ***")
+        return
+    start(seconds)
+
+    # Return
+    return
+
+# Collapsed stack of a frame, outermost function first
+def stack(frame):
+
+    # Initialize variables
+    names = []
+
+    # Every function, by name, file and first line so functions with the same name stay apart
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+
+    # Return stack
+    return ";".join(reversed(names))
+
+# Sample the stack of a thread, runs in the profiler thread
+def run(thread_id, seconds, interval, prefix, number):
+
+    # Initialize variables
+    counts = Counter()
+    stime  = time.monotonic()
+
+    # Take samples, a missing thread has ended. Long running functions are sampled when the main thread hands over
+    # the interpreter lock, every 5 ms by default (sys.setswitchinterval)
+    while time.monotonic() - stime < seconds:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        counts[stack(frame)] += 1
+        frame = None
+        time.sleep(interval)
+
+    # Write results
+    try:
+        write(counts, time.monotonic() - stime, interval, prefix, number)
+    except OSError as e:
+        defs.log_error(f"*** Warning: Failed to write profile {prefix}: {e} ***")
+        return
+
+    # Report to stdout
+    defs.announce(f"Profiled {sum(counts.values())} samples, written to {prefix}.folded and {prefix}.txt")
+
+    # Return
+    return
+
+# Samples per function, where the function itself was running and where it was on the stack
+def functions(counts):
+
+    # Initialize variables
+    own   = Counter()
+    total = Counter()
+
+    # Last function of a stack was running, recursive functions are counted once per sample
+    for key, count in counts.items():
+        names = key.split(";")
+        own[names[-1]] += count
+        for name in set(names):
+            total[name] += count
+
+    # Return samples
+    return own, total
+
+# Write collapsed stacks and top functions
+def write(counts, seconds, interval, prefix, number):
+
+    # Initialize variables
+    samples    = sum(counts.values()) or 1
+    own, total = functions(counts)
+
+    # Collapsed stacks, one stack and its number of samples per line
+    with open(prefix + ".folded", 'w', encoding='utf-8') as file:
+        for key, count in counts.most_common():
+            file.write(f"{key} {count}\n")
+
+    # Top functions by samples of their own, waiting for messages shows as select of the event loop
+    with open(prefix + ".txt", 'w', encoding='utf-8') as file:
+        file.write(f"Profile of {sum(counts.values())} samples every {interval * 1000:g} ms over {seconds:.1f} seconds\n\n")
+        file.write(f"{'Own':>8}{'Own %':>8}{'Total':>8}{'Total %':>9}  Function\n")
+        for name, count in own.most_common(number):
+            file.write(f"{count:>8}{count / samples * 100:>7.1f}%{total[name]:>8}{total[name] / samples * 100:>8.1f}%  {name}\n")
+
+    # Return
+    return
@@ -0,0 +1,131 @@
+### Sunflow Cryptobot ###
+#
+# Reload strategy settings from the config file while Sunflow runs, no restart and warm-up needed
+
+# Load external libraries
+import os, runpy
+
+# Load internal libraries
+import defs
+
+# Settings that can change while running and the state of the symbol they are applied to
+settings = {
+    'profit'             : [('profit',), ('optimizer', 'profit')],
+    'wave_distance'      : [('active_order', 'distance'), ('optimizer', 'distance')],
+    'spread_distance'    : [('use_spread', 'distance'), ('optimizer', 'spread')],
+    'indicators_minimum' : [('use_indicators', 'minimum')],
+    'indicators_maximum' : [('use_indicators', 'maximum')],
+    'orderbook_bandwith' : [('use_orderbook', 'depth')],
+    'orderbook_minimum'  : [('use_orderbook', 'minimum')],
+    'orderbook_maximum'  : [('use_orderbook', 'maximum')],
+    'orderbook_window'   : [('use_orderbook', 'window')],
+    'orderbook_timeframe': [('use_orderbook', 'timeframe')],
+    'trade_minimum'      : [('use_trade', 'minimum')],
+    'trade_maximum'      : [('use_trade', 'maximum')],
+    'optimizer_adj_min'  : [('optimizer', 'adj_min')],
+    'optimizer_adj_max'  : [('optimizer', 'adj_max')],
+    'optimizer_scaler'   : [('optimizer', 'scaler')],
+}
+
+# Settings that must stay in order
+ranges = [('indicators_minimum', 'indicators_maximum'), ('orderbook_minimum', 'orderbook_maximum'), ('trade_minimum', 'trade_maximum'), ('optimizer_adj_min', 'optimizer_adj_max')]
+
+# Create reload state of a symbol
+def new_state(config):
+
+    # Initialize reload
+    reload          = {}
+    reload['file']  = config.__file__                 # Config file of the symbol
+    reload['stamp'] = stamp(config.__file__)          # Modification time and size when last loaded
+    reload['time']  = defs.now_utc()[4]               # Time of last check
+    reload['delay'] = config.config_reload            # Time in ms between checks, 0 is disabled
+
+    # Return state
+    return reload
+
+# Modification time and size of a file
+def stamp(filename):
+    try:
+        status = os.stat(filename)
+    except OSError:
+        return None
+    return status.st_mtime_ns, status.st_size
+
+# Check new settings, returns a list of errors
+def validate(changes, values):
+
+    # Initialize variables
+    errors = []
+
+    # Numbers stay numbers, a boolean is not a number
+    for name, (old, new) in changes.items():
+        if isinstance(new, bool) or not isinstance(new, (int, float)):
+            errors.append(f"{name} must be a number, not {new!r}")
+        elif new < 0:
+            errors.append(f"{name} can not be negative")
+
+    # Minimum can not be larger than maximum
+    for minimum, maximum in ranges:
+        if (minimum in changes or maximum in changes) and not errors and values[minimum] > values[maximum]:
+            errors.append(f"{minimum} {values[minimum]} is larger than {maximum} {values[maximum]}")
+
+    # Return errors
+    return errors
+
+# Apply a setting to the state of a symbol
+def apply(ctx, name, value):
+    for path in settings[name]:
+        if len(path) == 1:
+            setattr(ctx, path[0], value)
+        else:
+            getattr(ctx, path[0])[path[1]] = value
+
+# Check config file of a symbol and apply changed settings, runs on the event loop between two messages
+def check(ctx, current_time):
+
+    # Initialize variables
+    reload          = ctx.reload
+    reload['time']  = current_time
+    changes         = {}
+    ignored         = []
+
+    # Config file did not change
+    new_stamp = stamp(reload['file'])
+    if new_stamp is None or new_stamp == reload['stamp']:
+        return
+    reload['stamp'] = new_stamp
+
+    # Load config file, it may be half written or contain errors
+    try:
+        values = runpy.run_path(reload['file'])
+    except Exception as e:
+        defs.log_error(f"*** Warning: Config file {reload['file']} changed but can not be loaded, nothing changed: {e} ***")
+        return
+
+    # Find changed settings
+    for name, value in values.items():
+        if name.startswith("_") or not hasattr(ctx.config, name) or getattr(ctx.config, name) == value:
+            continue
+        if name in settings:
+            changes[name] = (getattr(ctx.config, name), value)
+        elif not callable(value):
+            ignored.append(name)
+    if ignored:
+        defs.announce(f"*** Warning: Changed {', '.join(ignored)} in config file, restart Sunflow to apply ***")
+    if not changes:
+        return
+
+    # Validate all settings before changing any
+    errors = validate(changes, {name: values.get(name, getattr(ctx.config, name)) for name in settings})
+    if errors:
+        defs.log_error(f"*** Warning: Config file {reload['file']} changed but nothing was applied: {'; '.join(errors)} ***")
+        return
+
+    # Apply all settings at once, no message is handled meanwhile
+    for name, (old, new) in changes.items():
+        setattr(ctx.config, name, new)
+        apply(ctx, name, new)
+        defs.announce(f"Reloaded {name} from {old} to {new}")
+
+    # Return
+    return
@@ -0,0 +1,88 @@
+### Sunflow Cryptobot ###
+#
+# Performance runtime, uvloop event loop and websocket settings tuned for high message rates
+
+# Load external libraries
+from okx.websocket.WebSocketFactory import WebSocketFactory
+from okx.websocket.WsPublicAsync import WsPublicAsync
+import asyncio, certifi, socket, ssl, websockets
+
+# Load internal libraries
+from loader import load_config
+import defs
+
+# Load config
+config = load_config()
+
+# Websocket factory with tuned settings, also connects to local websockets without TLS
+class TunedFactory(WebSocketFactory):
+
+    # Initialize factory, with the default websocket settings when not tuned
+    def __init__(self, url, tuned=True):
+        super().__init__(url)
+        self.tuned = tuned
+
+    # Connect with tuned settings
+    async def connect(self):
+
+        # Initialize variables
+        options = {}
+
+        # Verify certificates like the default factory, local websockets like the load benchmark have no TLS
+        if self.url.startswith("wss://"):
+            options['ssl'] = ssl.create_default_context()
+            options['ssl'].load_verify_locations(certifi.where())
+
+        # Tuned settings
+        if self.tuned:
+            options['max_size']      = config.runtime_max_size
+            options['max_queue']     = config.runtime_max_queue
+            options['compression']   = "deflate" if config.runtime_compression else None
+            options['ping_interval'] = config.runtime_ping_interval
+            options['ping_timeout']  = config.runtime_ping_timeout
+
+        # Connect
+        try:
+            self.websocket = await websockets.connect(self.url, **options)
+        except Exception as e:
+            defs.log_error(f"*** Warning: Failed to connect to websocket {self.url}: {e} ***")
+            return None
+
+        # Send small frames right away, asyncio and uvloop already do this but not every platform does
+        sock = self.websocket.transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # Return websocket
+        return self.websocket
+
+# Create websocket connection, tuned when the performance runtime is enabled
+def new_websocket(url):
+
+    # Initialize websocket
+    ws = WsPublicAsync(url)
+
+    # Replace factory, the default factory can not connect without TLS
+    if config.runtime_enabled or url.startswith("ws://"):
+        ws.factory = TunedFactory(url, config.runtime_enabled)
+
+    # Return websocket
+    return ws
+
+# Run the main coroutine, on uvloop when the performance runtime is enabled and uvloop is installed
+def run(main):
+
+    # Default event loop
+    if not config.runtime_enabled:
+        return asyncio.run(main)
+
+    # Use uvloop when available
+    try:
+        import uvloop
+    except ImportError:
+        defs.announce("*** Warning: uvloop is not installed, using default event loop ***")
+        return asyncio.run(main)
+
+    # Run on uvloop
+    defs.announce("Performance runtime uses uvloop event loop")
+    return uvloop.run(main)
@@ -0,0 +1,218 @@
+### Sunflow Cryptobot ###
+#
+# Persistent kline and price cache on disk, one columnar file per symbol and interval
+
+# Load external libraries
+from loader import load_config
+import numpy as np
+import json, os, threading
+
+# Load internal libraries
+import cache, context, defs, history, loader
+
+# Load config
+config = load_config()
+
+# Columns of the files
+kline_dtype = np.dtype([('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'), ('close', 'f8'), ('volume', 'f8'), ('turnover', 'f8'), ('status', 'i1')])
+price_dtype = np.dtype([('time', 'i8'), ('price', 'f8')])
+
+# Create checkpoint state of a symbol
+def new_state():
+
+    # Initialize checkpoint
+    checkpoint_data            = {}
+    checkpoint_data['time']    = defs.now_utc()[4]    # Time of last checkpoint
+    checkpoint_data['running'] = False                # Checkpoint is being written in the background
+    checkpoint_data['saved']   = defs.now_utc()[4]    # Time the state of the bot was last saved
+
+    # Return state
+    return checkpoint_data
+
+# Filename of klines
+def kline_file(symbol, interval):
+    return config.data_suffix + f"cache_{symbol}_{interval}.npy"
+
+# Filename of prices, of another bot when its data suffix is given
+def price_file(symbol, suffix=None):
+    return (suffix or config.data_suffix) + f"cache_{symbol}_prices.npy"
+
+# Filename of the state of the bot, of another bot when its data suffix is given
+def state_file(suffix=None):
+    return (suffix or config.data_suffix) + "state.json"
+
+# Write array atomically, a crash never leaves a half written file
+def write(filename, array):
+    temp_file = filename + ".tmp"
+    with open(temp_file, 'wb') as file:
+        np.save(file, array)
+    os.replace(temp_file, filename)
+
+# Read array memory mapped, returns None if there is no valid file
+def read(filename, dtype):
+
+    # No file
+    if not os.path.exists(filename):
+        return None
+
+    # Load file
+    try:
+        array = np.load(filename, mmap_mode='r')
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to load cache file {filename}: {e} ***")
+        return None
+
+    # Check columns
+    if array.dtype != dtype:
+        defs.announce(f"*** Warning: Cache file {filename} has unknown format, ignored! ***")
+        return None
+
+    # Return array
+    return array
+
+# Load klines from disk
+def load_klines(symbol, interval):
+
+    # Initialize variables
+    klines = cache.empty()
+
+    # Load klines
+    array = read(kline_file(symbol, interval), kline_dtype)
+    if array is None:
+        return klines
+    for key in cache.keys:
+        klines[key] = array[key].tolist()
+
+    # Return klines
+    return klines
+
+# Load klines from disk and fill the gap up till now
+def get_klines(interval, limit):
+
+    # Initialize variables
+    klines = cache.empty()
+
+    # Load klines and fill the gap
+    klines = load_klines(config.symbol, interval)
+    if klines['time']:
+        klines = history.fill(interval, klines, limit)
+    if len(klines['time']) >= limit:
+        defs.announce(f"Loaded {limit} klines with {interval} interval from disk")
+
+    # Return klines
+    return klines
+
+# Load prices from disk and fill the gap up till the preloaded prices with closing prices of 1m klines
+def get_prices(prices, limit_max):
+
+    # Debug
+    debug = False
+
+    # Initialize variables
+    now    = defs.now_utc()[4]
+    stored = {'time': [], 'price': []}
+    gap    = {'time': [], 'price': []}
+
+    # Load prices, only within limit
+    array = read(price_file(config.symbol), price_dtype)
+    if array is None:
+        return stored
+    start = int(np.searchsorted(array['time'], now - limit_max))
+    stored['time']  = array['time'][start:].tolist()
+    stored['price'] = array['price'][start:].tolist()
+    if not stored['time']:
+        return stored
+
+    # Fill the gap between stored prices and the preloaded prices
+    if prices['time'] and prices['time'][0] - stored['time'][-1] > 60000:
+        klines = history.load('1m', stored['time'][-1] + 1, prices['time'][0] - 1)
+        gap    = {'time': klines['time'], 'price': klines['close']}
+
+    # Report to stdout
+    defs.announce(f"Loaded {len(stored['time'])} prices from disk and filled a gap of {len(gap['time'])} prices")
+
+    # Debug to stdout
+    if debug:
+        defs.announce(f"Debug: Prices on disk start at {stored['time'][0]} and end at {stored['time'][-1]}")
+
+    # Return prices
+    return {'time': stored['time'] + gap['time'], 'price': stored['price'] + gap['price']}
+
+# Write snapshot of klines and prices to disk, runs in a background thread
+def write_checkpoint(checkpoint_data, klines_all, prices):
+
+    # Initialize variables
+    stime = defs.now_utc()[4]
+
+    # Write files
+    try:
+        for (symbol, interval), klines in klines_all.items():
+            array = np.empty(len(klines['time']), dtype=kline_dtype)
+            for key in cache.keys:
+                array[key] = klines[key]
+            write(kline_file(symbol, interval), array)
+        if prices['time']:
+            array = np.empty(len(prices['time']), dtype=price_dtype)
+            array['time']  = prices['time']
+            array['price'] = prices['price']
+            write(price_file(config.symbol), array)
+        defs.announce(f"Checkpoint of {len(klines_all)} kline intervals and {len(prices['time'])} prices written to disk in {defs.now_utc()[4] - stime}ms")
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to write checkpoint: {e} ***")
+    finally:
+        checkpoint_data['running'] = False
+
+    # Return
+    return
+
+# Checkpoint klines and prices to disk
+def checkpoint(prices, wait=False):
+
+    # Get checkpoint state of symbol
+    checkpoint_data = context.current().storage
+
+    # Only one checkpoint at a time
+    if checkpoint_data['running']:
+        return
+    checkpoint_data['running'] = True
+    checkpoint_data['time']    = defs.now_utc()[4]
+
+    # Take snapshot of symbol, lists are copied so handlers can continue
+    klines_all = {key: {column: list(entry['klines'][column]) for column in cache.keys} for key, entry in context.current().cache['store'].items()}
+    snapshot   = {'time': list(prices['time']), 'price': list(prices['price'])}
+
+    # Write in the background, or wait when Sunflow terminates
+    thread = threading.Thread(target=loader.bind(write_checkpoint), args=(checkpoint_data, klines_all, snapshot), daemon=True)
+    thread.start()
+    if wait:
+        thread.join()
+
+    # Return
+    return
+
+# Save the state of the bot, so the fleet analyzer has instrument info and the last price without exchange access
+def save_state(ctx, current_time):
+
+    # Initialize variables
+    ctx.storage['saved'] = current_time
+    state = {'symbol': ctx.symbol, 'time': current_time, 'spot': ctx.spot, 'info': ctx.info, 'compounding': ctx.compounding}
+
+    # Write atomically, the fleet analyzer may read at any time
+    try:
+        temp_file = state_file() + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump(state, file, default=str)
+        os.replace(temp_file, state_file())
+    except OSError as e:
+        defs.log_error(f"*** Warning: Failed to save state: {e} ***")
+
+    # Return
+    return
+
+# Load the state of a bot, returns an empty state if there is none
+def load_state(suffix=None):
+    try:
+        with open(state_file(suffix), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
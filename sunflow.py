@@ -3,210 +3,34 @@
 # File that drives it all! 
 
 # Load external libraries
-from pathlib import Path
-import asyncio, argparse, contextlib, importlib, json, pprint, sys, time, traceback, websockets
-import pandas as pd
+import asyncio, contextlib, json, os, pprint, threading, time, traceback, websockets
 
 # Load internal libraries
-import database, defs, optimum, orders, preload, trailing
+from loader import load_config
+import broker, cache, context, database, defs, distance, gaps, ledger, loader, logwriter, notify, optimum, orders, preload, profiler, reloader, runtime, storage, tradeflow, trailing
 
-# Parse command line arguments
-parser = argparse.ArgumentParser(description="Run the Sunflow Cryptobot with a specified config.")
-parser.add_argument('-c', '--config', default='config.py', help='Specify the config file (with .py extension).')
-args = parser.parse_args()
+# Load config, always the config of the symbol being handled
+config = load_config()
 
-# Resolve config file path
-config_path = Path(args.config).resolve()
-if not config_path.exists():
-    print(f"Config file not found at {config_path}, aborting...\n")
-    sys.exit()
 
-# Dynamically load the config module
-sys.path.append(str(config_path.parent))
-config_module_name = config_path.stem
-config = importlib.import_module(config_module_name)
+### Initialize variables ###
 
+# Contexts of all symbols, one config file per symbol
+contexts = {}
+for symbol_config in loader.load_configs():
+    contexts[symbol_config.symbol] = context.Context(symbol_config)
 
-### Initialize variables ###
+# Errors outside the handling of a symbol are registered on the first symbol
+context.default['context'] = next(iter(contexts.values()))
 
-# Debug
-debug                                = config.debug                                # Debug
-
-# Set default values
-symbol                               = config.symbol                               # Symbol bot used for trading
-info                                 = {}                                          # Instrument info on symbol
-spot                                 = 0                                           # Spot price, always equal to lastPrice
-ticker                               = {}                                          # Ticker data, including lastPrice and time
-profit                               = config.profit                               # Minimum profit percentage
-multiplier                           = config.multiplier                           # Multiply minimum order quantity by this
-prices                               = {}                                          # Last prices based on ticker data
-timestamp                            = defs.now_utc()[4]                           # Get the current time
-
-# Minimum spread between historical buy orders
-use_spread                           = {}                                          # Spread
-use_spread['enabled']                = config.spread_enabled                       # Use spread as buy trigger
-use_spread['distance']               = config.spread_distance                      # Minimum spread in percentages
-
-# Technical
-use_indicators                       = {}                                          # Technical indicators
-use_indicators['enabled']            = config.indicators_enabled                   # Use technical indicators as buy trigger
-use_indicators['minimum']            = config.indicators_minimum                   # Minimum advice value
-use_indicators['maximum']            = config.indicators_maximum                   # Maximum advice value
-use_indicators['klines']             = {}                                          # Klines for symbol
-use_indicators['limit']              = config.indicators_limit                     # Number of klines
-use_indicators['average']            = config.indicators_average                   # Calculate average of all active intervales
-use_indicators['intervals']           = {}                                         # Klines intervals
-use_indicators['intervals'][0]        = 0                                          # Average of all active intervals
-use_indicators['intervals'][1]        = config.indicators_interval_1               # Klines timeframe interval 1
-use_indicators['intervals'][2]        = config.indicators_interval_2               # Klines timeframe interval 2
-use_indicators['intervals'][3]        = config.indicators_interval_3               # Klines timeframe interval 3
-
-# Orderbook
-use_orderbook                        = {}                                          # Orderbook
-use_orderbook['enabled']             = config.orderbook_enabled                    # Use orderbook as buy trigger
-use_orderbook['depth']               = config.orderbook_bandwith                   # Depth bandwith in percentages used to calculate market depth from orderbook
-use_orderbook['window']              = config.orderbook_window                     # Rolling window orderbook data
-use_orderbook['minimum']             = config.orderbook_minimum                    # Minimum orderbook buy percentage
-use_orderbook['maximum']             = config.orderbook_maximum                    # Maximum orderbook buy percentage
-use_orderbook['average']             = config.orderbook_average                    # Average out orderbook depth data or use last data point
-use_orderbook['limit']               = config.orderbook_limit                      # Number of orderbook data elements to keep in database
-use_orderbook['timeframe']           = config.orderbook_timeframe                  # Timeframe for averaging out
-depth_data                           = {'time': [], 'buy_perc': [], 'sell_perc': []}
-
-# Trade
-use_trade                            = {}
-use_trade['enabled']                 = config.trade_enabled                        # Use realtime trades as buy trigger
-use_trade['minimum']                 = config.trade_minimum                        # Minimum trade buy ratio percentage
-use_trade['maximum']                 = config.trade_maximum                        # Maximum trade buy ratio percentage
-use_trade['limit']                   = config.trade_limit                          # Number of trade orders to keep in database
-use_trade['timeframe']               = config.trade_timeframe                      # Timeframe in ms to collect realtime trades
-trades                               = {'time': [], 'side': [], 'size': [], 'price': []}
-
-# Optimize profit and trigger price distance
-optimizer                            = {}                                          # Profit and trigger price distance optimizer
-optimizer['enabled']                 = config.optimizer_enabled                    # Try to optimize the minimum profit and distance percentage
-optimizer['spread_enabled']          = config.optimizer_spread                     # If optimizer is active, also optimize spread
-optimizer['sides']                   = config.optimizer_sides                      # If optimizer is active, optimize both buy and sell, or only sell
-optimizer['method']                  = config.optimizer_method                     # Method used to optimize distance, profit and / or spread
-optimizer['profit']                  = config.profit                               # Initial profit percentage when Sunflow started, will never change
-optimizer['distance']                = config.wave_distance                        # Initial trigger price distance percentage when Sunflow started, will never change
-optimizer['spread']                  = config.spread_distance                      # Initial minimum spread in percentages when Sunflow started, will never change
-optimizer['interval']                = config.optimizer_interval                   # Interval used for indicator KPI
-optimizer['delta']                   = config.optimizer_delta                      # Delta used for indicator KPI
-optimizer['limit_min']               = config.optimizer_limit_min                  # Minimum miliseconds of spot price data
-optimizer['limit_max']               = config.optimizer_limit_max                  # Maximum miliseconds of spot price data
-optimizer['adj_min']                 = config.optimizer_adj_min                    # Minimum adjustment
-optimizer['adj_max']                 = config.optimizer_adj_max                    # Maximum adjustment
-optimizer['scaler']                  = config.optimizer_scaler                     # Scales the final optimizer value by multiplying by this value
-optimizer['df']                      = pd.DataFrame()                              # Dataframe is empty at start
-
-# Price limits
-use_pricelimit                       = {}                                          # Use pricelimits to prevent buy or sell
-use_pricelimit['enabled']            = config.pricelimit_enabled                   # Set pricelimits functionality
-use_pricelimit['max_buy_enabled']    = False                                       # Set pricelimits maximum buy price toggle  
-use_pricelimit['min_sell_enabled']   = False                                       # Set pricelimits minimum sell price toggle
-use_pricelimit['max_sell_enabled']   = False                                       # Set pricelimits maximum sell price toggle
-use_pricelimit['min_buy']            = config.pricelimit_min_buy                   # Minimum buy price 
-use_pricelimit['max_buy']            = config.pricelimit_max_buy                   # Maximum buy price 
-use_pricelimit['min_sell']           = config.pricelimit_min_sell                  # Minimum sell price
-use_pricelimit['max_sell']           = config.pricelimit_max_sell                  # Maximum sell price
-if config.pricelimit_min_buy > 0     : use_pricelimit['min_buy_enabled'] = True    # Minimum buy price enabled
-if config.pricelimit_max_buy > 0     : use_pricelimit['max_buy_enabled'] = True    # Maximum buy price enabled
-if config.pricelimit_min_sell > 0    : use_pricelimit['min_sell_enabled'] = True   # Minimum sell price enabled
-if config.pricelimit_max_sell > 0    : use_pricelimit['max_sell_enabled'] = True   # Maximum sell price enabled
-
-# Trailing order
-active_order                         = {}                                          # Trailing order data
-active_order['side']                 = ""                                          # Trailing Buy or Sell
-active_order['active']               = False                                       # Trailing order active or not
-active_order['start']                = 0                                           # Start price when trailing order began     
-active_order['previous']             = 0                                           # Previous price
-active_order['current']              = 0                                           # Current price
-active_order['created']              = 0                                           # Create timestamp in ms
-active_order['updated']              = 0                                           # Update timestamp in ms
-active_order['wiggle']               = config.wave_wiggle                          # Method to use to calculate trigger price distance
-active_order['distance']             = config.wave_distance                        # Default trigger price distance percentage
-active_order['wave']                 = config.wave_distance                        # Calculated trigger price distance percentage
-active_order['fluctuation']          = config.wave_distance                        # Applied trigger price distance percentage
-active_order['last']                 = config.wave_distance                        # Last applied trigger price distance percentage
-active_order['orderid']              = ""                                          # Order ID
-active_order['linkedid']             = ""                                          # Linked SL order ID
-active_order['trigger']              = 0                                           # Trigger price for order
-active_order['trigger_new']          = 0                                           # New trigger price when trailing 
-active_order['trigger_ini']          = 0                                           # Initial trigger price when trailing
-active_order['qty']                  = 0                                           # Order quantity
-active_order['qty_new']              = 0                                           # New order quantity when trailing
-
-# Databases for buy and sell orders
-all_buys                             = {}                                          # All buys retreived from database file buy orders
-all_sells                            = {}                                          # Sell order linked to database with all buys orders
-
-# Websockets to use
-ws_kline                             = False                                       # Initialize ws_kline
-ws_orderbook                         = False                                       # Initialize ws_orderbook
-ws_trade                             = False                                       # Initialize ws_trade
-if config.indicators_enabled         : ws_kline     = True                         # Use klines websocket
-if config.orderbook_enabled          : ws_orderbook = True                         # Use orderbook websocket
-if config.trade_enabled              : ws_trade     = True                         # Use trade websocker
-
-# Initialize indicators advice variable
-indicators_advice    = {}
-indicators_advice[0] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Average advice of all active intervals
-indicators_advice[1] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 1
-indicators_advice[2] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 2
-indicators_advice[3] = {'result': False, 'value': 0, 'level': 'Neutral', 'filled': False}   # Advice for interval 3
-
-# Initialize orderbook advice variable
-orderbook_advice                     = {}
-orderbook_advice['buy_perc']         = 0
-orderbook_advice['sell_perc']        = 0
-orderbook_advice['result']           = False
-
-# Initialize trade advice variable
-trade_advice                         = {}
-trade_advice['buy_ratio']            = 0
-trade_advice['sell_ratio']           = 0
-trade_advice['result']               = False
-
-# Initialize pricelimit advice variable
-pricelimit_advice                    = {}
-pricelimit_advice['buy_result']      = False
-pricelimit_advice['sell_result']     = False
-
-# Compounding
-compounding                          = {}
-compounding['enabled']               = config.compounding_enabled
-compounding['start']                 = config.compounding_start
-compounding['now']                   = config.compounding_start
-
-# Locking handle_ticker function to prevent race conditions
-lock_ticker                          = {}
-lock_ticker['time']                  = timestamp
-lock_ticker['delay']                 = 5000
-lock_ticker['enabled']               = False
-
-# Uptime ping
-uptime_ping                          = {}
-uptime_ping['time']                  = timestamp
-uptime_ping['record']                = timestamp
-uptime_ping['delay']                 = config.uptime_delay                         # 10 seconds
-uptime_ping['expire']                = config.uptime_expire                        # 1 hour
-uptime_ping['enabled']               = True
-
-# Periodic tasks
-periodic                             = {}
-periodic['time']                     = timestamp
-periodic['delay']                    = 3600000                                     # 1 hour
-periodic['enabled']                  = True
-
-# Channel handlers
-channel_handlers                     = {}
+# Connect to supervisor when running as one of its workers
+supervisor = broker.connect()
 
 
 ### Functions ###
 
 # Handle messages to keep tickers up to date
-def handle_ticker(message):
+def handle_ticker(ctx, message):
     
     # Debug and speed
     debug = False
@@ -216,16 +40,13 @@ def handle_ticker(message):
     # Errors are not reported within websocket
     try:
    
-        # Declare some variables global
-        global spot, ticker, profit, active_order, all_buys, all_sells, prices, indicators_advice, lock_ticker, use_spread, optimizer, compounding, uptime_ping, info
-
         # Initialize variables
-        ticker              = {}
-        result              = ()
-        error_code          = 0
-        error_msg           = ""
-        current_time        = defs.now_utc()[4]
-        lock_ticker['time'] = current_time
+        ctx.ticker              = {}
+        result                  = ()
+        error_code              = 0
+        error_msg               = ""
+        current_time            = defs.now_utc()[4]
+        ctx.lock_ticker['time'] = current_time
         
         # Show raw incoming message
         if debug:
@@ -234,98 +55,95 @@ def handle_ticker(message):
             print()
         
         # Decode message and get the latest ticker
-        ticker['time']          = int(message['data'][0]['ts'])
-        ticker['lastPrice']     = float(message['data'][0]['last'])
-        active_order['current'] = ticker['lastPrice']
+        ctx.ticker['time']          = int(message['data'][0]['ts'])
+        ctx.ticker['lastPrice']     = float(message['data'][0]['last'])
+        ctx.active_order['current'] = ctx.ticker['lastPrice']
 
         # Popup new price
-        prices['time'].append(ticker['time'])
-        prices['price'].append(ticker['lastPrice'])
+        ctx.prices['time'].append(ctx.ticker['time'])
+        ctx.prices['price'].append(ctx.ticker['lastPrice'])
         
         # Remove last price if necessary
-        if current_time - prices['time'][0] > optimizer['limit_max']:
-            prices['time'].pop(0)
-            prices['price'].pop(0)
+        if current_time - ctx.prices['time'][0] > ctx.optimizer['limit_max']:
+            ctx.prices['time'].pop(0)
+            ctx.prices['price'].pop(0)
 
         # Show incoming message
         if debug:
-            defs.announce(f"Debug: *** Incoming ticker with price {ticker['lastPrice']} {info['quoteCoin']} at {ticker['time']} ms ***")
+            defs.announce(f"Debug: *** Incoming ticker with price {ctx.ticker['lastPrice']} {ctx.info['quoteCoin']} at {ctx.ticker['time']} ms ***")
 
-        # Prevent race conditions
-        if lock_ticker['enabled']:
-            spot = ticker['lastPrice']
+        # Prevent race conditions, a newer ticker is already waiting
+        if any(item[0] is handle_ticker for item in ctx.lock_ticker['pending']):
+            ctx.spot = ctx.ticker['lastPrice']
             defs.announce("Function is busy, Sunflow will catch up with next tick")
             if speed: defs.announce(defs.report_exec(stime, "function busy"))
             return
-        
-        # Lock handle_ticker function
-        lock_ticker['enabled'] = True
 
         # Run trailing on every tick regardless of price change
-        if active_order['active']:
-            result       = trailing.trail(ticker['lastPrice'], compounding, active_order, info, all_buys, all_sells, prices)
-            active_order = result[0]
-            all_buys     = result[1]
-            compounding  = result[2]
-            info         = result[3]
+        if ctx.active_order['active']:
+            result           = trailing.trail(ctx.ticker['lastPrice'], ctx.compounding, ctx.active_order, ctx.info, ctx.all_buys, ctx.all_sells, ctx.prices)
+            ctx.active_order = result[0]
+            ctx.all_buys     = result[1]
+            ctx.compounding  = result[2]
+            ctx.info         = result[3]
         
         # Has price changed, then run all kinds of actions
-        if spot != ticker['lastPrice']:
+        if ctx.spot != ctx.ticker['lastPrice']:
 
             # Store new spot price
-            new_spot = ticker['lastPrice']
+            new_spot = ctx.ticker['lastPrice']
 
             # Reset uptime notice
-            uptime_ping['time']   = current_time
-            uptime_ping['record'] = current_time
+            ctx.uptime_ping['time']   = current_time
+            ctx.uptime_ping['record'] = current_time
 
             # Optimize profit and distance percentages
-            if optimizer['enabled']:
-                result       = optimum.optimize(prices, profit, active_order, use_spread, optimizer)
-                profit       = result[0]
-                active_order = result[1]
-                use_spread   = result[2]
-                optimizer    = result[3]
+            if ctx.optimizer['enabled']:
+                result           = optimum.optimize(ctx.prices, ctx.profit, ctx.active_order, ctx.use_spread, ctx.optimizer)
+                ctx.profit       = result[0]
+                ctx.active_order = result[1]
+                ctx.use_spread   = result[2]
+                ctx.optimizer    = result[3]
 
             # Check if and how much we can sell
-            result                  = orders.check_sell(new_spot, profit, active_order, all_buys, use_pricelimit, pricelimit_advice, info)
-            all_sells_new           = result[0]
-            active_order['qty_new'] = result[1]
-            can_sell                = result[2]
-            rise_to                 = result[3]
+            result                      = orders.check_sell(new_spot, ctx.profit, ctx.active_order, ctx.all_buys, ctx.use_pricelimit, ctx.pricelimit_advice, ctx.info)
+            all_sells_new               = result[0]
+            ctx.active_order['qty_new'] = result[1]
+            can_sell                    = result[2]
+            rise_to                     = result[3]
 
             # Report to stdout "Price went up/down from ..."
-            message = defs.report_ticker(spot, new_spot, rise_to, active_order, all_buys, info)
+            message = defs.report_ticker(ctx.spot, new_spot, rise_to, ctx.active_order, ctx.all_buys, ctx.info)
             defs.announce(message)
             
             # If trailing buy is already running while we can sell
-            if active_order['active'] and active_order['side'] == "Buy" and can_sell:
+            if ctx.active_order['active'] and ctx.active_order['side'] == "Buy" and can_sell:
                 
                 # Report to stdout
                 defs.announce("*** Warning: Buying while selling is possible, trying to cancel buy order! ***")
                 
                 # Cancel trailing buy, remove from all_buys database
-                active_order['active'] = False
-                result     = orders.cancel_order(active_order['orderid'])
-                response   = result[0]
-                error_code = result[1]
-                error_msg  = result[2]
+                ctx.active_order['active'] = False
+                result                     = orders.cancel_order(ctx.active_order['orderid'])
+                response                   = result[0]
+                error_code                 = result[1]
+                error_msg                  = result[2]
 
                 # Check if cancel order was OK                
                 if error_code == 0:
 
                     # Situation normal, just remove the order
                     defs.announce("Buy order cancelled successfully")
-                    all_buys = database.remove_buy(active_order['orderid'], all_buys, info)
+                    ctx.all_buys = database.remove_buy(ctx.active_order['orderid'], ctx.all_buys, ctx.info)
 
                 elif error_code == 51503:
 
                     # Trailing buy was bought (51503 = Your order has already been filled or canceled)
                     defs.announce("Buy order could not be cancelled, closing trailing buy")
-                    result       = trailing.close_trail(active_order, all_buys, all_sells, spot, info)
-                    active_order = result[0]
-                    all_buys     = result[1]
-                    all_sells    = result[2]
+                    result           = trailing.close_trail(ctx.active_order, ctx.all_buys, ctx.all_sells, ctx.spot, ctx.info)
+                    ctx.active_order = result[0]
+                    ctx.all_buys     = result[1]
+                    ctx.all_sells    = result[2]
                     
                 else:
                     # Something went very wrong
@@ -333,30 +151,30 @@ def handle_ticker(message):
                     defs.log_error(message)
                 
             # Initiate sell
-            if not active_order['active'] and can_sell:
+            if not ctx.active_order['active'] and can_sell:
                 # There is no old quantity on first sell
-                active_order['qty'] = active_order['qty_new']
+                ctx.active_order['qty'] = ctx.active_order['qty_new']
                 # Fill all_sells for the first time
-                all_sells = all_sells_new                
+                ctx.all_sells = all_sells_new                
                 # Place the first sell order
-                active_order = orders.sell(new_spot, active_order, prices, info)
+                ctx.active_order = orders.sell(new_spot, ctx.active_order, ctx.prices, ctx.info)
               
             # Amend existing sell trailing order if required
-            if active_order['active'] and active_order['side'] == "Sell":
+            if ctx.active_order['active'] and ctx.active_order['side'] == "Sell":
 
                 # Only amend order if the quantity to be sold has changed and is below threshold
-                if (active_order['qty_new'] != active_order['qty']) and (active_order['qty_new'] >= info['minOrderQty']):
+                if (ctx.active_order['qty_new'] != ctx.active_order['qty']) and (ctx.active_order['qty_new'] >= ctx.info['minOrderQty']):
 
                     # Amend order quantity
-                    result        = trailing.adjust_qty(active_order, all_buys, all_sells, all_sells_new, compounding, spot, info)
-                    active_order  = result[0]
-                    all_sells     = result[1]
-                    all_sells_new = result[2]
-                    compounding   = result[3]
+                    result           = trailing.adjust_qty(ctx.active_order, ctx.all_buys, ctx.all_sells, all_sells_new, ctx.compounding, ctx.spot, ctx.info)
+                    ctx.active_order = result[0]
+                    ctx.all_sells    = result[1]
+                    all_sells_new    = result[2]
+                    ctx.compounding  = result[3]
 
             # Work as a true gridbot when only spread is used
-            if use_spread['enabled'] and not use_indicators['enabled'] and not active_order['active']:
-                active_order = buy_matrix(new_spot, active_order, all_buys, 1)
+            if ctx.use_spread['enabled'] and not ctx.use_indicators['enabled'] and not ctx.active_order['active']:
+                ctx.active_order = buy_matrix(ctx, new_spot, ctx.active_order, ctx.all_buys, 1)
 
     # Report error
     except Exception as e:
@@ -366,9 +184,8 @@ def handle_ticker(message):
         line = frame_summary.lineno
         defs.log_error(f"*** Warning: Exception in {filename} on line {line}: {e} ***")
 
-    # Always set new spot price and unlock function
-    spot = ticker['lastPrice']
-    lock_ticker['enabled'] = False
+    # Always set new spot price
+    ctx.spot = ctx.ticker['lastPrice']
     
     # Report execution time
     if speed: defs.announce(defs.report_exec(stime))
@@ -376,8 +193,44 @@ def handle_ticker(message):
     # Close function
     return
 
+# Handle 1m klines to keep ATR up to date
+def handle_atr(message):
+
+    # Errors are not reported within websocket
+    try:
+
+        # Initialize variables
+        kline = {}
+
+        # Decode message and get the latest kline
+        row = message['data'][0]
+        kline['time']     =   int(row[0])
+        kline['open']     = float(row[1])
+        kline['high']     = float(row[2])
+        kline['low']      = float(row[3])
+        kline['close']    = float(row[4])
+        kline['volume']   = float(row[5])
+        kline['turnover'] = float(row[7])
+        kline['status']   =   int(row[8])
+
+        # Add kline to kline cache and ATR engine
+        gaps.check_kline('1m', kline)
+        cache.add_kline(kline, '1m')
+        distance.atr_kline(kline)
+
+    # Report error
+    except Exception as e:
+        tb_info = traceback.extract_tb(e.__traceback__)
+        frame_summary = tb_info[-1]
+        filename = frame_summary.filename
+        line = frame_summary.lineno
+        defs.log_error(f"*** Warning: Exception in {filename} on line {line}: {e} ***")
+
+    # Close function
+    return
+
 # Handle messages to keep klines up to date
-def handle_kline(message, interval_index):
+def handle_kline(ctx, message, interval_index):
 
     # Debug and speed
     debug = False
@@ -387,13 +240,10 @@ def handle_kline(message, interval_index):
     # Errors are not reported within websocket
     try:
 
-        # Declare some variables global
-        global use_indicators, indicators_advice, active_order, all_buys
-
         # Initialize variables
         kline    = {}
-        klines   = use_indicators['klines']
-        interval = use_indicators['intervals'][interval_index]
+        klines   = ctx.use_indicators['klines']
+        interval = ctx.use_indicators['intervals'][interval_index]
             
         # Show incoming message
         if debug: 
@@ -412,18 +262,17 @@ def handle_kline(message, interval_index):
         kline['turnover'] = float(row[7])
         kline['status']   =   int(row[8])
         
-        # Check if the number of klines and add in
-        klines_count = len(klines[interval_index]['close'])
-        if klines_count != use_indicators['limit']:
-            klines[interval_index] = preload.get_klines(interval, use_indicators['limit'])
-        klines[interval_index] = defs.add_kline(kline, klines[interval_index])
-        defs.announce(f"Added {interval} interval onto existing {klines_count} klines")
+        # Add kline to kline cache and get klines from cache
+        gaps.check_kline(interval, kline)
+        cache.add_kline(kline, interval)
+        klines[interval_index] = preload.get_klines(interval, ctx.use_indicators['limit'])
+        defs.announce(f"Added {interval} interval onto existing {len(klines[interval_index]['close'])} klines")
         
         # Run buy matrix
-        active_order = buy_matrix(spot, active_order, all_buys, interval_index)
+        ctx.active_order = buy_matrix(ctx, ctx.spot, ctx.active_order, ctx.all_buys, interval_index)
         
         # Re-assign variable
-        use_indicators['klines'] = klines
+        ctx.use_indicators['klines'] = klines
 
     # Report error
     except Exception as e:
@@ -440,26 +289,19 @@ def handle_kline(message, interval_index):
     return
 
 # Handle messages to keep orderbook up to date
-def handle_orderbook(message):
+def handle_orderbook(ctx, message):
 
     # Debug and speed
     debug_1 = False                        # Show orderbook
     debug_2 = False                        # Show buy and sell depth percentages
     speed   = False
     stime   = defs.now_utc()[4]
-    depth   = use_orderbook['depth']
-    window  = use_orderbook['window']
+    depth   = ctx.use_orderbook['depth']
+    window  = ctx.use_orderbook['window']
 
     # Errors are not reported within websocket
     try:
 
-        # Declare some variables global
-        global orderbook_advice, depth_data, orderbook_levels
-
-        # Rolling cache for last window of book levels, keyed by price per side
-        if 'orderbook_levels' not in globals():
-            orderbook_levels = {'bids': {}, 'asks': {}}
-
         # Initialize variables
         newest_timestamp        = 0
         total_buy_within_depth  = 0
@@ -471,7 +313,7 @@ def handle_orderbook(message):
             print(f"{message}\n")
 
         # Recalculate depth to numerical value
-        depthN = ((2 * depth) / 100.0) * spot
+        depthN = ((2 * depth) / 100.0) * ctx.spot
 
         # Decode message and get the latest orderbook
         data_items = message.get('data', [])
@@ -481,6 +323,15 @@ def handle_orderbook(message):
         # Update rolling cache with every price level from each book payload in this frame
         for book in data_items:
 
+            # Check sequence, resync with a new snapshot when updates were missed
+            usable, gap = gaps.check_book(book, message.get('action'))
+            if gap:
+                ctx.orderbook_levels['bids'].clear()
+                ctx.orderbook_levels['asks'].clear()
+                resync_channel(ctx, ctx.config.api_ch_orderbook, "public")
+            if not usable:
+                continue
+
             # Timestamp
             timestamp = int(book.get('ts'))
             if timestamp > newest_timestamp:
@@ -492,13 +343,13 @@ def handle_orderbook(message):
 
             # Update bids cache
             for lvl in bids:
-                price = float(lvl[0]); size = float(lvl[1])
-                orderbook_levels['bids'][price] = (size, timestamp)
+                price                               = float(lvl[0]); size = float(lvl[1])
+                ctx.orderbook_levels['bids'][price] = (size, timestamp)
 
             # Update asks cache
             for lvl in asks:
-                price = float(lvl[0]); size = float(lvl[1])
-                orderbook_levels['asks'][price] = (size, timestamp)
+                price                               = float(lvl[0]); size = float(lvl[1])
+                ctx.orderbook_levels['asks'][price] = (size, timestamp)
 
         # Purge anything older than window relative to newest exchange ts we saw
         if newest_timestamp == 0:
@@ -506,18 +357,18 @@ def handle_orderbook(message):
         cutoff = newest_timestamp - window
 
         for side in ('bids', 'asks'):
-            stale = [p for p, (_sz, ts) in orderbook_levels[side].items() if ts < cutoff]
+            stale = [p for p, (_sz, ts) in ctx.orderbook_levels[side].items() if ts < cutoff]
             for p in stale:
-                del orderbook_levels[side][p]
+                del ctx.orderbook_levels[side][p]
 
         # Buy side: (spot - depthN) .. spot
-        for price, (size, _ts) in orderbook_levels['bids'].items():
-            if (spot - depthN) <= price <= spot:
+        for price, (size, _ts) in ctx.orderbook_levels['bids'].items():
+            if (ctx.spot - depthN) <= price <= ctx.spot:
                 total_buy_within_depth += size
 
         # Sell side: spot .. (spot + depthN)
-        for price, (size, _ts) in orderbook_levels['asks'].items():
-            if spot <= price <= (spot + depthN):
+        for price, (size, _ts) in ctx.orderbook_levels['asks'].items():
+            if ctx.spot <= price <= (ctx.spot + depthN):
                 total_sell_within_depth += size
 
         # Calculate total quantity (buy + sell)
@@ -530,8 +381,8 @@ def handle_orderbook(message):
         # Check for sanity
         if buy_percentage == 0 or sell_percentage == 0:
             defs.log_error("*** Warning: Insufficient orderbook data, increase orderbook_window in config ***")
-            buy_percentage  = orderbook_advice['buy_perc']
-            sell_percentage = orderbook_advice['sell_perc']
+            buy_percentage  = ctx.orderbook_advice['buy_perc']
+            sell_percentage = ctx.orderbook_advice['sell_perc']
 
         # Output the stdout
         if debug_1:
@@ -540,10 +391,10 @@ def handle_orderbook(message):
             print("Orderbook")
             print("=========")
             print(f"Window            : {window} ms")
-            print(f"Spot price        : {spot}")
-            print(f"Window buy        : [{spot - depthN} .. {spot}]")
-            print(f"Window sell       : [{spot} .. {spot + depthN}]")
-            print(f"Levels cached     : {len(orderbook_levels['bids'])} bids, {len(orderbook_levels['asks'])} asks (≤ {window} ms old)\n")
+            print(f"Spot price        : {ctx.spot}")
+            print(f"Window buy        : [{ctx.spot - depthN} .. {ctx.spot}]")
+            print(f"Window sell       : [{ctx.spot} .. {ctx.spot + depthN}]")
+            print(f"Levels cached     : {len(ctx.orderbook_levels['bids'])} bids, {len(ctx.orderbook_levels['asks'])} asks (≤ {window} ms old)\n")
 
             print(f"Total buy quantity : {total_buy_within_depth}")
             print(f"Total sell quantity: {total_sell_within_depth}")
@@ -554,30 +405,30 @@ def handle_orderbook(message):
 
         # Announce message only if it changed and debug
         if debug_2:
-            if (buy_percentage != orderbook_advice['buy_perc']) or (sell_percentage != orderbook_advice['sell_perc']):
+            if (buy_percentage != ctx.orderbook_advice['buy_perc']) or (sell_percentage != ctx.orderbook_advice['sell_perc']):
                 message = f"Debug: Orderbook information (Buy / Sell | Depth): {buy_percentage:.2f} % / {sell_percentage:.2f} % | {depth} % "
                 defs.announce(message)
 
         # Popup new depth data
-        depth_data['time'].append(defs.now_utc()[4])
-        depth_data['buy_perc'].append(buy_percentage)
-        depth_data['sell_perc'].append(sell_percentage)
-        if len(depth_data['time']) > use_orderbook['limit']:
-            depth_data['time'].pop(0)
-            depth_data['buy_perc'].pop(0)
-            depth_data['sell_perc'].pop(0)
+        ctx.depth_data['time'].append(defs.now_utc()[4])
+        ctx.depth_data['buy_perc'].append(buy_percentage)
+        ctx.depth_data['sell_perc'].append(sell_percentage)
+        if len(ctx.depth_data['time']) > ctx.use_orderbook['limit']:
+            ctx.depth_data['time'].pop(0)
+            ctx.depth_data['buy_perc'].pop(0)
+            ctx.depth_data['sell_perc'].pop(0)
 
         # Get average buy and sell percentage for timeframe
         new_buy_percentage  = buy_percentage
         new_sell_percentage = sell_percentage
-        if use_orderbook.get('average'):
-            result              = defs.average_depth(depth_data, use_orderbook, buy_percentage, sell_percentage)
+        if ctx.use_orderbook.get('average'):
+            result              = defs.average_depth(ctx.depth_data, ctx.use_orderbook, buy_percentage, sell_percentage)
             new_buy_percentage  = result[0]
             new_sell_percentage = result[1]
 
         # Set orderbook_advice
-        orderbook_advice['buy_perc']  = new_buy_percentage
-        orderbook_advice['sell_perc'] = new_sell_percentage
+        ctx.orderbook_advice['buy_perc']  = new_buy_percentage
+        ctx.orderbook_advice['sell_perc'] = new_sell_percentage
 
     # Report error
     except Exception as e:
@@ -595,7 +446,7 @@ def handle_orderbook(message):
     return
 
 # Handle messages to keep trades up to date
-def handle_trade(message):
+def handle_trade(ctx, message):
 
     # To be implemented for Deribit
     
@@ -608,57 +459,49 @@ def handle_trade(message):
     # Errors are not reported within websocket
     try:
 
-        # Declare some variables global
-        global trade_advice, trades
-        
         # Initialize variables
         result     = ()
         datapoints = {}
-        compare    = {'time': [], 'side': [], 'size': [], 'price': []}
+        timeframe  = ctx.use_trade['timeframe']
 
         # Show incoming message
         if debug_1: 
             defs.announce("Debug: *** Incoming trade ***")
             print(f"{message}\n")
 
-        # Decode message and get the latest trades
-        for t in message.get('data', []):
-            trades['time'].append(int(t['ts']))                 # ts: exchange ms timestamp
-            trades['side'].append(t['side'].capitalize())       # "buy"/"sell" -> "Buy"/"Sell"
-            trades['size'].append(float(t['sz']))               # sz: trade size
-            trades['price'].append(float(t['px']))              # px: trade price
-                           
-        # Limit number of trades
-        if len(trades['time']) > use_trade['limit']:
-            trades['time']  = trades['time'][-use_trade['limit']:]
-            trades['side']  = trades['side'][-use_trade['limit']:]
-            trades['size']  = trades['size'][-use_trade['limit']:]
-            trades['price'] = trades['price'][-use_trade['limit']:]
-    
-        # Number of trades to use for timeframe
-        number = defs.get_index_number(trades, use_trade['timeframe'], use_trade['limit'])
-        compare['time']  = trades['time'][-number:]
-        compare['side']  = trades['side'][-number:]
-        compare['size']  = trades['size'][-number:]
-        compare['price'] = trades['price'][-number:]        
-    
-        # Get trade_advice
-        result = defs.calculate_total_values(compare)        
-        trade_advice['buy_ratio']  = result[3]
-        trade_advice['sell_ratio'] = result[4]
-        
+        # Decode message and add the latest trades, including missed trades, to the trade flow
+        new_trades = gaps.check_trades(message.get('data', []))
+        tradeflow.add(ctx.trades, new_trades)
+
+        # Report filling of trade flow
+        datapoints['trade'] = tradeflow.count(ctx.trades)
+        datapoints['limit'] = ctx.use_trade['limit']
+        if datapoints['trade'] < datapoints['limit']:
+            defs.announce(f"*** Warning: Still fetching data, message will disappear ({(datapoints['trade'] / datapoints['limit']) * 100:.0f} %)! ***")
+
+        # Get trade_advice from running totals of the timeframe
+        result = tradeflow.ratios(ctx.trades, timeframe)
+        if result:
+            ctx.trade_advice['buy_ratio']  = result[0]
+            ctx.trade_advice['sell_ratio'] = result[1]
+
+        # Get VWAP, trade size percentiles and aggressor imbalance
+        if ctx.use_trade['extras']:
+            ctx.trade_advice.update(tradeflow.extras(ctx.trades, timeframe))
+
         # Validate data
-        datapoints['trade']   = len(trades['time'])
-        datapoints['compare'] = len(compare['time'])
-        datapoints['limit']   = use_trade['limit']
-        if (datapoints['compare'] >= datapoints['trade']) and (datapoints['trade'] >= datapoints['limit']):
+        if tradeflow.saturated(ctx.trades, timeframe):
             defs.log_error("*** Warning: Increase trade_limit variable in config file! ***")
         
         # Debug
         if debug_2:
+            datapoints['compare'] = ctx.trades['total'] - max(ctx.trades['windows'][timeframe]['start'], ctx.trades['total'] - datapoints['limit'])
             message = f"Currently {datapoints['trade']} / {datapoints['limit']} data points, "
             message = message + f"using the last {datapoints['compare']} points and "
-            message = message + f"buy ratio is {trade_advice['buy_ratio']:.2f} %"
+            message = message + f"buy ratio is {ctx.trade_advice['buy_ratio']:.2f} %"
+            if ctx.use_trade['extras']:
+                message = message + f", VWAP is {ctx.trade_advice['vwap']:.6f}, trade size p50 / p90 is {ctx.trade_advice['p50']} / {ctx.trade_advice['p90']}"
+                message = message + ", imbalance is " + ", ".join(f"{value:+.2f} ({window} ms)" for window, value in ctx.trade_advice['imbalance'].items())
             defs.announce(message)
     
     # Report error
@@ -676,11 +519,8 @@ def handle_trade(message):
     return
 
 # Check if we can buy the based on signals
-def buy_matrix(spot, active_order, all_buys, interval_index):
+def buy_matrix(ctx, spot, active_order, all_buys, interval_index):
 
-    # Declare some variables global
-    global indicators_advice, orderbook_advice, trade_advice, pricelimit_advice, info
-    
     # Initialize variables
     can_buy       = False
     spread_advice = {}
@@ -692,26 +532,26 @@ def buy_matrix(spot, active_order, all_buys, interval_index):
     if not active_order['active']:
         
         # Get buy advice
-        result            = defs.advice_buy(indicators_advice, orderbook_advice, trade_advice, pricelimit_advice, use_indicators, use_spread, use_orderbook, use_trade, use_pricelimit, spot, all_buys, interval_index)
-        indicators_advice = result[0]
-        spread_advice     = result[1]
-        orderbook_advice  = result[2]
-        trade_advice      = result[3]
-        pricelimit_advice = result[4]
+        result                = defs.advice_buy(ctx.indicators_advice, ctx.orderbook_advice, ctx.trade_advice, ctx.pricelimit_advice, ctx.use_indicators, ctx.use_spread, ctx.use_orderbook, ctx.use_trade, ctx.use_pricelimit, spot, all_buys, interval_index)
+        ctx.indicators_advice = result[0]
+        spread_advice         = result[1]
+        ctx.orderbook_advice  = result[2]
+        ctx.trade_advice      = result[3]
+        ctx.pricelimit_advice = result[4]
                     
         # Get buy decission and report
-        result            = defs.decide_buy(indicators_advice, use_indicators, spread_advice, use_spread, orderbook_advice, use_orderbook, trade_advice, use_trade, pricelimit_advice, use_pricelimit, interval_index, info)
-        can_buy           = result[0]
-        message           = result[1]
-        indicators_advice = result[2]
+        result                = defs.decide_buy(ctx.indicators_advice, ctx.use_indicators, spread_advice, ctx.use_spread, ctx.orderbook_advice, ctx.use_orderbook, ctx.trade_advice, ctx.use_trade, ctx.pricelimit_advice, ctx.use_pricelimit, interval_index, ctx.info)
+        can_buy               = result[0]
+        message               = result[1]
+        ctx.indicators_advice = result[2]
         defs.announce(message)
 
         # Determine distance of trigger price and execute buy decission
         if can_buy:
-            result       = orders.buy(spot, compounding, active_order, all_buys, prices, info)
+            result       = orders.buy(spot, ctx.compounding, active_order, all_buys, ctx.prices, ctx.info)
             active_order = result[0]
             all_buys     = result[1]
-            info         = result[2]
+            ctx.info     = result[2]
     
     # Report execution time
     if speed: defs.announce(defs.report_exec(stime))
@@ -720,227 +560,366 @@ def buy_matrix(spot, active_order, all_buys, interval_index):
     return active_order
 
 # Prechecks to see if we can start sunflow
-def prechecks():
-    
-    # Declare some variables global
-    global symbol
+def prechecks(ctx):
     
     # Initialize variables
     goahead = True
     
     # Do checks
-    if use_indicators['intervals'][3] != 0 and use_indicators['intervals'][2] == 0:
+    if ctx.use_indicators['intervals'][3] != 0 and ctx.use_indicators['intervals'][2] == 0:
         goahead = False
         defs.announce("Interval 2 must be set if you use interval 3 for confirmation!")
         
-    if not use_spread['enabled'] and not use_indicators['enabled']:
+    if not ctx.use_spread['enabled'] and not ctx.use_indicators['enabled']:
         goahead = False
         defs.announce("Need at least either Technical Indicators enabled or Spread to determine buy action!")
     
-    if compounding['enabled'] and not config.balance_report:
+    if ctx.compounding['enabled'] and not config.balance_report:
         goahead = False
         defs.announce("When compounding set balance_report to True!")
     
     # Return result
     return goahead
 
+# Checks to see if all symbols can run in one Sunflow
+def check_symbols():
+
+    # Initialize variables
+    goahead = True
+    configs = loader.load_configs()
+
+    # Every symbol only once
+    if len(contexts) != len(configs):
+        goahead = False
+        defs.announce("Every config file must have a different symbol!")
+
+    # One exchange connection is shared by all symbols
+    for symbol_config in configs:
+        if (symbol_config.api_key, symbol_config.api_env) != (configs[0].api_key, configs[0].api_env):
+            goahead = False
+            defs.announce(f"Config file of {symbol_config.symbol} must use the same api_key and api_env as {configs[0].symbol}!")
+
+    # Return result
+    return goahead
+
+# Preload all requirements of a symbol
+def start(ctx):
+
+    ## Display welcome screen
+    print(f"Symbol    : {ctx.symbol}")
+    if ctx.use_indicators['enabled']:
+        if ctx.use_indicators['intervals'][1] != '': print(f"Interval 1: {ctx.use_indicators['intervals'][1]}")
+        if ctx.use_indicators['intervals'][2] != '': print(f"Interval 2: {ctx.use_indicators['intervals'][2]}")
+        if ctx.use_indicators['intervals'][3] != '': print(f"Interval 3: {ctx.use_indicators['intervals'][3]}")
+    if ctx.use_spread['enabled']:
+        print(f"Spread    : {ctx.use_spread['distance']} %")
+    print(f"Profit    : {ctx.profit} %")
+    print(f"Prices    : {config.prices_limit}")
+    print(f"Timestamp : {ctx.timestamp} ms\n")
+
+    ## Preload all requirements
+    print(f"\n*** Preloading {ctx.symbol} ***\n")
+    preload.check_files()
+    timings = {}
+    stime   = defs.now_utc()[4]
+
+    # Preload steps that only depend on the exchange run at the same time, the others as soon as their data is in
+    steps = {}
+    steps['ticker'] = ([], lambda results: preload.get_ticker())
+    steps['info']   = (['ticker'], lambda results: preload.get_info(results['ticker']['lastPrice'], ctx.multiplier, ctx.compounding))
+    steps['orders'] = (['info'], lambda results: preload.check_orders(database.load(config.dbase_file, results['info']), results['info']))
+    steps['prices'] = ([], lambda results: preload.get_prices(config.prices_interval, config.prices_limit))
+
+    # Preload technical indicators
+    if ctx.use_indicators['enabled']:
+        for index in (1, 2, 3):
+            if ctx.use_indicators['intervals'][index] != '':
+                steps[f"klines {index}"] = ([], lambda results, index=index: preload.get_klines(ctx.use_indicators['intervals'][index], ctx.use_indicators['limit']))
+
+    # Preload ATR klines, kept up to date by websocket
+    if ctx.active_order['wiggle'] == "ATR":
+        steps['atr'] = ([], lambda results: distance.atr_preload())
+
+    # Preload historical prices of optimizer
+    if ctx.optimizer['enabled']:
+        steps['optimizer prices'] = ([], lambda results: preload.get_prices(ctx.optimizer['interval'], ctx.optimizer['prices']))
+
+    # Run steps
+    results = preload.run_steps(steps, timings)
+
+    # Preload basic price data
+    ctx.ticker           = results['ticker']
+    ctx.spot             = ctx.ticker['lastPrice']
+    ctx.info             = results['info']
+    ctx.all_buys         = results['orders']
+    ctx.prices           = results['prices']
+    for index in (1, 2, 3):
+        if f"klines {index}" in results:
+            ctx.use_indicators['klines'][index] = results[f"klines {index}"]
+
+    # Preload prices from disk
+    if config.cache_enabled:
+        prices_stored = storage.get_prices(ctx.prices, ctx.optimizer['limit_max'])
+        ctx.prices    = preload.combine_prices(prices_stored, ctx.prices)
+
+    # Preload optimizer and load prices
+    if ctx.optimizer['enabled']:
+
+        # Combine historical prices with current prices
+        ctx.prices   = preload.combine_prices(results['optimizer prices'], ctx.prices)
+
+        # Calulcate optimized data
+        result           = preload.timed(timings, "optimizer", optimum.optimize, ctx.prices, ctx.profit, ctx.active_order, ctx.use_spread, ctx.optimizer)
+        ctx.profit       = result[0]
+        ctx.active_order = result[1]
+        ctx.use_spread   = result[2]
+        ctx.optimizer    = result[3]
+
+    # Preload database inconsistencies
+    if config.database_rebalance:
+        ctx.all_buys = preload.timed(timings, "rebalance", orders.rebalance, ctx.all_buys, ctx.info)
+
+    # Preload balances
+    if config.balance_report:
+        balances               = preload.timed(timings, "balances", orders.report_balances, ctx.spot, ctx.all_buys, ctx.info)
+        ctx.compounding['now'] = balances[0]
+
+    # Preload compounding
+    if ctx.compounding['enabled']:
+        ctx.info = defs.calc_compounding(ctx.info, ctx.spot, ctx.compounding)
+
+    # Check funds
+    if config.equity_check:
+        preload.timed(timings, "funds", orders.check_buy, ctx.info)
+
+    # Time of preload
+    preload_time = defs.now_utc()[4] - stime
+
+    ## TESTS ##
+    print("\n*** Preloading report ***")
+
+    print("\n** Ticker **")
+    print(f"Symbol    : {ctx.ticker['symbol']}")
+    print(f"Last price: {ctx.ticker['lastPrice']} {ctx.info['quoteCoin']}")
+    print(f"Updated   : {ctx.ticker['time']} ms")
+
+    print("\n** Spot **")
+    print(f"Spot price: {ctx.spot} {ctx.info['quoteCoin']}")
+
+    print("\n** Info **")
+    print("Instrument information:")
+    pprint.pprint(ctx.info)
+    #print("\n** Klines **")
+    #pprint.pprint(klines)
+
+    if config.balance_report:
+        print("\n** Value **")
+        print(f"Total bot value : {balances[0]} {ctx.info['quoteCoin']}")
+        print(f"Quote (exchange): {balances[2]} {ctx.info['quoteCoin']}")
+        print(f"Base (exchange) : {balances[1]} {ctx.info['baseCoin']}")
+        print(f"Base (database) : {balances[3]} {ctx.info['baseCoin']}")
+        print(f"Out of sync     : {balances[4]} {ctx.info['baseCoin']}")
+
+    print("\n** Timings **")
+    for name, ms in timings.items():
+        print(f"{name.capitalize():<17}: {ms:,} ms")
+    print(f"Preloaded in {preload_time:,} ms, {sum(timings.values()):,} ms when run one after another")
+    print()
+
+    # Return
+    return
+
 
 ### Start main program ###
 
-## Check if we can start
-if not prechecks():
-    defs.announce("*** NO START ***")
-    exit()
-
-
-## Display welcome screen
-print("\n*************************")
-print("*** Sunflow Cryptobot ***")
-print("*************************\n")
-print(f"Symbol    : {symbol}")
-if use_indicators['enabled']:
-    if use_indicators['intervals'][1] != '': print(f"Interval 1: {use_indicators['intervals'][1]}")
-    if use_indicators['intervals'][2] != '': print(f"Interval 2: {use_indicators['intervals'][2]}")
-    if use_indicators['intervals'][3] != '': print(f"Interval 3: {use_indicators['intervals'][3]}")
-if use_spread['enabled']:
-    print(f"Spread    : {use_spread['distance']} %")
-print(f"Profit    : {profit} %")
-print(f"Prices    : {config.prices_limit}")
-print(f"Timestamp : {timestamp} ms\n")
-
-
-## Preload all requirements
-print("\n*** Preloading ***\n")
-preload.check_files()
-
-# Preload technical indicators
-if use_indicators['enabled']:
-    if use_indicators['intervals'][1] != '': use_indicators['klines'][1] = preload.get_klines(use_indicators['intervals'][1], use_indicators['limit'])
-    if use_indicators['intervals'][2] != '': use_indicators['klines'][2] = preload.get_klines(use_indicators['intervals'][2], use_indicators['limit'])
-    if use_indicators['intervals'][3] != '': use_indicators['klines'][3] = preload.get_klines(use_indicators['intervals'][3], use_indicators['limit'])
-
-# Preload basic price data
-ticker               = preload.get_ticker()
-spot                 = ticker['lastPrice']
-info                 = preload.get_info(spot, multiplier, compounding)
-all_buys             = database.load(config.dbase_file, info)
-all_buys             = preload.check_orders(all_buys, info)
-prices               = preload.get_prices(config.prices_interval, config.prices_limit)
-
-# Preload optimizer and load prices
-if optimizer['enabled']:
-
-    # Get historical prices and combine with current prices
-    prices_old   = preload.get_prices(optimizer['interval'], optimizer['prices'])
-    prices       = preload.combine_prices(prices_old, prices)
-    
-    # Calulcate optimized data
-    result       = optimum.optimize(prices, profit, active_order, use_spread, optimizer)
-    profit       = result[0]
-    active_order = result[1]
-    use_spread   = result[2]
-    optimizer    = result[3]
-
-# Preload database inconsistencies
-if config.database_rebalance:
-    all_buys = orders.rebalance(all_buys, info)
-
-# Preload balances
-if config.balance_report:
-    balances           = orders.report_balances(spot, all_buys, info)
-    compounding['now'] = balances[0]
-
-# Preload compounding
-if compounding['enabled']:
-    info = defs.calc_compounding(info, spot, compounding)
-
-# Check funds
-if config.equity_check:
-    orders.check_buy(info)
-
-## TESTS ##
-print("\n*** Preloading report ***")
-
-print("\n** Ticker **")
-print(f"Symbol    : {ticker['symbol']}")
-print(f"Last price: {ticker['lastPrice']} {info['quoteCoin']}")
-print(f"Updated   : {ticker['time']} ms")
-
-print("\n** Spot **")
-print(f"Spot price: {spot} {info['quoteCoin']}")
-
-print("\n** Info **")
-print("Instrument information:")
-pprint.pprint(info)
-#print("\n** Klines **")
-#pprint.pprint(klines)
-
-if config.balance_report:
-    print("\n** Value **")
-    print(f"Total bot value : {balances[0]} {info['quoteCoin']}")
-    print(f"Quote (exchange): {balances[2]} {info['quoteCoin']}")
-    print(f"Base (exchange) : {balances[1]} {info['baseCoin']}")
-    print(f"Base (database) : {balances[3]} {info['baseCoin']}")
-    print(f"Out of sync     : {balances[4]} {info['baseCoin']}")
-
-## Announce start
-print("\n*** Starting ***\n")
-if config.timeutc_std:
-    time_output = defs.now_utc()[0] + " UTC time"
-else:
-    time_output = defs.now_utc()[5] + " " + config.timezone_str + " time"
-defs.announce(f"Sunflow started at {time_output}")
+# Preload every symbol when started, importing Sunflow only defines the handlers (see benchmarks)
+if __name__ == "__main__":
+    ## Check if we can start
+    goahead = check_symbols()
+    for ctx in contexts.values():
+        with context.use(ctx):
+            goahead = prechecks(ctx) and goahead
+    if not goahead:
+        defs.announce("*** NO START ***")
+        exit()
+
+    ## Display welcome screen
+    print("\n*************************")
+    print("*** Sunflow Cryptobot ***")
+    print("*************************\n")
+
+    ## Preload all symbols
+    for ctx in contexts.values():
+        with context.use(ctx):
+            start(ctx)
+
+    ## Announce start
+    print("\n*** Starting ***\n")
+    if config.timeutc_std:
+        time_output = defs.now_utc()[0] + " UTC time"
+    else:
+        time_output = defs.now_utc()[5] + " " + config.timezone_str + " time"
+    defs.announce(f"Sunflow started with {len(contexts)} symbol(s) at {time_output}")
+    if config.notify_routine:
+        defs.announce(f"Sunflow started with {len(contexts)} symbol(s) at {time_output}", True, "low")
 
 
 ### Periodic tasks ###
 
 # Run tasks periodically
-def periodic_tasks(current_time):
+def periodic_tasks(ctx, current_time):
 
     # Debug
     debug = False
 
-    # Declare some variables global
-    global info
+    # Reset timer
+    ctx.periodic["time"] = current_time
 
-    # Get info
-    info = preload.get_info(spot, multiplier, compounding)
+    # Get info in a background thread, REST requests never block the handlers of the event loop
+    if not ctx.periodic["loading"]:
+        ctx.periodic["loading"] = True
+        threading.Thread(target=loader.bind(periodic_fetch), args=(ctx, _state["loop"], ctx.spot, ctx.multiplier, ctx.compounding), daemon=True).start()
 
     # Return
     return
 
+# Get info, runs in a background thread and hands the info over to the event loop
+def periodic_fetch(ctx, loop, spot, multiplier, compounding):
+    try:
+        info = preload.get_info(spot, multiplier, compounding)
+        loop.call_soon_threadsafe(handle, ctx, False, periodic_apply, ctx, info)
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to get info in the background: {e} ***")
+    finally:
+        ctx.periodic["loading"] = False
+
+# Apply info received in the background, runs on the event loop between handlers
+def periodic_apply(ctx, info):
+    ctx.info = info
+
 # Ping message periodically
-def ping_message(current_time):
+def ping_message(ctx, current_time):
 
     # Debug
     debug = False
 
     # Initialize variables
-    expire        = uptime_ping["expire"]
-    delay_ping    = current_time - uptime_ping["time"]
-    delay_tickers = current_time - uptime_ping["record"]
-
-    # Check for too little action -> now force a resubscribe
-    if delay_tickers > expire:
-
-        # Reset uptime notice
-        uptime_ping['time']   = current_time
-        uptime_ping['record'] = current_time
-
-        # Report to stdout
-        message = f"*** Warning: Ping, last ticker update of {delay_tickers:,} ms ago is larger than {expire:,} ms maximum! ***"
-        defs.log_error(message)
-
-        # Request resubscribe
-        message = f"Ticker stall: Last update {delay_tickers:,} ms > {expire:,} ms"
-        request_resubscribe(message)
+    delay_ping    = current_time - ctx.uptime_ping["time"]
+    delay_tickers = current_time - ctx.uptime_ping["record"]
 
     # Report to stdout
-    if uptime_ping["enabled"]:
+    if ctx.uptime_ping["enabled"]:
         if delay_ping == delay_tickers:
             defs.announce(f"Ping, {delay_ping:,} ms since last message and ticker")
         else:
             defs.announce(f"Ping, {delay_ping:,} ms since last message and ticker update was {delay_tickers:,} ms ago")
 
+    # Reset uptime notice
+    ctx.uptime_ping["time"] = current_time
+
     # Return
     return
 
+# Ticker stalled, too little action -> now force a resubscribe
+def ticker_stall(ctx, current_time):
 
-### Websockets ###
+    # Initialize variables
+    expire        = ctx.uptime_ping["expire"]
+    delay_tickers = current_time - ctx.uptime_ping["record"]
+
+    # Reset uptime notice
+    ctx.uptime_ping['time']   = current_time
+    ctx.uptime_ping['record'] = current_time
+
+    # Report to stdout
+    message = f"*** Warning: Ping, last ticker update of {delay_tickers:,} ms ago is larger than {expire:,} ms maximum! ***"
+    defs.log_error(message)
+
+    # Request resubscribe of the websockets with tickers
+    message = f"Ticker stall: Last update {delay_tickers:,} ms > {expire:,} ms"
+    request_resubscribe(message, {"public", "standby"})
+
+    # Return
+    return
+
+# Report metrics to the supervisor
+def report_metrics(ctx, current_time):
+
+    # Initialize variables
+    qty     = sum(order['cumExecQty'] for order in ctx.all_buys)
+    metrics = {}
+
+    # Collect metrics
+    metrics['time']     = current_time
+    metrics['worker']   = os.getpid()
+    metrics['spot']     = ctx.spot
+    metrics['profit']   = ctx.profit
+    metrics['orders']   = len(ctx.all_buys)
+    metrics['qty']      = qty
+    metrics['value']    = qty * ctx.spot
+    metrics['quote']    = ctx.info.get('quoteCoin', "")
+    metrics['trailing'] = ctx.active_order['side'] if ctx.active_order['active'] else ""
+    metrics['amends']   = ctx.trailing['amend']['total']['sent']
+    metrics['halted']   = ctx.halt_sunflow
+    metrics['sockets']  = sum(r.health['connected'] for r in _state["runners"])
+    metrics['gaps']     = gaps.total(ctx.gaps)
+
+    # Send metrics
+    ctx.metrics["time"] = current_time
+    try:
+        supervisor.report(ctx.symbol, metrics)
+    except Exception as e:
+        defs.log_error(f"*** Warning: Failed to report metrics to supervisor: {e} ***")
+
+    # Return
+    return
 
-# Load websocket
-from okx.websocket.WsPublicAsync import WsPublicAsync
 
-# Global resubscribe event and helper state container
+### Websockets ###
+
+# Global resubscribe and halt events and helper state container
 resubmit_event = asyncio.Event()
-_state = {"runners": [], "tasks": []}
+halt_event     = asyncio.Event()
+_state = {"runners": [], "tasks": [], "timers": {}, "loop": None, "pending": set()}
 
-# Announce once and signal the watcher to rebuild streams
-def request_resubscribe(reason: str = ""):
+# Announce once and signal the watcher to rebuild streams, only the named runners or all runners
+def request_resubscribe(reason: str = "", names=None):
     # Report to stdout
     if reason:
         defs.announce(f"*** Warning: Websocket resubscribe: {reason} ***")
     else:
         defs.announce("*** Warning: Websocket resubscribe ***")
 
+    # Runners to rebuild
+    if names is None:
+        _state["pending"].add("all")
+    else:
+        _state["pending"].update(names)
+
     # Resubmit event set
     resubmit_event.set()
 
     # Return
     return
 
-# Initialize candles
-candles = {}
-if use_indicators["enabled"]:
-    if use_indicators["intervals"][1] != "":
-        candles["candle" + use_indicators["intervals"][1]] = True
-    if use_indicators["intervals"][2] != "":
-        candles["candle" + use_indicators["intervals"][2]] = True
-    if use_indicators["intervals"][3] != "":
-        candles["candle" + use_indicators["intervals"][3]] = True
-
-# Public callbacks
-def on_message_public(raw):
+# Subscribe again to one channel of a symbol, the exchange then sends a new snapshot. The other channels and
+# symbols on the websocket keep streaming, a runner that is not connected subscribes to everything when it reconnects.
+def resync_channel(ctx, channel, name):
+    _state["loop"].call_soon_threadsafe(_resync_channel, ctx, channel, name)
+
+# Resync channel on the event loop, handlers of a busy symbol run in a background thread
+def _resync_channel(ctx, channel, name):
+    for r in _state["runners"]:
+        if r.name == name:
+            defs.announce(f"*** Warning: Resubscribing {channel} of {ctx.symbol} for a new snapshot ***")
+            task = asyncio.get_running_loop().create_task(r.resubscribe([{"channel": channel, "instId": ctx.symbol}]), name=f"resync-{ctx.symbol}-{channel}")
+            task.add_done_callback(_log_task_result)
+
+    # Return
+    return
+
+# Public callbacks, source is the websocket the message came from
+def on_message_public(raw, source="public"):
     message = json.loads(raw)
     if message.get("event") in {"subscribe", "error"}:
         defs.announce(message)
@@ -948,12 +927,25 @@ def on_message_public(raw):
     if message.get("op") == "pong":
         return
 
+    # Context of symbol, a halted symbol no longer trades
+    ctx = contexts.get(message.get("arg", {}).get("instId"))
+    if ctx is None or ctx.halt_sunflow:
+        return
+
     # Ticker and Orderbook
     ch = message.get("arg", {}).get("channel")
-    if ch == "tickers":
-        handle_ticker(message)
-    elif ch in {"books", "books5", "bbo-tbt"}:
-        handle_orderbook(message)
+    with context.use(ctx):
+        if ch == "tickers":
+
+            # Ticker was already handled from the other websocket
+            ts = int(message['data'][0]['ts'])
+            gaps.check_ticker(source, ts)
+            if ts <= ctx.ticker_ts:
+                return
+            ctx.ticker_ts = ts
+            handle(ctx, True, handle_ticker, ctx, message)
+        elif ch in {"books", "books5", "bbo-tbt"}:
+            handle(ctx, False, handle_orderbook, ctx, message)
 
 # Keyed callbacks
 def on_message_business(raw):
@@ -964,46 +956,135 @@ def on_message_business(raw):
     if message.get("op") == "pong":
         return
 
+    # Context of symbol, a halted symbol no longer trades
+    ctx = contexts.get(message.get("arg", {}).get("instId"))
+    if ctx is None or ctx.halt_sunflow:
+        return
+
     # Klines and Trades
     ch = message.get("arg", {}).get("channel")
-    if ch and ch.startswith("candle"):
-        interval = ch.replace("candle", "", 1)
-        if interval == use_indicators["intervals"][1]:
-            handle_kline(message, 1)
-        if interval == use_indicators["intervals"][2]:
-            handle_kline(message, 2)
-        if interval == use_indicators["intervals"][3]:
-            handle_kline(message, 3)
-    elif ch == "trades-all":
-        handle_trade(message)
-
-
-# Runner
+    with context.use(ctx):
+        if ch and ch.startswith("candle"):
+            interval = ch.replace("candle", "", 1)
+            if ctx.use_indicators["enabled"]:
+                if interval == ctx.use_indicators["intervals"][1]:
+                    handle(ctx, True, handle_kline, ctx, message, 1)
+                if interval == ctx.use_indicators["intervals"][2]:
+                    handle(ctx, True, handle_kline, ctx, message, 2)
+                if interval == ctx.use_indicators["intervals"][3]:
+                    handle(ctx, True, handle_kline, ctx, message, 3)
+            if interval == "1m" and ctx.active_order['wiggle'] == "ATR":
+                handle(ctx, False, handle_atr, message)
+        elif ch == "trades-all":
+            handle(ctx, False, handle_trade, ctx, message)
+
+# Run a handler of a symbol. Handlers that may send REST requests run in a background thread, the rate limiters then
+# wait there and never block the event loop. While a symbol is busy its other handlers wait in order for the same thread.
+def handle(ctx, background, handler, *args):
+
+    # Run right away on the event loop
+    if not background and not ctx.lock_ticker['enabled']:
+        handler(*args)
+        return
+
+    # Wait for the busy symbol, or lock the symbol and start a thread
+    ctx.lock_ticker['pending'].append((handler, args))
+    if not ctx.lock_ticker['enabled']:
+        ctx.lock_ticker['enabled'] = True
+        threading.Thread(target=loader.bind(run_handlers), args=(ctx, _state["loop"]), daemon=True).start()
+
+# Run the waiting handlers of a symbol, runs in a background thread and unlocks the symbol on the event loop
+def run_handlers(ctx, loop):
+    with context.use(ctx):
+        while ctx.lock_ticker['pending'] and not ctx.halt_sunflow:
+            handler, args = ctx.lock_ticker['pending'].pop(0)
+            try:
+                handler(*args)
+            except Exception as e:
+                defs.log_error(f"*** Warning: Handler {handler.__name__} of {ctx.symbol} failed: {e} ***")
+    loop.call_soon_threadsafe(unlock_handlers, ctx, loop)
+
+# Unlock a symbol on the event loop, handlers that arrived in the meantime get a new thread
+def unlock_handlers(ctx, loop):
+    if ctx.lock_ticker['pending'] and not ctx.halt_sunflow:
+        threading.Thread(target=loader.bind(run_handlers), args=(ctx, loop), daemon=True).start()
+    else:
+        ctx.lock_ticker['pending'].clear()
+        ctx.lock_ticker['enabled'] = False
+
+
+# Runner, one websocket connection that reconnects by itself when it closes or stays silent
 class Runner:
-    def __init__(self, url, subs, callback):
+    def __init__(self, name, url, subs, callback):
+        self.name = name
         self.url = url
         self.subs = subs
         self.callback = callback
         self.stop_event = asyncio.Event()
+        self.task = None
+        self.ws = None
+        self.health = {"connected": False, "messages": 0, "last": 0.0, "reconnects": 0}
 
     def stop(self):
         self.stop_event.set()
 
+    # Count every message before handling it
+    def receive(self, raw):
+        self.health["messages"] += 1
+        self.health["last"] = time.monotonic()
+        self.callback(raw)
+
+    # Unsubscribe and subscribe again to channels, the other channels keep streaming
+    async def resubscribe(self, subs):
+        if self.ws is not None and self.health["connected"]:
+            await self.ws.unsubscribe(subs, self.receive)
+            await self.ws.subscribe(subs, self.receive)
+
+    # Stop streaming channels, for example of a halted symbol, the other channels keep streaming
+    async def remove(self, subs):
+        self.subs = [sub for sub in self.subs if sub not in subs]
+        if self.ws is not None and self.health["connected"]:
+            await self.ws.unsubscribe(subs, self.receive)
+
     async def run_once(self):
-        ws = WsPublicAsync(self.url)
+        ws = runtime.new_websocket(self.url)
+        self.ws = ws
+        stop = asyncio.create_task(self.stop_event.wait())
+        consume = None
+        silence = config.websocket_silence / 1000
         try:
-            await ws.start()
-            await ws.subscribe(self.subs, self.callback)
-            await self.stop_event.wait()
+            consume = await ws.start()
+            if ws.factory.websocket is None:
+                raise ConnectionError("Failed to connect")
+            await ws.subscribe(self.subs, self.receive)
+            self.health["connected"] = True
+            self.health["last"] = time.monotonic()
+
+            # Wait for stop, a closed connection or silence
+            while not self.stop_event.is_set():
+                timeout = max(self.health["last"] + silence - time.monotonic(), 0)
+                done, _ = await asyncio.wait({stop, consume}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if consume in done:
+                    consume.result()
+                    raise ConnectionError("Connection closed")
+                if not done and time.monotonic() - self.health["last"] >= silence:
+                    raise ConnectionError(f"No messages for {config.websocket_silence:,} ms")
         except Exception as e:
-            defs.announce(f"[{self.url}] run_once crashed: {e}")
+            defs.announce(f"[{self.name}] run_once crashed: {e}")
             raise
         finally:
             # Always try to clean up
+            self.health["connected"] = False
+            self.ws = None
+            stop.cancel()
             with contextlib.suppress(Exception):
-                await ws.unsubscribe(self.subs, self.callback)
+                await ws.unsubscribe(self.subs, self.receive)
             with contextlib.suppress(Exception):
                 await ws.factory.close()
+            if consume is not None:
+                consume.cancel()
+                with contextlib.suppress(BaseException):
+                    await consume
 
     async def run_forever(self):
         backoff = 1
@@ -1011,7 +1092,8 @@ class Runner:
             try:
                 await self.run_once()
             except Exception as e:
-                defs.announce(f"[{self.url}] Disconnected: {e}. Reconnecting in {backoff}s…")
+                self.health["reconnects"] += 1
+                defs.announce(f"[{self.name}] Disconnected: {e}. Reconnecting in {backoff}s…")
                 try:
                     await asyncio.wait_for(self.stop_event.wait(), timeout=backoff)
                 except asyncio.TimeoutError:
@@ -1021,30 +1103,48 @@ class Runner:
                 backoff = 1
 
 
-# Helper to build runner list from current settings
+# Helper to build runner list from current settings, all symbols that did not halt share the same websockets
 def build_runners():
     runners = []
+    active = [ctx for ctx in contexts.values() if not ctx.halt_sunflow]
 
     # Public WS (channels tickers + orderbook)
     subs_public = []
-    subs_public.append({"channel": "tickers", "instId": symbol})
-    if use_orderbook["enabled"]:
-        subs_public.append({"channel": config.api_ch_orderbook, "instId": symbol})
+    for ctx in active:
+        subs_public.append({"channel": "tickers", "instId": ctx.symbol})
+        if ctx.use_orderbook["enabled"]:
+            subs_public.append({"channel": ctx.config.api_ch_orderbook, "instId": ctx.symbol})
     if subs_public:
-        runners.append(Runner(config.api_ws_public, subs_public, on_message_public))
+        runners.append(Runner("public", config.api_ws_public, subs_public, on_message_public))
+
+    # Standby public WS (channel tickers), duplicate tickers are dropped in on_message_public()
+    if config.websocket_standby:
+        subs_standby = [{"channel": "tickers", "instId": ctx.symbol} for ctx in active]
+        runners.append(Runner("standby", config.api_ws_public, subs_standby, lambda raw: on_message_public(raw, "standby")))
 
     # Business WS (channels candles + trades-all)
     subs_business = []
-    for ch, enabled in candles.items():
-        if enabled:
-            subs_business.append({"channel": ch, "instId": symbol})
-    if use_trade["enabled"]:
-        subs_business.append({"channel": "trades-all", "instId": symbol})
+    for ctx in active:
+        for ch, enabled in ctx.candles.items():
+            if enabled:
+                subs_business.append({"channel": ch, "instId": ctx.symbol})
+        if ctx.use_trade["enabled"]:
+            subs_business.append({"channel": "trades-all", "instId": ctx.symbol})
     if subs_business:
-        runners.append(Runner(config.api_ws_business, subs_business, on_message_business))
+        runners.append(Runner("business", config.api_ws_business, subs_business, on_message_business))
 
     return runners
 
+# Start task of a runner
+def start_runner(r):
+    r.task = asyncio.create_task(r.run_forever(), name=f"runner-{r.name}")
+    r.task.add_done_callback(_log_task_result)
+    return r.task
+
+# Names of runners that are not connected
+def failed_runners():
+    return {r.name for r in _state["runners"] if not r.health["connected"]}
+
 
 # Robust asyncio error handling & task logging
 def _log_task_result(task: asyncio.Task):
@@ -1057,7 +1157,7 @@ def _log_task_result(task: asyncio.Task):
         tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
         defs.log_error(f"*** Warning: Task crashed: {e} ***\n>>> Traceback: \n{tb}")
         if isinstance(e, websockets.exceptions.ConnectionClosedError):
-            request_resubscribe("Runner task crashed with ConnectionClosedError")
+            request_resubscribe("Runner task crashed with ConnectionClosedError", failed_runners())
 
 def _loop_exception_handler(loop, context):
 
@@ -1077,8 +1177,8 @@ def _loop_exception_handler(loop, context):
         if isinstance(exc, websockets.exceptions.ConnectionClosedError):
             parts.append("exception=ConnectionClosedError (no close frame received or sent)")
 
-            # Trigger automatic resubscribe on connection close
-            request_resubscribe("Loop handler caught ConnectionClosedError")
+            # Trigger automatic resubscribe of the runners that lost their connection
+            request_resubscribe("Loop handler caught ConnectionClosedError", failed_runners())
 
         else:
             parts.append(f"exception={exc.__class__.__name__}: {exc}")
@@ -1090,86 +1190,166 @@ def _loop_exception_handler(loop, context):
     defs.log_error("\n>>> Message: ".join(parts))
 
 
-# Watchdog to stop when something goes wrong
-async def _watch_halt(state, poll_ms=200):
-    while not defs.halt_sunflow:
-        await asyncio.sleep(poll_ms / 1000.0)
+# Stop a halted symbol on the loop, called by context.halt() from any thread
+def _on_halt(ctx):
+    loop = _state["loop"]
+    if loop is not None and not loop.is_closed():
+        loop.call_soon_threadsafe(_halt_context, ctx)
+
+# Stop the timers and channels of a halted symbol, the other symbols keep trading. Sunflow halts when every symbol halted.
+def _halt_context(ctx):
 
-    # On halt, stop whatever runners are current
-    for r in list(state["runners"]):
+    # Stop timers of symbol
+    for key in [key for key in _state["timers"] if key[0] == ctx.symbol]:
+        _state["timers"].pop(key).cancel()
+
+    # Unsubscribe channels of symbol
+    for r in _state["runners"]:
+        subs = [sub for sub in r.subs if sub.get("instId") == ctx.symbol]
+        if subs:
+            task = asyncio.get_running_loop().create_task(r.remove(subs), name=f"halt-{ctx.symbol}-{r.name}")
+            task.add_done_callback(_log_task_result)
+
+    # Halt Sunflow when every symbol halted
+    if context.halted(contexts.values()):
+        halt_event.set()
+    else:
+        defs.announce(f"*** Warning: Stopped {ctx.symbol}, the other symbols keep trading ***")
+
+# Stop runners and wait until they unsubscribed and closed their websockets
+async def _stop_runners(runners, timeout=5):
+    for r in runners:
         r.stop()
+    tasks = [r.task for r in runners if r.task and not r.task.done()]
+    if tasks:
+        await asyncio.wait(tasks, timeout=timeout)
+    for t in tasks:
+        if not t.done():
+            t.cancel()
+
+# Watchdog to stop when something goes wrong
+async def _watch_halt(state):
+    await halt_event.wait()
+
+    # On halt, stop all timers and whatever runners are current
+    for timer in state["timers"].values():
+        timer.cancel()
+    await _stop_runners(list(state["runners"]))
 
     # Also wake the resubscribe watcher so it can exit quickly
     resubmit_event.set()
 
-# Watcher that handles resubscribe cycles
-async def _watch_resubscribe(state, poll_ms=200):
-    while not getattr(defs, "halt_sunflow", False):
-        # Only do resubscribe work if the event is set
-        if resubmit_event.is_set():
-            resubmit_event.clear()
-
-            # Double-check halt before doing any resubscribe work
-            if getattr(defs, "halt_sunflow", False):
-                break
-
-            # Stop existing runners
-            for r in list(state["runners"]):
-                r.stop()
-
-            # Give them a moment to unwind
-            await asyncio.sleep(0.1)
-
-            # Cancel old tasks
-            for t in list(state["tasks"]):
-                if not t.done():
-                    t.cancel()
-            state["tasks"].clear()
-
-            # Rebuild runners and tasks from live config
-            new_runners = build_runners()
-            if not new_runners:
-                defs.log_error(
-                    "*** Error: Resubscribe attempted, but no streams enabled. Check settings. ***"
-                )
-                continue
-
-            state["runners"].clear()
-            state["runners"].extend(new_runners)
+# Watcher that handles resubscribe cycles, only the requested runners are rebuilt
+async def _watch_resubscribe(state):
+    while True:
+        await resubmit_event.wait()
+        resubmit_event.clear()
+
+        # Double-check halt before doing any resubscribe work
+        if halt_event.is_set():
+            break
+
+        # Runners to rebuild
+        names = state["pending"]
+        state["pending"] = set()
+        if not names:
+            defs.announce("*** All websocket streams are connected, nothing to resubscribe ***")
+            continue
+
+        # Rebuild runners from live config
+        new_runners = build_runners()
+        if not new_runners:
+            defs.log_error(
+                "*** Error: Resubscribe attempted, but no streams enabled. Check settings. ***"
+            )
+            continue
+        if "all" not in names:
+            current = {r.name for r in state["runners"]}
+            new_runners = [r for r in new_runners if r.name in names or r.name not in current]
+
+        # Stop the runners that are replaced, the other runners keep streaming
+        replaced = {r.name for r in new_runners}
+        old_runners = [r for r in state["runners"] if "all" in names or r.name in replaced]
+        await _stop_runners(old_runners)
+        state["runners"] = [r for r in state["runners"] if r not in old_runners] + new_runners
+
+        # Start new runners
+        state["tasks"] = [t for t in state["tasks"] if not t.done()]
+        for r in new_runners:
+            state["tasks"].append(start_runner(r))
+
+        # Report to stdout, and via Apprise when routine notifications are enabled
+        defs.announce(f"*** Websocket streams resubscribed: {', '.join(sorted(replaced))} ***")
+        if config.notify_routine:
+            defs.announce(f"Websocket streams resubscribed: {', '.join(sorted(replaced))}", True, "low")
+
+# Run a task of a symbol when its deadline in ms has passed. The deadline is read again after every run,
+# tasks and handlers move it forward by resetting their time, so the timer follows without any polling.
+def _schedule(state, ctx, name, deadline, task, minimum=1000):
+    loop = state["loop"]
+
+    def fire():
+        if halt_event.is_set() or ctx.halt_sunflow:
+            return
+        current_time = defs.now_utc()[4]
 
-            new_tasks = [
-                asyncio.create_task(r.run_forever(), name=f"runner-{i}")
-                for i, r in enumerate(new_runners)
-            ]
-            for t in new_tasks:
-                t.add_done_callback(_log_task_result)
+        # Wait while handlers of the symbol run in the background, tasks never run alongside them
+        if ctx.lock_ticker['enabled']:
+            state["timers"][(ctx.symbol, name)] = loop.call_at(loop.time() + 0.1, fire)
+            return
 
-            state["tasks"].extend(new_tasks)
+        # Run task when its deadline passed
+        if current_time >= deadline(ctx):
+            with context.use(ctx):
+                try:
+                    task(ctx, current_time)
+                except Exception as e:
+                    defs.log_error(f"*** Warning: Task {name} of {ctx.symbol} failed: {e} ***")
+            current_time = defs.now_utc()[4]
 
-            # Report to stdout
-            defs.announce("*** Websocket streams resubscribed ***")
+        # Sleep until the next deadline, at least minimum ms when the task did not move it
+        delay = max(deadline(ctx) - current_time, minimum if current_time >= deadline(ctx) else 0)
+        state["timers"][(ctx.symbol, name)] = loop.call_at(loop.time() + delay / 1000, fire)
 
-        # Sleep briefly so we can re-check halt_sunflow
-        await asyncio.sleep(poll_ms / 1000.0)
+    state["timers"][(ctx.symbol, name)] = loop.call_at(loop.time(), fire)
 
-# Run tasks on a periodic basis
-async def _housekeeping_loop(poll_ms=200):
-    while not getattr(defs, "halt_sunflow", False):
-        current_time = defs.now_utc()[4]
+# Run tasks of every symbol that did not halt on their deadlines
+def _start_timers(state):
+    for ctx in contexts.values():
+        if ctx.halt_sunflow:
+            continue
 
-        # Uptime ping
-        if current_time - uptime_ping["time"] > uptime_ping["delay"]:
-            ping_message(current_time)
-            uptime_ping["time"] = current_time
+        # Uptime ping and ticker stall, handle_ticker() moves both deadlines on every price change
+        _schedule(state, ctx, "ping", lambda ctx: ctx.uptime_ping["time"] + ctx.uptime_ping["delay"] + 1, ping_message)
+        _schedule(state, ctx, "stall", lambda ctx: ctx.uptime_ping["record"] + ctx.uptime_ping["expire"] + 1, ticker_stall)
 
         # Periodic tasks
-        if periodic.get("enabled") and (
-            current_time - periodic["time"] > periodic["delay"]
-        ):
-            periodic_tasks(current_time)
-            periodic["time"] = current_time
+        if ctx.periodic.get("enabled"):
+            _schedule(state, ctx, "periodic", lambda ctx: ctx.periodic["time"] + ctx.periodic["delay"] + 1, periodic_tasks)
+
+        # Checkpoint klines and prices to disk
+        if ctx.config.cache_enabled:
+            _schedule(state, ctx, "checkpoint", lambda ctx: ctx.storage["time"] + ctx.config.cache_interval + 1, lambda ctx, current_time: storage.checkpoint(ctx.prices))
+
+        # Save state of the bot for the fleet analyzer
+        if ctx.config.fleet_state:
+            _schedule(state, ctx, "state", lambda ctx: ctx.storage["saved"] + ctx.config.fleet_state + 1, storage.save_state)
+
+        # Report metrics to supervisor
+        if supervisor:
+            _schedule(state, ctx, "metrics", lambda ctx: ctx.metrics["time"] + ctx.metrics["delay"] + 1, report_metrics)
+
+        # Reload strategy settings when the config file changed
+        if ctx.reload["delay"]:
+            _schedule(state, ctx, "reload", lambda ctx: ctx.reload["time"] + ctx.reload["delay"] + 1, reloader.check)
 
-        await asyncio.sleep(poll_ms / 1000.0)
+        # Start the profiler when requested by file
+        if ctx.profile["delay"]:
+            _schedule(state, ctx, "profile", lambda ctx: ctx.profile["time"] + ctx.profile["delay"] + 1, profiler.check)
+
+        # Compact finished days of the revenue store
+        if ctx.config.revenue_store:
+            _schedule(state, ctx, "ledger", lambda ctx: ctx.ledger["time"] + ctx.ledger["delay"] + 1, ledger.check)
 
 
 ### Main ###
@@ -1185,13 +1365,17 @@ async def main():
         raise RuntimeError("No streams enabled. Turn on at least one in settings.")
 
     # Create tasks for runners
-    tasks = [asyncio.create_task(r.run_forever(), name=f"runner-{i}") for i, r in enumerate(runners)]
-    for t in tasks:
-        t.add_done_callback(_log_task_result)
+    tasks = [start_runner(r) for r in runners]
 
     # Seed global state for watchers
     _state["runners"] = runners
     _state["tasks"] = tasks
+    _state["loop"] = loop
+
+    # Stop symbols that halt, wake up the halt watchdog when every symbol halted before the loop started
+    context.on_halt.append(_on_halt)
+    if context.halted(contexts.values()):
+        halt_event.set()
 
     # Start halt watchdog
     halt_task = asyncio.create_task(_watch_halt(_state), name="watch-halt")
@@ -1201,32 +1385,52 @@ async def main():
     resub_task = asyncio.create_task(_watch_resubscribe(_state), name="watch-resub")
     resub_task.add_done_callback(_log_task_result)
 
-    # Start housekeeping
-    hk_task = asyncio.create_task(_housekeeping_loop(), name="housekeeping")
-    hk_task.add_done_callback(_log_task_result)
+    # Start timers of housekeeping tasks
+    _start_timers(_state)
+
+    # Start the profiler on a signal
+    profiler.install(loop)
 
     try:
-        await asyncio.gather(*(tasks + [halt_task, resub_task, hk_task]))
+        await asyncio.gather(*(tasks + [halt_task, resub_task]))
     except KeyboardInterrupt:
-        for r in _state["runners"]:
-            r.stop()
-        await asyncio.sleep(0.1)
+        await _stop_runners(_state["runners"])
     finally:
+        for timer in _state["timers"].values():
+            timer.cancel()
         for t in list(_state["tasks"]):
             if not t.done():
                 t.cancel()
-        for t in (halt_task, resub_task, hk_task):
+        for t in (halt_task, resub_task):
             if not t.done():
                 t.cancel()
 
 
 ### Start ###
 if __name__ == "__main__":
-    asyncio.run(main())
+    runtime.run(main())
+
+    # Final checkpoint of klines and prices of every symbol
+    for ctx in contexts.values():
+        with context.use(ctx):
+            if config.cache_enabled:
+                storage.checkpoint(ctx.prices, True)
+            if config.fleet_state:
+                storage.save_state(ctx, defs.now_utc()[4])
+
+    # Send queued notifications before terminating
+    if config.notify_enabled:
+        notify.flush()
+        defs.announce(notify.report())
+
+    # Write queued revenue events and buffered log lines before terminating
+    ledger.flush()
+    logwriter.flush()
 
 ### Say goodbye ###
-if config.timeutc_std:
-    time_output = defs.now_utc()[0] + " UTC time"
-else:
-    time_output = defs.now_utc()[5] + " " + config.timezone_str + " time"
-defs.announce(f"*** Sunflow terminated at {time_output} ***")
+if __name__ == "__main__":
+    if config.timeutc_std:
+        time_output = defs.now_utc()[0] + " UTC time"
+    else:
+        time_output = defs.now_utc()[5] + " " + config.timezone_str + " time"
+    defs.announce(f"*** Sunflow terminated at {time_output} ***")
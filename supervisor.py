@@ -0,0 +1,162 @@
+### Sunflow Cryptobot ###
+#
+# Supervisor, spreads symbols over worker processes that each run Sunflow with their own event loop
+
+# Load external libraries
+from pathlib import Path
+import os, subprocess, sys, time, zlib
+
+# Load internal libraries
+from loader import load_config
+import broker, defs, loader
+
+# Load config
+config = load_config()
+
+# Initialize variables
+sunflow_file = str(Path(__file__).resolve().parent / "sunflow.py")
+workers      = {}
+
+
+### Functions ###
+
+# Hash symbol to a worker, the same symbol always goes to the same worker
+def shard(symbol, number):
+    return zlib.crc32(symbol.encode()) % number
+
+# Start worker process
+def start_worker(worker, address):
+
+    # Initialize variables
+    command = [sys.executable, sunflow_file]
+    env     = dict(os.environ)
+
+    # Every worker runs Sunflow with the config files of its symbols
+    for config_file in worker['configs']:
+        command = command + ["-c", config_file]
+    env[broker.broker_env] = address
+
+    # Start process
+    worker['process'] = subprocess.Popen(command, env=env)
+    worker['started'] = time.monotonic()
+    defs.announce(f"Started worker {worker['id']} with process {worker['process'].pid} for {', '.join(worker['symbols'])}")
+
+    # Return
+    return
+
+# Check workers, restart crashed workers after a backoff and return the number of running workers
+def check_workers(address):
+
+    # Initialize variables
+    running = 0
+    now     = time.monotonic()
+
+    # Check every worker
+    for worker in workers.values():
+
+        # Worker stopped by itself, Sunflow halted or terminated
+        if worker['process'] is None:
+            if worker['restart'] and now >= worker['restart']:
+                worker['restart'] = 0
+                start_worker(worker, address)
+                running = running + 1
+            elif worker['restart']:
+                running = running + 1
+            continue
+
+        # Worker is running
+        code = worker['process'].poll()
+        if code is None:
+            running = running + 1
+            continue
+
+        # Worker terminated normally, do not restart
+        worker['process'] = None
+        if code == 0:
+            defs.announce(f"Worker {worker['id']} for {', '.join(worker['symbols'])} terminated")
+            continue
+
+        # Worker crashed, restart with a growing delay, unless it ran for a while
+        if now - worker['started'] > config.supervisor_restart:
+            worker['backoff'] = 1
+        else:
+            worker['backoff'] = min(worker['backoff'] * 2, config.supervisor_restart)
+        worker['restart'] = now + worker['backoff']
+        defs.log_error(f"*** Warning: Worker {worker['id']} for {', '.join(worker['symbols'])} crashed with exit code {code}, restarting in {worker['backoff']} seconds ***")
+        running = running + 1
+
+    # Return number of running workers
+    return running
+
+# Report metrics of all workers
+def report_metrics(shared):
+
+    # Initialize variables
+    reports = shared.get_reports()
+    totals  = {}
+    now     = defs.now_utc()[4]
+
+    # Report every symbol
+    print("\n*** Supervisor report ***\n")
+    print(f"{'Symbol':<14}{'Worker':>8}{'Spot':>16}{'Orders':>8}{'Value':>16}{'Trailing':>10}{'Gaps':>6}{'Age (s)':>9}")
+    for worker in workers.values():
+        for symbol in worker['symbols']:
+            metrics = reports.get(symbol)
+            if not metrics:
+                print(f"{symbol:<14}{worker['id']:>8}{'no report yet':>16}")
+                continue
+            print(f"{symbol:<14}{worker['id']:>8}{metrics['spot']:>16}{metrics['orders']:>8}{metrics['value']:>16.2f}{metrics['trailing']:>10}{metrics.get('gaps', 0):>6}{(now - metrics['time']) // 1000:>9}")
+            totals[metrics['quote']] = totals.get(metrics['quote'], 0) + metrics['value']
+
+    # Report totals
+    for quote, value in totals.items():
+        print(f"Total value of all orders is {value:.2f} {quote}")
+    for name, waited in shared.get_waited().items():
+        print(f"Workers waited {waited} ms in total for the {name} rate limit")
+    print()
+
+    # Return
+    return
+
+
+### Start main program ###
+
+## Spread symbols over workers
+number = max(1, min(config.supervisor_workers, len(loader.configs)))
+for symbol_config in loader.configs:
+    worker_id = shard(symbol_config.symbol, number)
+    worker    = workers.setdefault(worker_id, {'id': worker_id, 'symbols': [], 'configs': [], 'process': None, 'started': 0, 'restart': 0, 'backoff': 1})
+    worker['symbols'].append(symbol_config.symbol)
+    worker['configs'].append(str(Path(symbol_config.__file__).resolve()))
+
+## Start broker and workers
+shared, address = broker.serve()
+defs.announce(f"Supervisor started {len(workers)} workers for {len(loader.configs)} symbols")
+for worker in workers.values():
+    start_worker(worker, address)
+
+## Supervise workers
+report_time = time.monotonic()
+try:
+    while check_workers(address):
+        if time.monotonic() - report_time > config.supervisor_report / 1000:
+            report_metrics(shared)
+            report_time = time.monotonic()
+        time.sleep(1)
+except KeyboardInterrupt:
+    defs.announce("Supervisor interrupted, stopping workers")
+
+## Stop workers
+for worker in workers.values():
+    if worker['process'] and worker['process'].poll() is None:
+        worker['process'].terminate()
+for worker in workers.values():
+    if worker['process']:
+        try:
+            worker['process'].wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            worker['process'].kill()
+
+### Say goodbye ###
+report_metrics(shared)
+defs.announce("*** Supervisor terminated ***")
@@ -0,0 +1,168 @@
+### Sunflow Cryptobot ###
+#
+# Trade flow, realtime trades in ring buffers with running buy and sell totals per timeframe
+
+# Load external libraries
+import numpy as np
+
+# Create trade flow of a symbol, keeps the last limit trades and running totals over every timeframe in ms
+def new_state(limit, timeframes):
+
+    # Initialize ring buffers, trade number n is stored at n % limit
+    flow             = {}
+    flow['limit']    = limit
+    flow['total']    = 0                                  # Number of trades ever added
+    flow['time']     = np.zeros(limit, dtype=np.int64)    # Exchange time in ms
+    flow['buy']      = np.zeros(limit, dtype=np.bool_)    # Aggressor side is buy
+    flow['size']     = np.zeros(limit, dtype=np.float64)  # Trade size
+    flow['value']    = np.zeros(limit, dtype=np.float64)  # Trade size * price
+
+    # Initialize running totals, a timeframe holds trades from start up to total
+    flow['windows']  = {}
+    for timeframe in timeframes:
+        flow['windows'][timeframe] = {'start': 0, 'buy': 0.0, 'sell': 0.0, 'size': 0.0}
+
+    # Return state
+    return flow
+
+# Slices of the ring buffers holding trade numbers first up to last, at most two because the buffer wraps around
+def segments(flow, first, last):
+    if first >= last:
+        return []
+    limit = flow['limit']
+    start = first % limit
+    end   = start + (last - first)
+    if end <= limit:
+        return [slice(start, end)]
+    return [slice(start, limit), slice(0, end - limit)]
+
+# Sum buy value, sell value and size of trade numbers first up to last
+def totals(flow, first, last):
+
+    # Initialize variables
+    buy  = 0.0
+    sell = 0.0
+    size = 0.0
+
+    # Sum every slice
+    for part in segments(flow, first, last):
+        value = flow['value'][part]
+        side  = flow['buy'][part]
+        buy   = buy + float(value[side].sum())
+        sell  = sell + float(value[~side].sum())
+        size  = size + float(flow['size'][part].sum())
+
+    # Return totals
+    return buy, sell, size
+
+# First trade number not older than time, trades are in chronological order
+def find(flow, first, last, time):
+    for part in segments(flow, first, last):
+        times = flow['time'][part]
+        index = int(np.searchsorted(times, time, side='left'))
+        if index < len(times):
+            return first + index
+        first = first + len(times)
+    return last
+
+# Add trades, lists of time, side ("Buy" or "Sell"), size and price in chronological order
+def add(flow, trades):
+
+    # Initialize variables
+    number = len(trades['time'])
+    limit  = flow['limit']
+    if number == 0:
+        return flow
+
+    # Only the last limit trades fit
+    if number > limit:
+        trades = {key: trades[key][-limit:] for key in ('time', 'side', 'size', 'price')}
+        number = limit
+
+    # Trades about to be overwritten leave every timeframe first
+    first = flow['total']
+    last  = first + number
+    for window in flow['windows'].values():
+        if window['start'] < last - limit:
+            expire(flow, window, last - limit)
+
+    # Store trades
+    size  = np.asarray(trades['size'], dtype=np.float64)
+    start = 0
+    for part in segments(flow, first, last):
+        end = start + (part.stop - part.start)
+        flow['time'][part]  = trades['time'][start:end]
+        flow['buy'][part]   = [side == "Buy" for side in trades['side'][start:end]]
+        flow['size'][part]  = size[start:end]
+        flow['value'][part] = size[start:end] * np.asarray(trades['price'][start:end], dtype=np.float64)
+        start = end
+    flow['total'] = last
+
+    # Add new trades to every timeframe and expire trades that are too old
+    buy, sell, size = totals(flow, first, last)
+    newest = flow['time'][(last - 1) % limit]
+    for timeframe, window in flow['windows'].items():
+        window['buy']  = window['buy'] + buy
+        window['sell'] = window['sell'] + sell
+        window['size'] = window['size'] + size
+        expire(flow, window, find(flow, window['start'], last, newest - timeframe))
+
+    # Return flow
+    return flow
+
+# Remove trades before trade number start from the running totals of a timeframe
+def expire(flow, window, start):
+
+    # Nothing to expire
+    if start <= window['start']:
+        return
+
+    # Subtract expired trades, an empty timeframe starts from zero again to prevent rounding errors
+    if start >= flow['total']:
+        window['buy'] = window['sell'] = window['size'] = 0.0
+    else:
+        buy, sell, size = totals(flow, window['start'], start)
+        window['buy']  = window['buy'] - buy
+        window['sell'] = window['sell'] - sell
+        window['size'] = window['size'] - size
+    window['start'] = start
+
+    # Return
+    return
+
+# Number of trades stored
+def count(flow):
+    return min(flow['total'], flow['limit'])
+
+# Buy and sell ratio in percentages over a timeframe, None when there were no trades
+def ratios(flow, timeframe):
+    window = flow['windows'][timeframe]
+    total  = window['buy'] + window['sell']
+    if total <= 0:
+        return None
+    return (window['buy'] / total) * 100, (window['sell'] / total) * 100
+
+# Check if a timeframe holds all stored trades while the buffers are full, more trades are needed
+def saturated(flow, timeframe):
+    return flow['total'] >= flow['limit'] and flow['windows'][timeframe]['start'] <= flow['total'] - flow['limit']
+
+# Volume weighted average price, trade size percentiles and aggressor imbalance over every timeframe
+def extras(flow, timeframe):
+
+    # Initialize variables
+    window = flow['windows'][timeframe]
+    result = {'vwap': 0.0, 'p50': 0.0, 'p90': 0.0, 'imbalance': {}}
+
+    # Average price and trade sizes of the timeframe
+    if window['size'] > 0:
+        result['vwap'] = (window['buy'] + window['sell']) / window['size']
+        sizes = np.concatenate([flow['size'][part] for part in segments(flow, window['start'], flow['total'])])
+        result['p50'], result['p90'] = (float(value) for value in np.percentile(sizes, [50, 90]))
+
+    # Aggressor imbalance between -1 (only sells) and 1 (only buys)
+    for other, other_window in flow['windows'].items():
+        total = other_window['buy'] + other_window['sell']
+        result['imbalance'][other] = (other_window['buy'] - other_window['sell']) / total if total > 0 else 0.0
+
+    # Return extras
+    return result
@@ -7,17 +7,157 @@ import pprint
 
 # Load internal libraries
 from loader import load_config
-import database, defs, distance, exchange, orders
+import context, database, defs, distance, exchange, ledger, orders
 
 # Load config
 config = load_config()
 
-# Initialize stuck variable
-stuck             = {}
-stuck['check']    = True
-stuck['time']     = defs.now_utc()[4]
-stuck['interval'] = config.stuck_interval
-  
+# Create trailing state of a symbol, stuck check and amend policy
+def new_state():
+
+    # Initialize stuck variable
+    stuck             = {}
+    stuck['check']    = True
+    stuck['time']     = defs.now_utc()[4]
+    stuck['interval'] = config.stuck_interval
+
+    # Initialize amend variable
+    amend             = {}
+    amend['orderid']  = ""                                         # Order ID the order counters belong to
+    amend['time']     = 0                                          # Time of last amend in ms
+    amend['tokens']   = config.amend_burst                         # Burst budget left
+    amend['refill']   = defs.now_utc()[4]                          # Time of last burst budget refill in ms
+    amend['history']  = []                                         # Recent amends, True when rejected by exchange
+    amend['order']    = {'sent': 0, 'skipped': 0, 'rejected': 0}   # Amend metrics of current order
+    amend['total']    = {'sent': 0, 'skipped': 0, 'rejected': 0}   # Amend metrics since Sunflow started
+
+    # Return state
+    return {'stuck': stuck, 'amend': amend}
+
+# Check the amend policy before amending the trigger price
+def check_amend(active_order, info):
+
+    # Debug
+    debug = False
+
+    # Get trailing state of symbol
+    amend = context.current().trailing['amend']
+
+    # Initialize variables
+    do_amend     = True
+    reason       = ""
+    current_time = defs.now_utc()[4]
+
+    # Reset order counters on a new order
+    reset_amend(active_order)
+
+    # Amend on every better trigger price
+    if not config.amend_enabled:
+        return do_amend
+
+    # Refill burst budget
+    elapsed          = current_time - amend['refill']
+    amend['refill']  = current_time
+    if config.amend_burst_time > 0:
+        amend['tokens'] = min(config.amend_burst, amend['tokens'] + elapsed * (config.amend_burst / config.amend_burst_time))
+    else:
+        amend['tokens'] = config.amend_burst
+
+    # Calculate improvement of trigger price
+    improvement = active_order['trigger_new'] - active_order['trigger']
+    if active_order['side'] == "Buy":
+        improvement = improvement * -1
+    ticks = round(improvement / info['tickSize'], 8)
+    bps   = (improvement / active_order['trigger']) * 10000 if active_order['trigger'] else 0
+
+    # Calculate minimum interval, adaptive mode adds delay based on rejection rate
+    interval = config.amend_interval
+    if config.amend_adaptive and amend['history']:
+        rejection_rate = sum(amend['history']) / len(amend['history'])
+        interval       = interval + rejection_rate * config.amend_adaptive_backoff
+
+    # Check policy
+    if ticks < config.amend_min_ticks:
+        do_amend = False
+        reason   = f"improvement of {ticks:.0f} ticks is below {config.amend_min_ticks} ticks"
+    elif bps < config.amend_min_bps:
+        do_amend = False
+        reason   = f"improvement of {bps:.2f} bps is below {config.amend_min_bps} bps"
+    elif current_time - amend['time'] < interval:
+        do_amend = False
+        reason   = f"last amend was {current_time - amend['time']} ms ago, minimum is {interval:.0f} ms"
+    elif amend['tokens'] < 1:
+        do_amend = False
+        reason   = "burst budget is used"
+
+    # Register skipped amend
+    if not do_amend:
+        amend['order']['skipped'] += 1
+        amend['total']['skipped'] += 1
+        if debug:
+            defs.announce(f"Debug: Amend skipped, {reason}")
+
+    # Return amend decision
+    return do_amend
+
+# Reset amend order counters when the order changed
+def reset_amend(active_order):
+
+    # Get trailing state of symbol
+    amend = context.current().trailing['amend']
+
+    # Reset order counters
+    if amend['orderid'] != active_order['orderid']:
+        amend['orderid'] = active_order['orderid']
+        amend['order']   = {'sent': 0, 'skipped': 0, 'rejected': 0}
+
+    # Return
+    return
+
+# Register the result of an amend for the amend policy and metrics
+def register_amend(error_code):
+
+    # Get trailing state of symbol
+    amend = context.current().trailing['amend']
+
+    # Initialize variables
+    rejected = error_code != 0
+
+    # Use budget
+    amend['time']   = defs.now_utc()[4]
+    amend['tokens'] = max(0, amend['tokens'] - 1)
+
+    # Register metrics
+    amend['order']['sent'] += 1
+    amend['total']['sent'] += 1
+    if rejected:
+        amend['order']['rejected'] += 1
+        amend['total']['rejected'] += 1
+
+    # Keep recent rejections for adaptive mode, only price rejections count
+    amend['history'].append(error_code in (51278, 51280))
+    if len(amend['history']) > config.amend_adaptive_window:
+        amend['history'].pop(0)
+
+    # Return
+    return
+
+# Report amend metrics
+def report_amend(active_order):
+
+    # Get trailing state of symbol
+    amend = context.current().trailing['amend']
+
+    # Reset order counters when the order was never amended
+    reset_amend(active_order)
+
+    # Create message
+    message  = f"Amends for this order sent {amend['order']['sent']}, skipped {amend['order']['skipped']} and rejected {amend['order']['rejected']}, "
+    message += f"in total sent {amend['total']['sent']}, skipped {amend['total']['skipped']} and rejected {amend['total']['rejected']}"
+
+    # Return message
+    return message
+
 # Check if we can do trailing buy or sell
 def check_order(spot, compounding, active_order, all_buys, all_sells, info, force_check=False):
 
@@ -26,8 +166,8 @@ def check_order(spot, compounding, active_order, all_buys, all_sells, info, forc
     speed = False
     stime = defs.now_utc()[4]
     
-    # Declare some variables global
-    global stuck
+    # Get trailing state of symbol
+    stuck = context.current().trailing['stuck']
     
     # Initialize variables
     result         = ()
@@ -139,6 +279,10 @@ def check_order(spot, compounding, active_order, all_buys, all_sells, info, forc
             if compounding['enabled']:
                 info = defs.calc_compounding(info, spot, compounding)
                 
+            # Add to revenue store, before the revenue log rounds the order
+            if config.revenue_store:
+                ledger.add(active_order, closed_order, revenue)
+
             # Report to revenue log file
             if config.revenue_log:
                 defs.log_revenue(active_order, closed_order, revenue, info, config.revenue_log_sides, config.revenue_log_full)
@@ -358,6 +502,7 @@ def close_trail(active_order, all_buys, all_sells, spot, info, virtual=False):
 
     # Report to stdout
     defs.announce(f"Closed trailing {active_order['side'].lower()} order")
+    defs.announce(report_amend(active_order))
 
     # Report execution time
     if speed: defs.announce(defs.report_exec(stime))
@@ -418,6 +563,10 @@ def trail(spot, compounding, active_order, info, all_buys, all_sells, prices):
             if active_order['trigger_new'] < active_order['trigger']:
                 do_amend = True
 
+        # Check amend policy, prevents an amend on every tick
+        if do_amend:
+            do_amend = check_amend(active_order, info)
+
         # Amend trigger price
         if do_amend:
             result       = adjust_tp(active_order, all_buys, all_sells, compounding, spot, info)
@@ -549,6 +698,9 @@ def adjust_tp(active_order, all_buys, all_sells, compounding, spot, info):
     error_code = result[1]
     error_msg  = result[2]
 
+    # Register amend for amend policy and metrics
+    register_amend(error_code)
+
     #########################
     # Check exchange errors #
     #########################